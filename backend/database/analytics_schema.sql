@@ -0,0 +1,27 @@
+-- Pre-aggregated analytics, updated with every booking and cancellation
+CREATE TABLE IF NOT EXISTS booking_rollups (
+    day DATE NOT NULL,
+    origin VARCHAR(3) NOT NULL,
+    destination VARCHAR(3) NOT NULL,
+    airline_id INTEGER NOT NULL,
+    seat_class VARCHAR(20) NOT NULL,
+    revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    bookings INTEGER NOT NULL DEFAULT 0,
+    cancelled_revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    cancellations INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, origin, destination, airline_id, seat_class)
+);
+
+CREATE TABLE IF NOT EXISTS flight_load_rollups (
+    flight_id INTEGER REFERENCES flights(id) NOT NULL,
+    seat_class VARCHAR(20) NOT NULL,
+    departure_date DATE NOT NULL,
+    origin VARCHAR(3) NOT NULL,
+    destination VARCHAR(3) NOT NULL,
+    airline_id INTEGER NOT NULL,
+    seats_total INTEGER NOT NULL DEFAULT 0,
+    seats_sold INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (flight_id, seat_class)
+);
+
+CREATE INDEX IF NOT EXISTS idx_flight_load_rollups_departure_date ON flight_load_rollups(departure_date);
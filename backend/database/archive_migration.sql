@@ -0,0 +1,79 @@
+-- Cold storage for departed flights, partitioned by departure month.
+-- Safe on an existing database: it only adds tables, a function and indexes. Existing
+-- history is moved afterwards by the archival job (POST /admin/archive/run), in
+-- batches of ARCHIVE_BATCH_FLIGHTS flights per transaction.
+
+CREATE TABLE IF NOT EXISTS bookings_archive (
+    id INTEGER NOT NULL,
+    departure_date DATE NOT NULL,
+    pnr VARCHAR(10) NOT NULL,
+    flight_id INTEGER NOT NULL,
+    user_id INTEGER,
+    passenger_name VARCHAR(255) NOT NULL,
+    passenger_email VARCHAR(255),
+    passenger_phone VARCHAR(20),
+    seat_id INTEGER,
+    seat_number VARCHAR(5),
+    seat_class VARCHAR(20),
+    total_price DECIMAL(10, 2) NOT NULL,
+    booking_status VARCHAR(20),
+    booking_date TIMESTAMP NOT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, departure_date)
+) PARTITION BY RANGE (departure_date);
+
+CREATE TABLE IF NOT EXISTS seats_archive (
+    id INTEGER NOT NULL,
+    departure_date DATE NOT NULL,
+    flight_id INTEGER NOT NULL,
+    seat_number VARCHAR(5) NOT NULL,
+    is_available BOOLEAN NOT NULL,
+    class VARCHAR(20) NOT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, departure_date)
+) PARTITION BY RANGE (departure_date);
+
+-- One row per archived flight; the job skips flights listed here
+CREATE TABLE IF NOT EXISTS archived_flights (
+    flight_id INTEGER PRIMARY KEY REFERENCES flights(id),
+    departure_date DATE NOT NULL,
+    seats INTEGER NOT NULL DEFAULT 0,
+    bookings INTEGER NOT NULL DEFAULT 0,
+    seats_exported BOOLEAN NOT NULL DEFAULT FALSE,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Creates the partitions of both archive tables for the month containing month_start
+CREATE OR REPLACE FUNCTION create_archive_partitions(month_start DATE) RETURNS void AS $$
+DECLARE
+    first_day DATE := date_trunc('month', month_start)::date;
+    next_month DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::date;
+    suffix TEXT := to_char(month_start, 'YYYY_MM');
+BEGIN
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF bookings_archive FOR VALUES FROM (%L) TO (%L)',
+                   'bookings_archive_' || suffix, first_day, next_month);
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF seats_archive FOR VALUES FROM (%L) TO (%L)',
+                   'seats_archive_' || suffix, first_day, next_month);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions for every month that already has departed flights
+SELECT create_archive_partitions(month_start)
+FROM (
+    SELECT DISTINCT date_trunc('month', departure_time)::date AS month_start
+    FROM flights
+    WHERE departure_time < NOW()
+) AS months;
+
+-- Lookups of archived bookings (created on every partition)
+CREATE INDEX IF NOT EXISTS idx_bookings_archive_pnr ON bookings_archive(pnr);
+CREATE INDEX IF NOT EXISTS idx_bookings_archive_email ON bookings_archive(passenger_email);
+CREATE INDEX IF NOT EXISTS idx_bookings_archive_user_id ON bookings_archive(user_id);
+CREATE INDEX IF NOT EXISTS idx_seats_archive_flight_id ON seats_archive(flight_id);
+
+-- The job selects departed flights and moves their rows by flight_id
+CREATE INDEX IF NOT EXISTS idx_flights_departure_time ON flights(departure_time);
+CREATE INDEX IF NOT EXISTS idx_bookings_flight_id ON bookings(flight_id);
+
+-- Rebookings keep their booking id after the booking moves to the archive
+ALTER TABLE IF EXISTS disruption_rebookings DROP CONSTRAINT IF EXISTS disruption_rebookings_booking_id_fkey;
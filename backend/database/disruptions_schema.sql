@@ -0,0 +1,28 @@
+-- Flight cancellations and the re-accommodation of their passengers
+CREATE TABLE IF NOT EXISTS flight_disruptions (
+    id SERIAL PRIMARY KEY,
+    flight_id INTEGER REFERENCES flights(id) UNIQUE NOT NULL,
+    reason VARCHAR(255),
+    status VARCHAR(20) NOT NULL DEFAULT 'processing',
+    affected INTEGER NOT NULL DEFAULT 0,
+    rebooked INTEGER NOT NULL DEFAULT 0,
+    unaccommodated INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS disruption_rebookings (
+    id SERIAL PRIMARY KEY,
+    disruption_id INTEGER REFERENCES flight_disruptions(id) NOT NULL,
+    booking_id INTEGER,
+    pnr VARCHAR(10),
+    old_flight_id INTEGER NOT NULL,
+    old_seat_id INTEGER,
+    new_flight_id INTEGER,
+    new_seat_id INTEGER,
+    outcome VARCHAR(20) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_disruption_rebookings_disruption_id ON disruption_rebookings(disruption_id);
+CREATE INDEX IF NOT EXISTS idx_bookings_flight_id ON bookings(flight_id);
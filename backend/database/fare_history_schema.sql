@@ -0,0 +1,13 @@
+-- Fare history: delta-encoded segments of (time, price, seats_available) samples per flight and class
+CREATE TABLE IF NOT EXISTS fare_history_segments (
+    id SERIAL PRIMARY KEY,
+    flight_id INTEGER REFERENCES flights(id) NOT NULL,
+    seat_class VARCHAR(20) NOT NULL,
+    started_at TIMESTAMP NOT NULL,
+    ended_at TIMESTAMP NOT NULL,
+    samples INTEGER NOT NULL,
+    data BYTEA NOT NULL
+);
+
+-- Trend queries by flight and time window; the writer's lookup of open segments
+CREATE INDEX IF NOT EXISTS idx_fare_history_segments_flight ON fare_history_segments(flight_id, seat_class, ended_at);
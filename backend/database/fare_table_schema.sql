@@ -0,0 +1,14 @@
+-- Materialized fares per flight and seat class, refreshed on inventory and demand changes
+CREATE TABLE IF NOT EXISTS fare_table (
+    flight_id INTEGER REFERENCES flights(id) NOT NULL,
+    seat_class VARCHAR(20) NOT NULL,
+    price DECIMAL(10, 2) NOT NULL,
+    seats_available INTEGER NOT NULL,
+    total_seats INTEGER NOT NULL,
+    computed_at TIMESTAMP NOT NULL,
+    valid_until TIMESTAMP,
+    PRIMARY KEY (flight_id, seat_class)
+);
+
+-- Scheduler lookup of rows that crossed a time-factor boundary
+CREATE INDEX IF NOT EXISTS idx_fare_table_valid_until ON fare_table(valid_until);
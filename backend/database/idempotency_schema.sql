@@ -0,0 +1,17 @@
+-- Idempotency keys for retry-safe POST /payment/process and POST /bookings
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key VARCHAR(255) PRIMARY KEY,
+    request_fingerprint VARCHAR(64) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'in_progress',
+    response_status INTEGER,
+    response_body TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    heartbeat_at TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Added after the first release of this table
+ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP;
+
+-- Index for TTL cleanup of expired keys
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
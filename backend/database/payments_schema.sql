@@ -0,0 +1,15 @@
+-- Asynchronous payments submitted through POST /payment/submit
+CREATE TABLE IF NOT EXISTS payments (
+    id SERIAL PRIMARY KEY,
+    payment_id VARCHAR(20) UNIQUE NOT NULL,
+    pre_booking_id VARCHAR(10) NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    gateway_reference VARCHAR(50),
+    failure_reason VARCHAR(255),
+    pnr VARCHAR(10),
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_payments_pre_booking_id ON payments(pre_booking_id);
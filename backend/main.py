@@ -1,44 +1,184 @@
 # backend/main.py
 
-from fastapi import FastAPI, Depends, HTTPException, status, Header
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, Header, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, DECIMAL, ForeignKey, and_, Date
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, DECIMAL, ForeignKey, and_, Date, Text, LargeBinary, case, text, cast, insert, select, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker, DeclarativeBase, aliased
 from sqlalchemy.sql import func
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timedelta, date
 import random
 import string
+import hashlib
+import hmac
+import json
+import re
+import bisect
+import unicodedata
+import gzip
+import threading
+import time
+import math
+import asyncio
+import logging
+import mmap
+import struct
+import tempfile
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import os
 from typing import List, Dict, Any, Optional
 import bcrypt
 from jose import JWTError, jwt
 
+try:
+    import fcntl
+except ImportError:  # Windows: the shared inventory table is disabled
+    fcntl = None
+
 load_dotenv()
 
-# Database setup
+logger = logging.getLogger(__name__)
+
+def env_flag(name: str, default: bool) -> bool:
+    """Boolean setting: 1, true, yes or on (any case) enable it"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Database setup (checked by init_database() at startup, not at import)
 DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is not set")
 
 # JWT Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+# Users allowed to run admin operations (comma-separated emails); empty: nobody
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+# Connection pool configuration
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # seconds before a connection is replaced
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", True)
+
+# Optional read replica for read-only endpoints; writes always go to DATABASE_URL
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# After a write, reads about the same booking/user stay on the primary for this long
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 10))
+
+def create_db_engine(url: str):
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING
+    )
 
 # configuration
-engine = create_engine(DATABASE_URL)
-sessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Engines are created by init_database() on startup (or on first use), so importing this
+# module needs neither DATABASE_URL nor a database; the session factories are bound then.
+engine = None
+read_engine = None
+sessionLocal = sessionmaker(autocommit=False, autoflush=False)
+readSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+_database_lock = threading.Lock()
+
+def init_database(database_url: Optional[str] = None, replica_url: Optional[str] = None):
+    """Create the engines and bind the session factories; a no-op once initialized"""
+    global engine, read_engine
+    with _database_lock:
+        if engine is not None:
+            return engine
+        database_url = database_url or DATABASE_URL
+        if not database_url:
+            raise ValueError("DATABASE_URL environment variable is not set")
+        replica_url = replica_url or DATABASE_REPLICA_URL
+        primary = create_db_engine(database_url)
+        read_engine = create_db_engine(replica_url) if replica_url else primary
+        sessionLocal.configure(bind=primary)
+        readSessionLocal.configure(bind=read_engine)
+        engine = primary
+        return engine
 
 def get_db():
+    if engine is None:
+        init_database()
     db = sessionLocal()
     try:
         yield db
     finally:
         db.close()
 
+# Subjects ("pnr:..", "email:..") written recently by this process, with the time of the write.
+# Per process: with several uvicorn workers, a read served by another worker is not pinned.
+_recent_writes: Dict[str, float] = {}
+_recent_writes_lock = threading.Lock()
+
+def mark_recent_write(*subjects: Optional[str]):
+    """Pin reads about these subjects to the primary until the replica has caught up"""
+    now = time.monotonic()
+    with _recent_writes_lock:
+        for subject in subjects:
+            if subject:
+                _recent_writes[subject] = now
+        if len(_recent_writes) > 10000:
+            cutoff = now - READ_YOUR_WRITES_SECONDS
+            for key in [k for k, t in _recent_writes.items() if t < cutoff]:
+                del _recent_writes[key]
+
+def was_recently_written(subject: str) -> bool:
+    with _recent_writes_lock:
+        written_at = _recent_writes.get(subject)
+    return written_at is not None and time.monotonic() - written_at < READ_YOUR_WRITES_SECONDS
+
+def read_subjects(request: Request) -> List[str]:
+    """Subjects a read request is about: its PNR/email path parameters and the caller's token"""
+    subjects = []
+    if "pnr" in request.path_params:
+        subjects.append(f"pnr:{request.path_params['pnr'].upper()}")
+    if "email" in request.path_params:
+        subjects.append(f"email:{request.path_params['email'].lower()}")
+    authorization = request.headers.get("authorization", "")
+    if authorization.startswith("Bearer "):
+        try:
+            payload = jwt.decode(authorization[len("Bearer "):], SECRET_KEY, algorithms=[ALGORITHM])
+            if payload.get("sub"):
+                subjects.append(f"email:{payload['sub'].lower()}")
+        except JWTError:
+            pass
+    return subjects
+
+def get_read_db(request: Request):
+    """
+    Session for read-only endpoints. Uses the replica unless the client asks for
+    X-Consistency: strong or the request is about something this instance just wrote.
+    """
+    if engine is None:
+        init_database()
+    use_primary = (
+        read_engine is engine
+        or request.headers.get("x-consistency", "").lower() == "strong"
+        or any(was_recently_written(subject) for subject in read_subjects(request))
+    )
+    db = (sessionLocal if use_primary else readSessionLocal)()
+    try:
+        yield db
+    finally:
+        db.close()
+
 # SQLAlchemy ORM models
 class Base(DeclarativeBase):
     pass
@@ -93,6 +233,7 @@ class FlightSearchRequest(BaseModel):
     origin: str
     destination: str
     departure_date: str
+    seat_class: Optional[str] = None  # only price this class (e.g. "Business")
 
 class AirportListSchema(BaseModel):
     code: str
@@ -103,7 +244,8 @@ class AirlineListSchema(BaseModel):
     id: int
     name: str
 
-app = FastAPI()
+# Routes are registered on this router; create_app() (at the end of the module) mounts it
+router = APIRouter()
 
 # ============================================================================
 # AUTHENTICATION MODELS
@@ -195,21 +337,489 @@ def get_current_user(token: str = Depends(lambda: None), db: Session = Depends(g
         raise credentials_exception
     return user
 
-# CORS middleware configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:5173",
-        "http://localhost:3000", 
-        "http://localhost:3001",
-        "https://flight-booking-simulator-frontend.onrender.com"
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.get("/")
+def require_admin(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)) -> User:
+    """Dependency for admin operations: a Bearer token of a user listed in ADMIN_EMAILS"""
+    token = authorization[len('Bearer '):] if authorization and authorization.startswith('Bearer ') else None
+    user = get_current_user(token, db)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user
+
+# ============================================================================
+# Admission Control and Rate Limiting
+# ============================================================================
+# Every client (verified user, otherwise IP) has a token bucket; each route costs a
+# number of tokens. DB-heavy routes also share a global concurrency limit sized to the
+# connection pool: requests wait briefly for a slot and are rejected with 503 instead
+# of queueing on the pool. Rejections carry Retry-After.
+
+# Off by default: behind a proxy every client shares the proxy's address unless
+# RATE_LIMIT_TRUST_FORWARDED_FOR is set as well
+RATE_LIMIT_ENABLED = env_flag("RATE_LIMIT_ENABLED", False)
+RATE_LIMIT_TOKENS_PER_SECOND = float(os.getenv("RATE_LIMIT_TOKENS_PER_SECOND", 10))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", 60))
+# Use the first X-Forwarded-For address as the client IP (only behind a trusted proxy)
+RATE_LIMIT_TRUST_FORWARDED_FOR = env_flag("RATE_LIMIT_TRUST_FORWARDED_FOR", False)
+HEAVY_CONCURRENCY_LIMIT = int(os.getenv("HEAVY_CONCURRENCY_LIMIT", DB_POOL_SIZE + DB_MAX_OVERFLOW))
+HEAVY_QUEUE_TIMEOUT_MS = float(os.getenv("HEAVY_QUEUE_TIMEOUT_MS", 250))
+HEAVY_MAX_WAITING = int(os.getenv("HEAVY_MAX_WAITING", HEAVY_CONCURRENCY_LIMIT * 2))
+
+DEFAULT_ROUTE_COST = 1
+# (method, route path) -> (token cost, counts against the heavy concurrency limit)
+ROUTE_COSTS = {
+    ("GET", "/health/live"): (0, False),
+    ("GET", "/health/ready"): (0, False),
+    ("POST", "/flights/search"): (5, True),
+    ("GET", "/flights/{flight_id}"): (2, True),
+    ("GET", "/flights/{flight_id}/seats"): (1, True),
+    ("GET", "/flights/{flight_id}/pricing"): (1, True),
+    ("POST", "/flights/pricing/batch"): (5, True),
+    ("GET", "/flights/{flight_id}/seats/stream"): (5, False),
+    ("POST", "/auth/login"): (5, False),
+    ("POST", "/auth/register"): (5, False),
+    ("GET", "/analytics/revenue"): (5, True),
+    ("GET", "/analytics/load_factor"): (5, True),
+    ("GET", "/analytics/summary"): (5, True),
+    ("GET", "/flights/{flight_id}/fare_history"): (2, True),
+    ("GET", "/routes/{origin}/{destination}/fare_history"): (5, True),
+    ("POST", "/admin/simulate_demand"): (30, True),
+    ("POST", "/admin/fares/rebuild"): (30, True),
+    ("GET", "/admin/fares/check"): (10, True),
+    ("POST", "/admin/analytics/backfill"): (30, True),
+    ("POST", "/admin/flights/{flight_id}/cancel"): (30, True),
+}
+
+class TokenBucketLimiter:
+    """Per-client token buckets refilled continuously at rate tokens/second up to burst"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, List[float]] = {}  # client -> [tokens, last refill time]
+        self.allowed = 0
+        self.rejected = 0
+
+    def acquire(self, client: str, cost: float) -> float:
+        """Takes cost tokens and returns 0, or returns the seconds until they are available"""
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._prune(now)
+                bucket = self._buckets[client] = [self.burst, now]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                self.allowed += 1
+                return 0.0
+            self.rejected += 1
+            return (cost - bucket[0]) / self.rate if self.rate > 0 else 60.0
+
+    def _prune(self, now: float):
+        # Buckets that have refilled completely hold no state worth keeping
+        self._buckets = {
+            client: bucket for client, bucket in self._buckets.items()
+            if bucket[0] + (now - bucket[1]) * self.rate < self.burst
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": len(self._buckets),
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "tokens_per_second": self.rate,
+                "burst": self.burst
+            }
+
+class ConcurrencyLimiter:
+    """Caps in-flight requests; callers wait at most timeout and only while few others wait"""
+
+    def __init__(self, limit: int, timeout_seconds: float, max_waiting: int):
+        self.limit = limit
+        self.timeout_seconds = timeout_seconds
+        self.max_waiting = max_waiting
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def acquire(self) -> bool:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self._semaphore.locked():
+            if self.waiting >= self.max_waiting:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.timeout_seconds)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "queue_timeout_ms": self.timeout_seconds * 1000,
+            "max_waiting": self.max_waiting
+        }
+
+rate_limiter = TokenBucketLimiter(RATE_LIMIT_TOKENS_PER_SECOND, RATE_LIMIT_BURST)
+heavy_limiter = ConcurrencyLimiter(HEAVY_CONCURRENCY_LIMIT, HEAVY_QUEUE_TIMEOUT_MS / 1000, HEAVY_MAX_WAITING)
+
+def client_address(request: Request) -> str:
+    """Client IP; X-Forwarded-For is only believed behind a trusted proxy (RATE_LIMIT_TRUST_FORWARDED_FOR)"""
+    forwarded_for = request.headers.get("x-forwarded-for")
+    if RATE_LIMIT_TRUST_FORWARDED_FOR and forwarded_for:
+        return forwarded_for.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def client_identity(request: Request) -> str:
+    """Rate-limit key: the user of a valid token, otherwise the client IP"""
+    authorization = request.headers.get("authorization", "")
+    token = authorization[len("Bearer "):] if authorization.startswith("Bearer ") else request.query_params.get("token")
+    if token:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            if payload.get("sub"):
+                return f"user:{payload['sub'].lower()}"
+        except JWTError:
+            pass  # unverified tokens are keyed by IP so rotating them does not reset the bucket
+    return f"ip:{client_address(request)}"
+
+class RouteCostTable:
+    """
+    ROUTE_COSTS resolved against the app's routes once: fixed paths are a dict lookup,
+    templated paths are tried in registration order (as the router does) by their regex
+    """
+
+    def __init__(self, routes):
+        self._fixed: Dict[tuple, tuple] = {}
+        self._templated: List[tuple] = []  # (method, path regex, cost)
+        for route in routes:
+            path, methods = getattr(route, "path", None), getattr(route, "methods", None)
+            if path is None or not methods:
+                continue
+            for method in methods:
+                cost = ROUTE_COSTS.get((method, path), (DEFAULT_ROUTE_COST, False))
+                if "{" in path:
+                    self._templated.append((method, route.path_regex, cost))
+                elif not any(m == method and regex.match(path) for m, regex, _ in self._templated):
+                    # Not shadowed by a templated route registered before it
+                    self._fixed.setdefault((method, path), cost)
+
+    def lookup(self, method: str, path: str) -> tuple:
+        cost = self._fixed.get((method, path))
+        if cost is not None:
+            return cost
+        for route_method, regex, cost in self._templated:
+            if route_method == method and regex.match(path):
+                return cost
+        return (DEFAULT_ROUTE_COST, False)
+
+def route_cost(scope) -> tuple:
+    return scope["app"].state.route_costs.lookup(scope["method"], scope["path"])
+
+class AdmissionControlMiddleware:
+    """ASGI middleware applying the per-client rate limit and the heavy-route concurrency limit"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        cost, heavy = route_cost(scope)
+        retry_after = rate_limiter.acquire(client_identity(Request(scope)), cost)
+        if retry_after > 0:
+            response = JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": "Too many requests. Please slow down."},
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+            await response(scope, receive, send)
+            return
+
+        if not heavy:
+            await self.app(scope, receive, send)
+            return
+        if not await heavy_limiter.acquire():
+            response = JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Server is busy. Please retry shortly."},
+                headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            heavy_limiter.release()
+
+@router.get("/admin/admission")
+def get_admission_stats():
+    """Rate limiter and concurrency limiter counters"""
+    return {
+        "enabled": RATE_LIMIT_ENABLED,
+        "rate_limit": rate_limiter.stats(),
+        "heavy_concurrency": heavy_limiter.stats()
+    }
+
+# ============================================================================
+# Traffic Capture
+# ============================================================================
+# Opt-in (TRAFFIC_CAPTURE_ENABLED) recording of real request traffic for replay with
+# traffic_replay.py. Each request becomes one JSON line: route template, parameters,
+# body, status and latency. Values are sanitized before they leave the request:
+# - fields that only describe what was asked for (flight ids, airports, dates, classes)
+#   are kept
+# - identifiers (PNRs, hold and payment ids, emails, tokens, idempotency keys) become
+#   keyed-hash pseudonyms, so a replay can link a hold to its payment without seeing them
+# - everything else, including free text such as autocomplete queries, is reduced to its type
+# Lines are buffered and appended to gzip files by a background thread; whole sessions
+# are sampled so that replayed sessions stay complete.
+
+TRAFFIC_CAPTURE_ENABLED = env_flag("TRAFFIC_CAPTURE_ENABLED", False)
+TRAFFIC_CAPTURE_DIR = os.getenv("TRAFFIC_CAPTURE_DIR", "traces")
+TRAFFIC_CAPTURE_SAMPLE_RATE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", 1.0))
+TRAFFIC_CAPTURE_MAX_FILE_MB = float(os.getenv("TRAFFIC_CAPTURE_MAX_FILE_MB", 64))
+TRAFFIC_CAPTURE_FLUSH_SECONDS = 1.0
+TRAFFIC_CAPTURE_MAX_BUFFERED = 100000  # lines; beyond this new lines are dropped
+TRAFFIC_CAPTURE_MAX_BODY_BYTES = 65536
+# Key for the pseudonyms; random per process unless set, so identifiers cannot be guessed back
+TRAFFIC_CAPTURE_SECRET = os.getenv("TRAFFIC_CAPTURE_SECRET") or os.urandom(16).hex()
+# Route prefixes never recorded: probes, admin tools and the long-lived seat stream
+TRAFFIC_CAPTURE_EXCLUDE = ("/health", "/admin", "/flights/{flight_id}/seats/stream")
+
+# Kept verbatim
+CAPTURE_KEEP_FIELDS = {
+    "flight_id", "seat_id", "seat_number", "seat_class", "class", "origin", "destination",
+    "departure_date", "limit", "days", "group_by", "start_date", "end_date", "items",
+    "alternative_flight_ids", "max_days_later", "allow_upgrade", "older_than_days", "max_batches",
+    "disruption_id", "points", "start", "end"
+}
+# Replaced by pseudonyms; responses are scanned for these too so the replay can link them
+CAPTURE_LINKED_FIELDS = {"pnr", "pre_booking_id", "payment_id", "email", "passenger_email", "token", "access_token"}
+
+def capture_pseudonym(value: Any) -> str:
+    return "~" + hmac.new(TRAFFIC_CAPTURE_SECRET.encode(), str(value).encode(), hashlib.sha256).hexdigest()[:12]
+
+def sanitize_captured(value: Any, key: Optional[str] = None) -> Any:
+    """Keep, pseudonymize or reduce a request value to its type (see the section comment)"""
+    if isinstance(value, dict):
+        return {k: sanitize_captured(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [sanitize_captured(item, key) for item in value]
+    if value is None or isinstance(value, bool):
+        return value
+    if key in CAPTURE_KEEP_FIELDS:
+        return value
+    if key in CAPTURE_LINKED_FIELDS or (isinstance(value, str) and "@" in value):
+        return capture_pseudonym(value)
+    return "<num>" if isinstance(value, (int, float)) else "<str>"
+
+class TraceWriter:
+    """Buffers trace lines and appends them to rotating gzip files from a background thread"""
+
+    def __init__(self, directory: str, max_file_bytes: int):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self._lock = threading.Lock()  # guards the buffer and thread
+        self._file_lock = threading.Lock()  # one flush at a time, so lines stay in order and rotation is not raced
+        self._buffer: List[str] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.path: Optional[str] = None
+        self.written = 0
+        self.dropped = 0
+        self.files = 0
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, separators=(",", ":"), default=str)
+        with self._lock:
+            if len(self._buffer) >= TRAFFIC_CAPTURE_MAX_BUFFERED:
+                self.dropped += 1
+                return
+            self._buffer.append(line)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(TRAFFIC_CAPTURE_FLUSH_SECONDS):
+            self.flush()
+
+    def flush(self):
+        with self._file_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        if self.path is None or os.path.getsize(self.path) >= self.max_file_bytes:
+            os.makedirs(self.directory, exist_ok=True)
+            self.path = os.path.join(
+                self.directory, f"trace-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl.gz"
+            )
+            self.files += 1
+        # One gzip member per flush; readers see a single stream of lines
+        with gzip.open(self.path, "at", encoding="utf-8") as trace:
+            trace.write("\n".join(lines) + "\n")
+        self.written += len(lines)
+
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+        with self._file_lock:
+            self._flush()
+            # The next write starts a fresh thread and file, e.g. for another app in the same process
+            self._stop.clear()
+            self.path = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {"enabled": TRAFFIC_CAPTURE_ENABLED, "file": self.path, "files": self.files,
+                "written": self.written, "buffered": buffered, "dropped": self.dropped,
+                "sample_rate": TRAFFIC_CAPTURE_SAMPLE_RATE}
+
+trace_writer = TraceWriter(TRAFFIC_CAPTURE_DIR, int(TRAFFIC_CAPTURE_MAX_FILE_MB * 1024 * 1024))
+
+class TrafficCaptureMiddleware:
+    """ASGI middleware writing one sanitized trace line per request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        route, path_params = None, {}
+        for candidate in scope["app"].router.routes:
+            match, child = candidate.matches(scope)
+            if match == Match.FULL:
+                route, path_params = getattr(candidate, "path", None), child.get("path_params", {})
+                break
+        request = Request(scope)
+        authorization = request.headers.get("authorization", "")
+        # A session is one client (address and user agent), before and after it signs in
+        session = capture_pseudonym(f"{client_address(request)}|{request.headers.get('user-agent', '')}")
+        # Sample whole sessions: the pseudonym is uniformly distributed
+        sampled = int(session[1:9], 16) / 0xFFFFFFFF < TRAFFIC_CAPTURE_SAMPLE_RATE
+        if route is None or route.startswith(TRAFFIC_CAPTURE_EXCLUDE) or not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.time()
+        started = time.perf_counter()
+        request_body = bytearray()
+        response = {"status": None, "json": False, "body": bytearray()}
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "http.request" and len(request_body) <= TRAFFIC_CAPTURE_MAX_BODY_BYTES:
+                request_body.extend(message.get("body", b""))
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                headers = dict(message.get("headers", []))
+                response["json"] = headers.get(b"content-type", b"").startswith(b"application/json")
+            elif message["type"] == "http.response.body" and response["json"] \
+                    and len(response["body"]) <= TRAFFIC_CAPTURE_MAX_BODY_BYTES:
+                response["body"].extend(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            record = {
+                "t": round(started_at, 3),
+                "s": session,
+                "m": scope["method"],
+                "r": route,
+                "st": response["status"] or 500,
+                "ms": round((time.perf_counter() - started) * 1000, 2)
+            }
+            if path_params:
+                record["p"] = sanitize_captured(dict(path_params))
+            if request.query_params:
+                record["q"] = sanitize_captured(dict(request.query_params))
+            if request_body:
+                try:
+                    record["b"] = sanitize_captured(json.loads(request_body))
+                except ValueError:
+                    record["b"] = "<body>"
+            if authorization.startswith("Bearer "):
+                record["a"] = capture_pseudonym(authorization[len("Bearer "):])
+            if "idempotency-key" in request.headers:
+                record["k"] = capture_pseudonym(request.headers["idempotency-key"])
+            linked = self._linked_response_fields(response)
+            if linked:
+                record["o"] = linked
+            trace_writer.write(record)
+
+    @staticmethod
+    def _linked_response_fields(response) -> Dict[str, str]:
+        """Pseudonyms of the identifiers a response handed out, e.g. a new PNR"""
+        if not response["json"] or not response["body"] or len(response["body"]) > TRAFFIC_CAPTURE_MAX_BODY_BYTES:
+            return {}
+        try:
+            body = json.loads(response["body"])
+        except ValueError:
+            return {}
+        if not isinstance(body, dict):
+            return {}
+        return {key: capture_pseudonym(body[key]) for key in CAPTURE_LINKED_FIELDS if isinstance(body.get(key), str)}
+
+@router.get("/admin/traffic_capture")
+def get_traffic_capture_stats():
+    """Trace lines written, buffered and dropped, and the current trace file"""
+    return trace_writer.stats()
+
+# CORS middleware configuration (applied in create_app)
+CORS_ALLOWED_ORIGINS = [
+    "http://localhost:5173",
+    "http://localhost:3000", 
+    "http://localhost:3001",
+    "https://flight-booking-simulator-frontend.onrender.com"
+]
+
+@router.get("/")
 def read_root():
     return {"message": "Welcome to the Flight Booking Simulator API"}
 
@@ -217,7 +827,7 @@ def read_root():
 # AUTHENTICATION ENDPOINTS
 # ============================================================================
 
-@app.post("/auth/register", response_model=Token)
+@router.post("/auth/register", response_model=Token)
 def register_user(user_data: UserRegister, db: Session = Depends(get_db)):
     """Register a new user"""
     # Check if user already exists
@@ -257,7 +867,7 @@ def register_user(user_data: UserRegister, db: Session = Depends(get_db)):
         user=user_response
     )
 
-@app.post("/auth/login", response_model=Token)
+@router.post("/auth/login", response_model=Token)
 def login_user(credentials: UserLogin, db: Session = Depends(get_db)):
     """Authenticate user and return JWT token"""
     user = db.query(User).filter(User.email == credentials.email).first()
@@ -283,7 +893,7 @@ def login_user(credentials: UserLogin, db: Session = Depends(get_db)):
         user=user_response
     )
 
-@app.get("/auth/me", response_model=UserResponse)
+@router.get("/auth/me", response_model=UserResponse)
 def get_current_user_info(token: str, db: Session = Depends(get_db)):
     """Get current logged in user information"""
     user = get_current_user(token, db)
@@ -294,7 +904,7 @@ def get_current_user_info(token: str, db: Session = Depends(get_db)):
         )
     return UserResponse.from_orm(user)
 
-@app.put("/auth/profile", response_model=UserResponse)
+@router.put("/auth/profile", response_model=UserResponse)
 def update_user_profile(
     user_update: UserUpdate,
     token: str,
@@ -325,7 +935,7 @@ def update_user_profile(
     
     return UserResponse.from_orm(user)
 
-@app.get("/auth/bookings", response_model=List[Dict])
+@router.get("/auth/bookings", response_model=List[Dict])
 def get_user_bookings(token: str, db: Session = Depends(get_db)):
     """Get all bookings for the authenticated user"""
     user = get_current_user(token, db)
@@ -337,6 +947,7 @@ def get_user_bookings(token: str, db: Session = Depends(get_db)):
     
     # Get bookings for this user
     bookings = db.query(Booking).filter(Booking.user_id == user.id).all()
+    bookings += find_archived_bookings(db, user_id=user.id)
     
     result = []
     for booking in bookings:
@@ -344,7 +955,7 @@ def get_user_bookings(token: str, db: Session = Depends(get_db)):
         if flight:
             origin = db.query(Airport).filter(Airport.id == flight.origin_id).first()
             destination = db.query(Airport).filter(Airport.id == flight.destination_id).first()
-            seat = db.query(Seat).filter(Seat.id == booking.seat_id).first() if booking.seat_id else None
+            seat_number, seat_class = booking_seat(db, booking)
             
             result.append({
                 "id": booking.id,
@@ -366,8 +977,8 @@ def get_user_bookings(token: str, db: Session = Depends(get_db)):
                 "passenger_name": booking.passenger_name,
                 "passenger_email": booking.passenger_email,
                 "passenger_phone": booking.passenger_phone,
-                "seat_number": seat.seat_number if seat else None,
-                "seat_class": seat._class if seat else None,
+                "seat_number": seat_number,
+                "seat_class": seat_class,
                 "total_price": float(booking.total_price),
                 "booking_status": booking.booking_status if hasattr(booking, 'booking_status') else 'confirmed',
                 "booking_time": booking.booking_date.isoformat() if booking.booking_date else None
@@ -375,18 +986,395 @@ def get_user_bookings(token: str, db: Session = Depends(get_db)):
     
     return result
 
+# Reference data (airports, airlines) changes rarely; it is preloaded at startup and
+# reloaded every REFERENCE_DATA_TTL_SECONDS instead of being queried on every request.
+REFERENCE_DATA_TTL_SECONDS = float(os.getenv("REFERENCE_DATA_TTL_SECONDS", 300))
+
+class ReferenceDataCache:
+    """Detached Airport/Airline rows, indexed by id and airport code"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self.airports: List[Airport] = []
+        self.airlines: List[Airline] = []
+        self.airports_by_id: Dict[int, Airport] = {}
+        self.airports_by_code: Dict[str, Airport] = {}
+        self.airlines_by_id: Dict[int, Airline] = {}
+
+    def load(self):
+        if engine is None:
+            init_database()
+        db = readSessionLocal()
+        try:
+            airports = db.query(Airport).order_by(Airport.id).all()
+            airlines = db.query(Airline).order_by(Airline.id).all()
+            db.expunge_all()
+        finally:
+            db.close()
+        with self._lock:
+            self.airports = airports
+            self.airlines = airlines
+            self.airports_by_id = {airport.id: airport for airport in airports}
+            self.airports_by_code = {airport.code.upper(): airport for airport in airports}
+            self.airlines_by_id = {airline.id: airline for airline in airlines}
+            self._loaded_at = time.monotonic()
+
+    @property
+    def loaded_at(self) -> Optional[float]:
+        return self._loaded_at
+
+    def ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+            self.load()
+        return self
+
+    def airport_by_code(self, db: Session, code: str) -> Optional[Airport]:
+        airport = self.ensure_loaded().airports_by_code.get(code.upper())
+        # Not cached yet (added since the last load): fall back to the database
+        return airport or db.query(Airport).filter(Airport.code == code.upper()).first()
+
+    def airport(self, db: Session, airport_id: int) -> Optional[Airport]:
+        return self.ensure_loaded().airports_by_id.get(airport_id) or db.query(Airport).get(airport_id)
+
+    def airline(self, db: Session, airline_id: int) -> Optional[Airline]:
+        return self.ensure_loaded().airlines_by_id.get(airline_id) or db.query(Airline).get(airline_id)
+
+reference_data = ReferenceDataCache(REFERENCE_DATA_TTL_SECONDS)
+
 # Utility Lookup Endpoints
-@app.get("/airports", response_model=List[AirportListSchema])
-def get_airports(db: Session = Depends(get_db)):
+@router.get("/airports", response_model=List[AirportListSchema])
+def get_airports():
     """Retrieves all airports for use in search dropdowns."""
-    airports = db.query(Airport).all()
-    return airports
+    return reference_data.ensure_loaded().airports
 
-@app.get("/airlines", response_model=List[AirlineListSchema])
-def get_airlines(db: Session = Depends(get_db)):
+@router.get("/airlines", response_model=List[AirlineListSchema])
+def get_airlines():
     """Retrieves all airlines."""
-    airlines = db.query(Airline).all()
-    return airlines
+    return reference_data.ensure_loaded().airlines
+
+# ============================================================================
+# Airport Autocomplete
+# ============================================================================
+# Typeahead over airport code, name, city and country. Every word of those fields is
+# inserted into a prefix trie; each trie node keeps its best few entries (by field and
+# route popularity), so a prefix is answered from one node without walking its subtree.
+# A word that is no prefix of any indexed word is matched with typos by walking the trie
+# with an edit-distance row per node (adjacent transpositions count as one edit) and
+# pruning branches that exceed the edit budget. The index is rebuilt in the background
+# whenever the reference data is reloaded.
+
+AUTOCOMPLETE_DEFAULT_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
+AUTOCOMPLETE_NODE_CANDIDATES = int(os.getenv("AUTOCOMPLETE_NODE_CANDIDATES", 32))
+AUTOCOMPLETE_POPULARITY_WEIGHT = float(os.getenv("AUTOCOMPLETE_POPULARITY_WEIGHT", 0.5))
+AUTOCOMPLETE_MAX_TOKEN_LENGTH = 16  # longer words are indexed and matched by this prefix
+AUTOCOMPLETE_CACHE_SIZE = 4096
+
+# Match quality of a word in each field; a full code match gets AUTOCOMPLETE_CODE_BONUS on top
+AUTOCOMPLETE_FIELD_WEIGHTS = {"code": 1.0, "city": 0.8, "name": 0.6, "country": 0.3}
+AUTOCOMPLETE_CODE_BONUS = 1.0
+NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+def normalize_search_text(value: str) -> str:
+    """Lowercase ASCII with accents removed and punctuation turned into spaces"""
+    value = value or ""
+    if not value.isascii():
+        decomposed = unicodedata.normalize("NFKD", value)
+        value = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return NON_ALNUM.sub(" ", value.lower())
+
+def max_edits_for(token: str) -> int:
+    """Typo budget: none for 1-3 letters, one up to 7 letters, two beyond"""
+    if len(token) <= 3:
+        return 0
+    return 1 if len(token) <= 7 else 2
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or limit + 1 once it is certain to exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            row[j] = min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], previous2[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+        previous2, previous = previous, row
+    return previous[-1]
+
+class _TrieNode:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.top: List[tuple] = []  # (static score, entry index, field), best first
+
+def _top_order(candidate: tuple) -> tuple:
+    return -candidate[0], candidate[1]
+
+class AirportSearchIndex:
+    """Prefix trie with typo-tolerant lookup over airports, ranked by match quality and popularity"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None  # reference data load the index was built from
+        self.root = _TrieNode()
+        self.entries: List[Dict[str, Any]] = []
+        self._cache: Dict[tuple, List[Dict[str, Any]]] = {}
+        self.queries = 0
+        self.cache_hits = 0
+
+    def build(self, airports: List[Airport], route_counts: Dict[int, int], version=None):
+        max_routes = max(route_counts.values(), default=0)
+        entries, root = [], _TrieNode()
+        # Most popular first: later airports are then mostly rejected at the full upper trie nodes
+        for airport in sorted(airports, key=lambda a: -route_counts.get(a.id, 0)):
+            routes = route_counts.get(airport.id, 0)
+            entry = {
+                "id": airport.id,
+                "code": airport.code,
+                "name": airport.name,
+                "city": airport.city,
+                "country": airport.country,
+                "routes": routes,
+                "popularity": math.log1p(routes) / math.log1p(max_routes) if max_routes else 0.0,
+                "words": {
+                    field: normalize_search_text(getattr(airport, field)).split()
+                    for field in AUTOCOMPLETE_FIELD_WEIGHTS
+                }
+            }
+            entries.append(entry)
+            index = len(entries) - 1
+            # Each distinct word once, under the best field it appears in
+            word_fields: Dict[str, str] = {}
+            for field, words in entry["words"].items():
+                for word in words:
+                    word = word[:AUTOCOMPLETE_MAX_TOKEN_LENGTH]
+                    if AUTOCOMPLETE_FIELD_WEIGHTS[field] > AUTOCOMPLETE_FIELD_WEIGHTS.get(word_fields.get(word), -1):
+                        word_fields[word] = field
+            for word, field in word_fields.items():
+                static_score = AUTOCOMPLETE_FIELD_WEIGHTS[field] + AUTOCOMPLETE_POPULARITY_WEIGHT * entry["popularity"]
+                self._insert(root, word, (static_score, index, field))
+        with self._lock:
+            self.root, self.entries, self.version = root, entries, version
+            self._cache = {}
+
+    @staticmethod
+    def _insert(root: _TrieNode, word: str, candidate: tuple):
+        node = root
+        for ch in word:
+            child = node.children.get(ch)
+            if child is None:
+                child = node.children[ch] = _TrieNode()
+            node = child
+            top = node.top
+            if len(top) >= AUTOCOMPLETE_NODE_CANDIDATES and _top_order(candidate) >= _top_order(top[-1]):
+                continue
+            for i, existing in enumerate(top):
+                if existing[1] == candidate[1]:
+                    # Same airport through another word with this prefix: keep the better field
+                    if existing[0] < candidate[0]:
+                        top[i] = candidate
+                        top.sort(key=_top_order)
+                    break
+            else:
+                bisect.insort(top, candidate, key=_top_order)
+                del top[AUTOCOMPLETE_NODE_CANDIDATES:]
+
+    def _matches(self, root: _TrieNode, token: str) -> Dict[int, tuple]:
+        """
+        entry index -> (edits, field) for entries with a word starting with token. Typo
+        matches are only searched when no word starts with token.
+        """
+        token = token[:AUTOCOMPLETE_MAX_TOKEN_LENGTH]
+        found: Dict[int, tuple] = {}
+
+        def collect(node: _TrieNode, edits: int):
+            for _, index, field in node.top:
+                if index not in found or found[index][0] > edits:
+                    found[index] = (edits, field)
+
+        node = root
+        for ch in token:
+            node = node.children.get(ch)
+            if node is None:
+                break
+        else:
+            collect(node, 0)
+        budget = max_edits_for(token)
+        if budget == 0 or found or token[0] not in root.children:
+            return found
+
+        # Depth-first walk carrying the edit-distance row of each prefix against token.
+        # Only the diagonal band |depth - j| <= budget of a row can stay within budget, so
+        # cells outside it are left at budget + 1. The first letter is taken as typed; a
+        # node within budget covers its subtree through its candidate list, so the walk
+        # stops there.
+        size, over = len(token), budget + 1
+        first = [min(j, over) for j in range(size + 1)]
+        stack = [(root.children[token[0]], token[0], "", 1, first, None)]
+        while stack:
+            node, ch, previous_ch, depth, previous, previous2 = stack.pop()
+            row = [over] * (size + 1)
+            row[0] = min(depth, over)
+            lowest = row[0]
+            for j in range(max(1, depth - budget), min(size, depth + budget) + 1):
+                value = previous[j - 1] + (token[j - 1] != ch)
+                if previous[j] + 1 < value:
+                    value = previous[j] + 1
+                if row[j - 1] + 1 < value:
+                    value = row[j - 1] + 1
+                if previous2 is not None and j > 1 and token[j - 1] == previous_ch and token[j - 2] == ch \
+                        and previous2[j - 2] + 1 < value:
+                    value = previous2[j - 2] + 1
+                row[j] = value if value < over else over
+                if row[j] < lowest:
+                    lowest = row[j]
+            if row[size] <= budget:
+                collect(node, row[size])
+            elif lowest < budget:
+                stack.extend((child, next_ch, ch, depth + 1, row, previous) for next_ch, child in node.children.items())
+            elif lowest == budget:
+                # Budget used up: only letters continuing an alignment exactly can still match
+                for next_ch in {token[j] for j in range(size) if row[j] == budget}:
+                    child = node.children.get(next_ch)
+                    if child is not None:
+                        stack.append((child, next_ch, ch, depth + 1, row, previous))
+        return found
+
+    def search(self, query: str, limit: int = AUTOCOMPLETE_DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+        tokens = normalize_search_text(query).split()
+        if not tokens:
+            return []
+        key = (" ".join(tokens), limit)
+        with self._lock:
+            self.queries += 1
+            root, entries, cached = self.root, self.entries, self._cache.get(key)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+
+        # Candidates come from the most selective (longest) word; the others are checked per candidate
+        anchor = max(tokens, key=len)
+        others = list(tokens)
+        others.remove(anchor)
+        scored = []
+        for index, (edits, field) in self._matches(root, anchor).items():
+            entry = entries[index]
+            quality = self._quality(entry, anchor, field, edits)
+            for token in others:
+                best = max((self._word_quality(entry, token, f) for f in AUTOCOMPLETE_FIELD_WEIGHTS), default=0.0)
+                if best <= 0:
+                    break
+                quality += best
+            else:
+                score = quality / len(tokens) + AUTOCOMPLETE_POPULARITY_WEIGHT * entry["popularity"]
+                scored.append((score, entry, field, edits))
+
+        scored.sort(key=lambda item: (-item[0], item[1]["code"]))
+        results = [
+            {
+                "code": entry["code"],
+                "name": entry["name"],
+                "city": entry["city"],
+                "country": entry["country"],
+                "matched": field,
+                "typo": edits > 0,
+                "routes": entry["routes"],
+                "score": round(score, 4)
+            }
+            for score, entry, field, edits in scored[:limit]
+        ]
+        with self._lock:
+            if len(self._cache) >= AUTOCOMPLETE_CACHE_SIZE:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = results
+        return results
+
+    @staticmethod
+    def _quality(entry: Dict[str, Any], token: str, field: str, edits: int) -> float:
+        quality = AUTOCOMPLETE_FIELD_WEIGHTS[field]
+        if field == "code" and edits == 0 and token == entry["words"]["code"][0]:
+            quality += AUTOCOMPLETE_CODE_BONUS
+        elif token in entry["words"][field]:
+            quality += 0.2  # a whole word, not only a prefix
+        # Each typo costs a third of the match
+        return quality * (1 - edits / 3)
+
+    def _word_quality(self, entry: Dict[str, Any], token: str, field: str) -> float:
+        limit = max_edits_for(token)
+        best_edits = None
+        for word in entry["words"][field]:
+            if word.startswith(token):
+                best_edits = 0
+                break
+            if limit:
+                edits = edit_distance(token, word[:len(token)], limit)
+                if edits <= limit and (best_edits is None or edits < best_edits):
+                    best_edits = edits
+        return 0.0 if best_edits is None else self._quality(entry, token, field, best_edits)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"airports": len(self.entries), "queries": self.queries, "cache_hits": self.cache_hits,
+                    "cached_queries": len(self._cache)}
+
+airport_index = AirportSearchIndex()
+_airport_index_build_lock = threading.Lock()
+
+def airport_route_counts(db: Session) -> Dict[int, int]:
+    """Flights touching each airport, as origin or destination"""
+    counts: Dict[int, int] = {}
+    for column in (Flight.origin_id, Flight.destination_id):
+        for airport_id, flights in db.query(column, func.count(Flight.id)).group_by(column).all():
+            counts[airport_id] = counts.get(airport_id, 0) + flights
+    return counts
+
+def rebuild_airport_index(version):
+    with _airport_index_build_lock:
+        if airport_index.version == version:
+            return
+        db = readSessionLocal()
+        try:
+            route_counts = airport_route_counts(db)
+        finally:
+            db.close()
+        airport_index.build(reference_data.airports, route_counts, version)
+
+def ensure_airport_index() -> AirportSearchIndex:
+    """
+    Build the index on first use; after a reference data reload, rebuild it in the
+    background and keep answering from the previous one meanwhile.
+    """
+    reference_data.ensure_loaded()
+    version = reference_data.loaded_at
+    if airport_index.version is None:
+        rebuild_airport_index(version)
+    elif airport_index.version != version and not _airport_index_build_lock.locked():
+        threading.Thread(target=rebuild_airport_index, args=(version,), name="airport-index", daemon=True).start()
+    return airport_index
+
+@router.get("/airports/autocomplete")
+def autocomplete_airports(q: str, limit: int = AUTOCOMPLETE_DEFAULT_LIMIT):
+    """Airports matching a partial code, name, city or country, best first"""
+    if not 1 <= limit <= AUTOCOMPLETE_MAX_LIMIT:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"limit must be between 1 and {AUTOCOMPLETE_MAX_LIMIT}.")
+    index = ensure_airport_index()
+    started = time.perf_counter()
+    results = index.search(q, limit)
+    return {"query": q, "results": results, "took_us": round((time.perf_counter() - started) * 1_000_000, 1)}
+
+@router.get("/admin/airports/autocomplete")
+def get_autocomplete_stats():
+    """Size of the autocomplete index and query/cache counts"""
+    return ensure_airport_index().stats()
 
 # ============================================================================
 # MILESTONE 2: Dynamic Pricing Engine
@@ -402,8 +1390,8 @@ PRICING_TIERS = {
 def get_tier_factor(seat_class: str) -> float:
     return PRICING_TIERS.get(seat_class, 0.00)
 
-def get_time_factor(departure_time: datetime) -> float:
-    time_difference = departure_time - datetime.now()
+def get_time_factor(departure_time: datetime, now: Optional[datetime] = None) -> float:
+    time_difference = departure_time - (now or datetime.now())
     days_to_departure = time_difference.total_seconds() / (60 * 60 * 24)
 
     if days_to_departure < 0:
@@ -434,14 +1422,29 @@ def get_seat_factor(seats_available: int, total_seats: int) -> float:
     else:
         return 0.00
 
-def calculate_dynamic_price(flight: Flight, seat_class: str, db: Session) -> float:
+def calculate_fare(flight: Flight, seat_class: str, seats_available: int, total_seats: int,
+                   now: Optional[datetime] = None) -> float:
+    """The pricing formula, given the seat counts for the class"""
+    if total_seats == 0:
+        return 0.0
+
     base_price = float(flight.base_price)
     tier_factor = get_tier_factor(seat_class)
-    time_factor = get_time_factor(flight.departure_time)
+    time_factor = get_time_factor(flight.departure_time, now)
 
     demand_factor_multiplier = float(flight.demand_level)
     demand_factor = (demand_factor_multiplier - 1.0)
 
+    seat_factor = get_seat_factor(seats_available, total_seats)
+
+    total_factor = tier_factor + time_factor + demand_factor + seat_factor
+
+    final_multiplier = max(1.0 + total_factor, 0.5)
+    final_price = base_price * final_multiplier
+    return round(final_price, 2)
+
+def calculate_dynamic_price(flight: Flight, seat_class: str, db: Session) -> float:
+    """Live price from the current seat inventory (the fare table is checked against this)"""
     total_seats_in_class = db.query(Seat).filter(
         and_(Seat.flight_id == flight.id, Seat._class == seat_class)
     ).count()
@@ -450,152 +1453,1263 @@ def calculate_dynamic_price(flight: Flight, seat_class: str, db: Session) -> flo
         and_(Seat.flight_id == flight.id, Seat._class == seat_class, Seat.is_available == True)
     ).count()
 
-    if total_seats_in_class == 0:
-        return 0.0 
-    
-    seat_factor = get_seat_factor(seats_available_in_class, total_seats_in_class)
+    return calculate_fare(flight, seat_class, seats_available_in_class, total_seats_in_class)
 
-    total_factor = tier_factor + time_factor + demand_factor + seat_factor
+# ============================================================================
+# Materialized Fare Table
+# ============================================================================
+# Prices only change on inventory/demand events and when a flight crosses one of the
+# get_time_factor() day thresholds, so they are stored per (flight, class) and refreshed
+# incrementally. Read endpoints look fares up by primary key instead of re-pricing.
 
-    final_multiplier = max(1.0 + total_factor, 0.5)
-    final_price = base_price * final_multiplier
-    return round(final_price, 2)
+# Days before departure at which get_time_factor() changes value
+TIME_FACTOR_BOUNDARY_DAYS = [90, 30, 7, 3, 0]
+FARE_REFRESH_INTERVAL_SECONDS = float(os.getenv("FARE_REFRESH_INTERVAL_SECONDS", 60))
+FARE_REFRESH_BATCH_SIZE = 500
 
-# Flight Search API Endpoints with Dynamic Pricing Integration
-@app.post("/flights/search")
-def search_flights(search_data: FlightSearchRequest, db: Session = Depends(get_db)):
-    try:
-        departure_date = datetime.strptime(search_data.departure_date, "%Y-%m-%d").date()
-    except ValueError:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date format. Use YYYY-MM-DD.")
+class FareSnapshot(Base):
+    __tablename__ = "fare_table"
+    flight_id = Column(Integer, ForeignKey('flights.id'), primary_key=True)
+    seat_class = Column(String(20), primary_key=True)
+    price = Column(DECIMAL(10, 2), nullable=False)
+    seats_available = Column(Integer, nullable=False)
+    total_seats = Column(Integer, nullable=False)
+    computed_at = Column(DateTime, nullable=False)
+    valid_until = Column(DateTime, nullable=True)  # next time-factor boundary, NULL once departed
 
-    origin_airport = db.query(Airport).filter(Airport.code == search_data.origin.upper()).first()
-    destination_airport = db.query(Airport).filter(Airport.code == search_data.destination.upper()).first()
+def next_time_factor_boundary(departure_time: datetime, now: datetime) -> Optional[datetime]:
+    """The next moment get_time_factor() changes for this departure"""
+    upcoming = [departure_time - timedelta(days=days) for days in TIME_FACTOR_BOUNDARY_DAYS]
+    upcoming = [boundary for boundary in upcoming if boundary > now]
+    return min(upcoming) if upcoming else None
 
-    if not origin_airport or not destination_airport:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Origin or destination airport not found.")
-    
-    flights = db.query(Flight).filter(
-        Flight.origin_id == origin_airport.id,
-        Flight.destination_id == destination_airport.id,
-        func.date(Flight.departure_time) == departure_date
-    ).all()
+def count_seats_by_class(db: Session, flight_ids: List[int], seat_classes: Optional[set] = None) -> Dict[tuple, tuple]:
+    """(flight_id, class) -> (seats_available, total_seats) for many flights in one query"""
+    if not flight_ids:
+        return {}
+    query = db.query(
+        Seat.flight_id,
+        Seat._class,
+        func.sum(case((Seat.is_available == True, 1), else_=0)),
+        func.count(Seat.id)
+    ).filter(Seat.flight_id.in_(flight_ids))
+    if seat_classes:
+        query = query.filter(Seat._class.in_(seat_classes))
+    rows = query.group_by(Seat.flight_id, Seat._class).all()
+    return {(flight_id, seat_class): (int(available or 0), int(total)) for flight_id, seat_class, available, total in rows}
 
-    if not flights:
-        return {"message": "No flights found for this route and date."}
-    
-    results = []
+def build_fare_rows(flights: List[Flight], counts: Dict[tuple, tuple], now: datetime) -> Dict[tuple, Dict[str, Any]]:
+    flights_by_id = {flight.id: flight for flight in flights}
+    rows = {}
+    for (flight_id, seat_class), (available, total) in counts.items():
+        flight = flights_by_id.get(flight_id)
+        if flight is None:
+            continue
+        rows[(flight_id, seat_class)] = {
+            "price": calculate_fare(flight, seat_class, available, total, now),
+            "seats_available": available,
+            "total_seats": total,
+            "computed_at": now,
+            "valid_until": next_time_factor_boundary(flight.departure_time, now)
+        }
+    return rows
 
-    available_classes = db.query(Seat._class).filter(
-        Seat.flight_id.in_([f.id for f in flights]), 
-        Seat.is_available == True
-    ).distinct().all()
+def refresh_fares(db: Session, flight_ids: List[int], seat_classes: Optional[set] = None) -> int:
+    """Recompute and store the fare rows for the given flights (only the given classes if set)"""
+    flight_ids = list(set(flight_ids))
+    if not flight_ids:
+        return 0
+    flights = db.query(Flight).filter(Flight.id.in_(flight_ids)).all()
 
-    unique_classes = set([cls[0] for cls in available_classes])
+    for attempt in range(2):
+        # Lock the flights' fare rows before counting seats: concurrent refreshes of a flight
+        # (a booking and the scheduler) then commit in the order they counted, so an older
+        # count never overwrites a newer one
+        existing = {
+            (row.flight_id, row.seat_class): row
+            for row in db.query(FareSnapshot).filter(FareSnapshot.flight_id.in_(flight_ids)).order_by(
+                FareSnapshot.flight_id, FareSnapshot.seat_class
+            ).with_for_update()
+        }
+        now = datetime.now()
+        counts = count_seats_by_class(db, flight_ids, seat_classes)
+        rows = build_fare_rows(flights, counts, now)
+        # Capacity rarely changes: only classes this process has not recorded yet, or whose
+        # seat total changed, touch the load rollup, so bookings do not pay for analytics
+        capacity = {key: value for key, value in counts.items() if _recorded_capacity.get(key) != value[1]}
+        record_flight_capacity(db, capacity)
+        changed = {}
+        for key, values in rows.items():
+            row = existing.get(key)
+            if row is None or float(row.price) != values["price"] or row.seats_available != values["seats_available"]:
+                changed[key] = values
+            if row is None:
+                db.add(FareSnapshot(flight_id=key[0], seat_class=key[1], **values))
+            else:
+                for name, value in values.items():
+                    setattr(row, name, value)
+        # Written while the rows are locked, so other workers see the fares in commit order too
+        shared_inventory.write_fares(flight_ids, rows, complete=not seat_classes)
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent refresh inserted the same row first; retry as an update
+            db.rollback()
+            continue
+        except Exception:
+            db.rollback()
+            shared_inventory.invalidate(flight_ids)
+            raise
+        _recorded_capacity.update({key: total for key, (_, total) in capacity.items()})
+        fare_history.record(changed, now)
+        # Search results are built from the fare table, so they are stale from here on
+        search_cache.invalidate_flights(flight_ids)
+        return len(rows)
+    shared_inventory.invalidate(flight_ids)
+    return 0
 
-    for flight in flights:
-        flight_data: Dict[str, Any] = {
-            "flight_id": flight.id,
-            "flight_number": flight.flight_number,
-            "origin": origin_airport.code,
-            "destination": destination_airport.code,
-            "departure_time": flight.departure_time,
-            "arrival_time": flight.arrival_time,
-            "base_economy_price": float(flight.base_price),
-            "pricing": {}
+def get_fares(db: Session, flight_ids: List[int], seat_classes: Optional[set] = None) -> Dict[tuple, Dict[str, Any]]:
+    """
+    (flight_id, class) -> {"price", "seats_available", ...} by primary-key lookup.
+    Missing rows and rows past their time boundary are priced in memory and queued
+    for the background refresher, so reads never write (and work on a replica).
+    """
+    if not flight_ids:
+        return {}
+    now = datetime.now()
+    fares = {}
+    if shared_inventory.enabled:
+        # Flights another worker on this host already has current fares for
+        remaining = []
+        for flight_id in flight_ids:
+            shared = shared_inventory.read_fares(flight_id, now)
+            if shared is None:
+                remaining.append(flight_id)
+                continue
+            for seat_class, fare in shared.items():
+                if not seat_classes or seat_class in seat_classes:
+                    fares[(flight_id, seat_class)] = fare
+        if not remaining:
+            return fares
+        flight_ids = remaining
+    query = db.query(FareSnapshot).filter(FareSnapshot.flight_id.in_(flight_ids))
+    if seat_classes:
+        query = query.filter(FareSnapshot.seat_class.in_(seat_classes))
+    found = set()
+    expired = set()
+    for row in query:
+        found.add(row.flight_id)
+        # All classes of a flight share the same boundary, so one expired row means the flight is due
+        if row.valid_until is not None and row.valid_until <= now:
+            expired.add(row.flight_id)
+            continue
+        fares[(row.flight_id, row.seat_class)] = {
+            "price": float(row.price),
+            "seats_available": row.seats_available,
+            "total_seats": row.total_seats,
+            "computed_at": row.computed_at,
+            "valid_until": row.valid_until
         }
+    if shared_inventory.enabled and not seat_classes:
+        shared_inventory.write_fares(list(found - expired), fares, complete=True)
+    stale = (set(flight_ids) - found) | expired
+    if stale:
+        flights = db.query(Flight).filter(Flight.id.in_(stale)).all()
+        live = build_fare_rows(flights, count_seats_by_class(db, list(stale), seat_classes), now)
+        fares.update(live)
+        if live:
+            fare_scheduler.mark_dirty({flight_id for flight_id, _ in live})
+    return fares
 
-        for seat_class in unique_classes:
-            seats_available = db.query(Seat).filter(
-                and_(Seat.flight_id == flight.id, Seat.is_available == True, Seat._class == seat_class)
-            ).count()
-            
-            if seats_available > 0:
-                current_price = calculate_dynamic_price(flight, seat_class, db)
-                if current_price > 0:
-                    flight_data["pricing"][seat_class] = {
-                        "price": current_price,
-                        "seats_available": seats_available
-                    }
-        
-        if flight_data["pricing"]:
-            results.append(flight_data)
-    
-    return {"flights": results}
+def refresh_due_fares(db: Session) -> int:
+    """Refresh every flight whose fare rows crossed a time-factor boundary"""
+    due = [flight_id for (flight_id,) in db.query(FareSnapshot.flight_id).filter(
+        FareSnapshot.valid_until <= datetime.now()
+    ).distinct()]
+    refreshed = 0
+    for i in range(0, len(due), FARE_REFRESH_BATCH_SIZE):
+        refreshed += refresh_fares(db, due[i:i + FARE_REFRESH_BATCH_SIZE])
+    return refreshed
 
-@app.get("/flights/{flight_id}")
-def get_flight_details(flight_id: int, db: Session = Depends(get_db)):
-    flight = db.query(Flight).filter(Flight.id == flight_id).first()
-    if not flight:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Flight not found.")
-    
-    airline = db.query(Airline).get(flight.airline_id)
-    origin = db.query(Airport).get(flight.origin_id)
-    destination = db.query(Airport).get(flight.destination_id)
-    seats = db.query(Seat).filter(Seat.flight_id == flight_id).all()
+def rebuild_fare_table(db: Session) -> int:
+    """Refresh the fare rows of every flight"""
+    flight_ids = [flight_id for (flight_id,) in db.query(Flight.id)]
+    refreshed = 0
+    for i in range(0, len(flight_ids), FARE_REFRESH_BATCH_SIZE):
+        refreshed += refresh_fares(db, flight_ids[i:i + FARE_REFRESH_BATCH_SIZE])
+    return refreshed
 
-    unique_classes = set(s._class for s in seats)
-    pricing_details = {}
+def check_fare_table(db: Session, limit: int = 1000) -> Dict[str, Any]:
+    """Compare stored fares against the live pricing formula"""
+    rows = db.query(FareSnapshot).order_by(FareSnapshot.flight_id, FareSnapshot.seat_class).limit(limit).all()
+    flights = {flight.id: flight for flight in db.query(Flight).filter(Flight.id.in_({row.flight_id for row in rows}))}
+    counts = count_seats_by_class(db, list(flights))
+    mismatches = []
+    for row in rows:
+        flight = flights.get(row.flight_id)
+        available, total = counts.get((row.flight_id, row.seat_class), (0, 0))
+        live_price = calculate_fare(flight, row.seat_class, available, total) if flight else 0.0
+        if float(row.price) != live_price or row.seats_available != available or row.total_seats != total:
+            mismatches.append({
+                "flight_id": row.flight_id,
+                "seat_class": row.seat_class,
+                "stored_price": float(row.price),
+                "live_price": live_price,
+                "stored_seats_available": row.seats_available,
+                "live_seats_available": available,
+                "computed_at": row.computed_at
+            })
+    return {"checked": len(rows), "mismatches": mismatches}
 
-    for seat_class in unique_classes:
-        seats_available = db.query(Seat).filter(
-            and_(Seat.flight_id == flight_id, Seat.is_available == True, Seat._class == seat_class)
-        ).count()
-        if seats_available > 0:
-            pricing_details[seat_class] = {
-                "current_price": calculate_dynamic_price(flight, seat_class, db),
-                "seats_available": seats_available
-            }
+class FareRefreshScheduler:
+    """
+    Background thread that writes queued (dirty) flights to the fare table and
+    refreshes flights crossing a time-factor boundary every FARE_REFRESH_INTERVAL_SECONDS.
+    """
 
-    seat_list = [{
-        "seat_number": s.seat_number,
-        "class": s._class,
-        "is_available": s.is_available
-    } for s in seats]
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._dirty: set = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
 
-    return {
-        "flight_id": flight.id,
-        "flight_number": flight.flight_number,
-        "airline_name": airline.name,
-        "origin_airport": origin.code,
-        "destination_airport": destination.code,
-        "departure_time": flight.departure_time,
-        "arrival_time": flight.arrival_time,
-        "base_economy_price": float(flight.base_price),
-        "dynamic_pricing": pricing_details,
-        "seats": seat_list
-    }
+    def mark_dirty(self, flight_ids):
+        with self._lock:
+            self._dirty.update(flight_ids)
+        self._wake.set()
 
-# Background Process to Simulate Demand/Availability Changes
-@app.post("/admin/simulate_demand")
-def simulate_demand_changes(db: Session = Depends(get_db)):
-    """Background process to simulate real-world demand shifts"""
-    flights_to_update = db.query(Flight).filter(Flight.departure_time > datetime.now()).all()
-    
-    updates_count = 0
-    new_demand_level = 1.0
-    
-    for flight in flights_to_update:
-        new_demand_level = round(random.uniform(0.95, 1.05), 3)
-        flight.demand_level = new_demand_level
-        db.add(flight)
-        updates_count += 1
-    
-    try:
-        db.commit()
-        return {"message": f"Simulated demand updated for {updates_count} flights.",
-                "example_demand_level": new_demand_level}
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to update demand: {str(e)}")
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="fare-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run_once(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        db = sessionLocal()
+        try:
+            dirty = list(dirty)
+            for i in range(0, len(dirty), FARE_REFRESH_BATCH_SIZE):
+                refresh_fares(db, dirty[i:i + FARE_REFRESH_BATCH_SIZE])
+            refresh_due_fares(db)
+        except Exception:
+            db.rollback()
+            logger.exception("Fare refresh of %d flights failed; retrying", len(dirty))
+            self.mark_dirty(dirty)
+        finally:
+            db.close()
+
+    def _run(self):
+        next_boundary_check = 0.0
+        while not self._stop.is_set():
+            self._wake.wait(timeout=self.interval_seconds)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            with self._lock:
+                has_dirty = bool(self._dirty)
+            if has_dirty or time.monotonic() >= next_boundary_check:
+                self.run_once()
+                next_boundary_check = time.monotonic() + self.interval_seconds
+            # Batch bursts of dirty flights instead of refreshing on every mark
+            self._stop.wait(0.5)
+
+fare_scheduler = FareRefreshScheduler(FARE_REFRESH_INTERVAL_SECONDS)
+
+def on_inventory_change(db: Session, flight_id: int, seat_changes: Optional[List[Dict[str, Any]]] = None,
+                        reprice: bool = False):
+    """
+    Propagate a committed seat change (or, with reprice=True, a demand change) to the
+    fare table and to live seat-map subscribers.
+    """
+    seat_classes = None if reprice else {change["class"] for change in seat_changes or []}
+    if reprice or seat_classes:
+        try:
+            refresh_fares(db, [flight_id], seat_classes)
+        except Exception:
+            db.rollback()
+            shared_inventory.invalidate([flight_id])
+            fare_scheduler.mark_dirty([flight_id])
+    seat_events.publish(flight_id, seat_changes, reprice=reprice)
+
+@router.post("/admin/fares/rebuild")
+def rebuild_fares(db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+    """Recompute the whole fare table from the live inventory"""
+    refreshed = rebuild_fare_table(db)
+    return {"message": f"Refreshed {refreshed} fare rows."}
+
+@router.get("/admin/fares/check")
+def check_fares(limit: int = 1000, db: Session = Depends(get_db)):
+    """Consistency check of the fare table against the live pricing formula"""
+    return check_fare_table(db, limit)
 
 # ============================================================================
-# MILESTONE 3: Booking Workflow & Transaction Management
+# Fare History
 # ============================================================================
+# Every fare change stored by refresh_fares() is also kept as a sample of
+# (time, price, seats_available) per flight and class, for price trends and for
+# auditing how demand and seat factors moved prices. refresh_fares() only queues the
+# changed rows; a background writer appends them in batches to segments of up to
+# FARE_HISTORY_SEGMENT_SAMPLES samples. A segment stores its three columns one after
+# another, each as zigzag varints of the difference to the previous value. Prices
+# usually move by a few currency units and seat counts by one, so most samples take
+# a few bytes. Trend queries decode the segments overlapping the requested window and
+# downsample them into at most `points` time buckets.
 
-# Booking-related Database Models
-class Booking(Base):
-    __tablename__ = "bookings"
+FARE_HISTORY_ENABLED = env_flag("FARE_HISTORY_ENABLED", True)
+FARE_HISTORY_FLUSH_SECONDS = float(os.getenv("FARE_HISTORY_FLUSH_SECONDS", 5))
+FARE_HISTORY_SEGMENT_SAMPLES = int(os.getenv("FARE_HISTORY_SEGMENT_SAMPLES", 256))
+FARE_HISTORY_BATCH_SAMPLES = 5000  # flush early once this many samples are queued
+FARE_HISTORY_MAX_BUFFERED = 200000  # beyond this new samples are dropped
+FARE_HISTORY_DEFAULT_POINTS = 100
+FARE_HISTORY_MAX_POINTS = 1000
+FARE_HISTORY_ROUTE_DAYS = 30  # default window of route trends
+FARE_HISTORY_ROUTE_MAX_FLIGHTS = 1000
+FARE_SEGMENT_FORMAT = 1
+
+class FareHistorySegment(Base):
+    __tablename__ = "fare_history_segments"
+    id = Column(Integer, primary_key=True)
+    flight_id = Column(Integer, ForeignKey('flights.id'), nullable=False)
+    seat_class = Column(String(20), nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime, nullable=False)
+    samples = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)  # encode_fare_segment()
+
+def encode_fare_segment(samples: List[tuple]) -> bytes:
+    """[(epoch_seconds, price_cents, seats_available)] -> format byte + three delta-encoded columns"""
+    out = bytearray([FARE_SEGMENT_FORMAT])
+    for column in range(3):
+        previous = 0
+        for sample in samples:
+            delta = sample[column] - previous
+            previous = sample[column]
+            value = delta * 2 if delta >= 0 else -delta * 2 - 1  # zigzag: small magnitudes stay small
+            while value >= 0x80:
+                out.append((value & 0x7F) | 0x80)
+                value >>= 7
+            out.append(value)
+    return bytes(out)
+
+def decode_fare_segment(data: bytes, count: int) -> List[tuple]:
+    if data[0] != FARE_SEGMENT_FORMAT:
+        raise ValueError(f"unknown fare segment format {data[0]}")
+    columns = []
+    position = 1
+    for _ in range(3):
+        values = []
+        previous = 0
+        for _ in range(count):
+            value = shift = 0
+            while True:
+                byte = data[position]
+                position += 1
+                value |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            previous += (value >> 1) if not value & 1 else -((value + 1) >> 1)
+            values.append(previous)
+        columns.append(values)
+    return list(zip(*columns))
+
+_fare_history_installed = False
+
+def fare_history_installed(db: Session) -> bool:
+    """Whether fare_history_schema.sql has been applied (checked until it has)"""
+    global _fare_history_installed
+    if not _fare_history_installed:
+        _fare_history_installed = inspect(db.get_bind()).has_table(FareHistorySegment.__tablename__)
+    return _fare_history_installed
+
+def write_fare_history(db: Session, pending: Dict[tuple, List[tuple]]) -> int:
+    """Append queued samples to the open segment of each (flight, class), starting new ones when full or out of order"""
+    open_segments = {}
+    flight_ids = list({flight_id for flight_id, _ in pending})
+    for i in range(0, len(flight_ids), FARE_REFRESH_BATCH_SIZE):
+        # Locked so that two workers appending to the same segment cannot lose samples
+        for segment in db.query(FareHistorySegment).filter(
+            FareHistorySegment.flight_id.in_(flight_ids[i:i + FARE_REFRESH_BATCH_SIZE]),
+            FareHistorySegment.samples < FARE_HISTORY_SEGMENT_SAMPLES
+        ).order_by(FareHistorySegment.id).with_for_update():
+            open_segments[(segment.flight_id, segment.seat_class)] = segment  # the newest one wins
+    written = 0
+    for (flight_id, seat_class), samples in pending.items():
+        samples = sorted(samples)
+        segment = open_segments.get((flight_id, seat_class))
+        while samples:
+            stored = []
+            if segment is not None and segment.samples < FARE_HISTORY_SEGMENT_SAMPLES:
+                stored = decode_fare_segment(segment.data, segment.samples)
+                # Samples older than the segment's end (another worker flushed first) go to a new
+                # segment, so every segment stays in time order and its started_at/ended_at hold
+                if samples[0][0] < stored[-1][0]:
+                    stored = []
+            if not stored:
+                segment = FareHistorySegment(flight_id=flight_id, seat_class=seat_class, samples=0)
+                db.add(segment)
+            room = FARE_HISTORY_SEGMENT_SAMPLES - len(stored)
+            stored += samples[:room]
+            samples = samples[room:]
+            segment.data = encode_fare_segment(stored)
+            segment.samples = len(stored)
+            segment.started_at = datetime.fromtimestamp(stored[0][0])
+            segment.ended_at = datetime.fromtimestamp(stored[-1][0])
+            written += 1
+    db.commit()
+    return written
+
+class FareHistoryWriter:
+    """Queues fare changes in memory and writes them to fare_history_segments from a background thread"""
+
+    def __init__(self, flush_seconds: float):
+        self.flush_seconds = flush_seconds
+        self._pending: Dict[tuple, List[tuple]] = {}
+        self._pending_samples = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.samples_written = 0
+        self.segments_written = 0
+        self.dropped = 0
+        self.failures = 0
+
+    def record(self, fares: Dict[tuple, Dict[str, Any]], at: datetime):
+        """Queue (flight_id, class) -> {"price", "seats_available"} as samples taken at `at`"""
+        if not FARE_HISTORY_ENABLED or not fares:
+            return
+        timestamp = int(at.timestamp())
+        with self._lock:
+            if self._pending_samples + len(fares) > FARE_HISTORY_MAX_BUFFERED:
+                self.dropped += len(fares)
+                return
+            for key, fare in fares.items():
+                self._pending.setdefault(key, []).append(
+                    (timestamp, int(round(fare["price"] * 100)), fare["seats_available"])
+                )
+            self._pending_samples += len(fares)
+            full = self._pending_samples >= FARE_HISTORY_BATCH_SAMPLES
+        if full:
+            self._wake.set()
+
+    def start(self):
+        if FARE_HISTORY_ENABLED and (self._thread is None or not self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="fare-history", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the thread and write what is still queued"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_seconds + 5)
+        self.flush()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                queued, self._pending_samples = self._pending_samples, 0
+            if not pending:
+                return 0
+            db = sessionLocal()
+            try:
+                if not fare_history_installed(db):
+                    with self._lock:
+                        self.dropped += queued
+                    return 0
+                segments = write_fare_history(db, pending)
+            except Exception:
+                db.rollback()
+                logger.exception("Writing %d fare history samples failed; retrying", queued)
+                with self._lock:
+                    self.failures += 1
+                    for key, samples in pending.items():
+                        self._pending[key] = samples + self._pending.get(key, [])
+                    self._pending_samples += queued
+                return 0
+            finally:
+                db.close()
+            with self._lock:
+                self.samples_written += queued
+                self.segments_written += segments
+            return queued
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(timeout=self.flush_seconds)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": FARE_HISTORY_ENABLED,
+                "queued": self._pending_samples,
+                "samples_written": self.samples_written,
+                "segments_written": self.segments_written,
+                "dropped": self.dropped,
+                "failures": self.failures
+            }
+
+fare_history = FareHistoryWriter(FARE_HISTORY_FLUSH_SECONDS)
+
+def load_fare_history(db: Session, flight_ids: List[int], seat_class: Optional[str],
+                      start: datetime, end: datetime) -> Dict[str, List[tuple]]:
+    """class -> [(epoch_seconds, price_cents, seats_available, flight_id)] in [start, end], oldest first"""
+    if not flight_ids or not fare_history_installed(db):
+        return {}
+    start_ts, end_ts = start.timestamp(), end.timestamp()
+    by_class: Dict[str, List[tuple]] = {}
+    for i in range(0, len(flight_ids), FARE_REFRESH_BATCH_SIZE):
+        query = db.query(FareHistorySegment).filter(
+            FareHistorySegment.flight_id.in_(flight_ids[i:i + FARE_REFRESH_BATCH_SIZE]),
+            FareHistorySegment.ended_at >= start,
+            FareHistorySegment.started_at <= end
+        )
+        if seat_class:
+            query = query.filter(FareHistorySegment.seat_class == seat_class)
+        for segment in query:
+            by_class.setdefault(segment.seat_class, []).extend(
+                sample + (segment.flight_id,)
+                for sample in decode_fare_segment(segment.data, segment.samples)
+                if start_ts <= sample[0] <= end_ts
+            )
+    for samples in by_class.values():
+        samples.sort()
+    return by_class
+
+def downsample_fares(samples: List[tuple], start: datetime, end: datetime, points: int,
+                     per_flight: bool) -> List[Dict[str, Any]]:
+    """
+    Split [start, end] into `points` buckets and summarize the samples in each:
+    lowest, highest and mean price, plus (for one flight) the last price and seat count.
+    Buckets without a change are left out; the price held since the previous bucket.
+    """
+    start_ts = start.timestamp()
+    width = max((end.timestamp() - start_ts) / points, 1.0)
+    buckets: Dict[int, Dict[str, Any]] = {}
+    for timestamp, cents, seats_available, _ in samples:
+        index = min(int((timestamp - start_ts) // width), points - 1)
+        price = cents / 100
+        bucket = buckets.get(index)
+        if bucket is None:
+            bucket = buckets[index] = {"t": datetime.fromtimestamp(start_ts + index * width),
+                                       "min": price, "max": price, "total": 0.0, "samples": 0}
+        bucket["min"] = min(bucket["min"], price)
+        bucket["max"] = max(bucket["max"], price)
+        bucket["total"] += price
+        bucket["samples"] += 1
+        if per_flight:
+            bucket["last"] = price
+            bucket["seats_available"] = seats_available
+    trend = []
+    for index in sorted(buckets):
+        bucket = buckets[index]
+        bucket["mean"] = round(bucket.pop("total") / bucket["samples"], 2)
+        trend.append(bucket)
+    return trend
+
+def fare_history_window(start: Optional[datetime], end: Optional[datetime], points: int, days: int) -> tuple:
+    if not 1 <= points <= FARE_HISTORY_MAX_POINTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"points must be between 1 and {FARE_HISTORY_MAX_POINTS}.")
+    end = end or datetime.now()
+    start = start or end - timedelta(days=days)
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end.")
+    return start, end
+
+@router.get("/flights/{flight_id}/fare_history")
+def get_flight_fare_history(
+    flight_id: int,
+    seat_class: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: int = FARE_HISTORY_DEFAULT_POINTS,
+    db: Session = Depends(get_read_db)
+):
+    """Downsampled price and seat history of one flight, per class (default: since it was first priced)"""
+    flight = db.query(Flight).filter(Flight.id == flight_id).first()
+    if not flight:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Flight not found")
+    if start is None:
+        start = db.query(func.min(FareHistorySegment.started_at)).filter(
+            FareHistorySegment.flight_id == flight_id
+        ).scalar() if fare_history_installed(db) else None
+    start, end = fare_history_window(start, end, points, FARE_HISTORY_ROUTE_DAYS)
+    samples = load_fare_history(db, [flight_id], seat_class, start, end)
+    return {
+        "flight_id": flight_id,
+        "start": start,
+        "end": end,
+        "points": points,
+        "classes": {name: downsample_fares(rows, start, end, points, per_flight=True) for name, rows in samples.items()}
+    }
+
+@router.get("/routes/{origin}/{destination}/fare_history")
+def get_route_fare_history(
+    origin: str,
+    destination: str,
+    seat_class: Optional[str] = None,
+    departure_date: Optional[date] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: int = FARE_HISTORY_DEFAULT_POINTS,
+    db: Session = Depends(get_read_db)
+):
+    """Lowest, highest and mean fare per time bucket across the flights of a route (default: last 30 days)"""
+    start, end = fare_history_window(start, end, points, FARE_HISTORY_ROUTE_DAYS)
+    origin_airport = reference_data.airport_by_code(db, origin.upper())
+    destination_airport = reference_data.airport_by_code(db, destination.upper())
+    if not origin_airport or not destination_airport:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Airport not found")
+    query = db.query(Flight.id).filter(
+        Flight.origin_id == origin_airport.id,
+        Flight.destination_id == destination_airport.id
+    )
+    if departure_date:
+        day_start = datetime.combine(departure_date, datetime.min.time())
+        query = query.filter(Flight.departure_time >= day_start, Flight.departure_time < day_start + timedelta(days=1))
+    else:
+        # Flights priced during the window have not departed before it started
+        query = query.filter(Flight.departure_time >= start)
+    flight_ids = [flight_id for (flight_id,) in query.order_by(Flight.departure_time).limit(FARE_HISTORY_ROUTE_MAX_FLIGHTS)]
+    samples = load_fare_history(db, flight_ids, seat_class, start, end)
+    return {
+        "origin": origin_airport.code,
+        "destination": destination_airport.code,
+        "departure_date": departure_date,
+        "flights": len(flight_ids),
+        "start": start,
+        "end": end,
+        "points": points,
+        "classes": {name: downsample_fares(rows, start, end, points, per_flight=False) for name, rows in samples.items()}
+    }
+
+@router.get("/admin/fare_history")
+def get_fare_history_stats():
+    """Fare history samples queued, written and dropped"""
+    return fare_history.stats()
+
+# ============================================================================
+# Shared-Memory Inventory Table
+# ============================================================================
+# With several uvicorn workers on a host, each process would otherwise read the fare
+# table from Postgres on its own and only invalidate its own caches. This mmap-backed
+# table holds the latest fares and seat counts per flight and class, written by
+# whichever worker refreshes the fare table and read lock-free by all of them.
+#
+# Layout: a header and a fixed number of slots, direct-mapped by flight_id % slots
+# (flight ids are sequential, so upcoming flights rarely collide). Each slot is guarded
+# by a seqlock: writers (serialized by flock across processes and a lock within one)
+# make the sequence odd, write, and make it even again; readers retry until they see
+# the same even sequence before and after copying the slot. Every write stamps the
+# slot with the next value of a host-wide change counter.
+
+SHARED_INVENTORY_ENABLED = env_flag("SHARED_INVENTORY_ENABLED", True)
+SHARED_INVENTORY_PATH = os.getenv("SHARED_INVENTORY_PATH")
+SHARED_INVENTORY_SLOTS = int(os.getenv("SHARED_INVENTORY_SLOTS", 65536))
+
+SHARED_INVENTORY_MAGIC = b"FLTINV01"
+SHARED_INVENTORY_CLASSES = list(PRICING_TIERS)  # class index in a slot
+SHARED_HEADER = struct.Struct("<8sIIQ")  # magic, slots, slot size, change counter
+SHARED_HEADER_SIZE = 64
+SHARED_SLOT_HEAD = struct.Struct("<QqQddII")  # seq, flight_id, changed_at, computed_at, valid_until, flags, class mask
+SHARED_SLOT_CLASS = struct.Struct("<iiq")  # seats_available, total_seats, price in cents
+SHARED_SLOT_SIZE = SHARED_SLOT_HEAD.size + SHARED_SLOT_CLASS.size * len(SHARED_INVENTORY_CLASSES)
+SHARED_FLAG_COMPLETE = 1  # every class of the flight is present
+SHARED_READ_MAX_RETRIES = 1000  # a sequence stuck odd means a writer died mid-write
+
+class SharedInventoryTable:
+    """Per-flight, per-class fares and seat counts in a memory-mapped file shared by the workers of a host"""
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.slots = 0
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._write_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.read_retries = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._mmap is not None
+
+    def open(self, path: str, slots: int):
+        if fcntl is None:
+            logger.warning("Shared inventory table disabled: fcntl is not available on this platform")
+            return
+        size = SHARED_HEADER_SIZE + slots * SHARED_SLOT_SIZE
+        shared_file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), "r+b")
+        try:
+            fcntl.flock(shared_file.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.fstat(shared_file.fileno()).st_size == 0:
+                    shared_file.truncate(size)
+                    shared_file.seek(0)
+                    shared_file.write(SHARED_HEADER.pack(SHARED_INVENTORY_MAGIC, slots, SHARED_SLOT_SIZE, 0))
+                    shared_file.flush()
+                shared_file.seek(0)
+                magic, file_slots, slot_size, _ = SHARED_HEADER.unpack(shared_file.read(SHARED_HEADER.size))
+            finally:
+                fcntl.flock(shared_file.fileno(), fcntl.LOCK_UN)
+            if (magic, file_slots, slot_size) != (SHARED_INVENTORY_MAGIC, slots, SHARED_SLOT_SIZE):
+                # Another worker (or an older build) uses a different layout; never resize under it
+                logger.warning("Shared inventory table disabled: %s has a different layout", path)
+                shared_file.close()
+                return
+            self._mmap = mmap.mmap(shared_file.fileno(), size)
+        except Exception:
+            shared_file.close()
+            raise
+        self._file = shared_file
+        self.path = path
+        self.slots = slots
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+            self._file = None
+
+    def _offset(self, flight_id: int) -> int:
+        return SHARED_HEADER_SIZE + (flight_id % self.slots) * SHARED_SLOT_SIZE
+
+    def _read_slot(self, offset: int):
+        """
+        Consistent copy of a slot: (flight_id, changed_at, computed_at, valid_until, flags,
+        mask, classes), or None if no consistent copy could be taken.
+        """
+        for _ in range(SHARED_READ_MAX_RETRIES):
+            seq = SHARED_SLOT_HEAD.unpack_from(self._mmap, offset)[0]
+            if seq % 2 == 0:
+                raw = self._mmap[offset:offset + SHARED_SLOT_SIZE]
+                if SHARED_SLOT_HEAD.unpack_from(self._mmap, offset)[0] == seq:
+                    break
+            self.read_retries += 1
+            time.sleep(0)
+        else:
+            return None
+        head = SHARED_SLOT_HEAD.unpack_from(raw, 0)
+        classes = [
+            SHARED_SLOT_CLASS.unpack_from(raw, SHARED_SLOT_HEAD.size + i * SHARED_SLOT_CLASS.size)
+            for i in range(len(SHARED_INVENTORY_CLASSES))
+        ]
+        return head[1:] + (classes,)
+
+    def changed_at(self, flight_id: int) -> Optional[int]:
+        """Change counter at the flight's last write, 0 if never written, None if unknown (slot reused)"""
+        if not self.enabled:
+            return None
+        slot = self._read_slot(self._offset(flight_id))
+        if slot is None:
+            return None
+        slot_flight_id, changed_at = slot[:2]
+        if slot_flight_id == 0:
+            return 0
+        return changed_at if slot_flight_id == flight_id else None
+
+    def change_counter(self) -> int:
+        return SHARED_HEADER.unpack_from(self._mmap, 0)[3] if self.enabled else 0
+
+    def read_fares(self, flight_id: int, now: datetime) -> Optional[Dict[str, Dict[str, Any]]]:
+        """class -> fare for a flight with a complete, unexpired slot; None means ask the database"""
+        if not self.enabled:
+            return None
+        slot = self._read_slot(self._offset(flight_id))
+        if slot is None:
+            self.misses += 1
+            return None
+        slot_flight_id, _, computed_at, valid_until, flags, mask, classes = slot
+        if slot_flight_id != flight_id or not flags & SHARED_FLAG_COMPLETE or (valid_until and valid_until <= now.timestamp()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        fares = {}
+        for i, seat_class in enumerate(SHARED_INVENTORY_CLASSES):
+            if mask & (1 << i):
+                available, total, price_cents = classes[i]
+                fares[seat_class] = {
+                    "price": price_cents / 100,
+                    "seats_available": available,
+                    "total_seats": total,
+                    "computed_at": datetime.fromtimestamp(computed_at),
+                    "valid_until": datetime.fromtimestamp(valid_until) if valid_until else None
+                }
+        return fares
+
+    def _write(self, offset: int, head: tuple, classes: List[tuple]):
+        """Seqlock write of one slot and bump of the change counter; caller holds the write locks"""
+        counter = SHARED_HEADER.unpack_from(self._mmap, 0)[3] + 1
+        seq = SHARED_SLOT_HEAD.unpack_from(self._mmap, offset)[0]
+        seq += seq % 2  # recover a slot left odd by a writer that died mid-write
+        struct.pack_into("<Q", self._mmap, offset, seq + 1)
+        SHARED_SLOT_HEAD.pack_into(self._mmap, offset, seq + 1, head[0], counter, *head[1:])
+        for i, values in enumerate(classes):
+            SHARED_SLOT_CLASS.pack_into(self._mmap, offset + SHARED_SLOT_HEAD.size + i * SHARED_SLOT_CLASS.size, *values)
+        struct.pack_into("<Q", self._mmap, offset, seq + 2)
+        struct.pack_into("<Q", self._mmap, SHARED_HEADER.size - 8, counter)
+
+    @contextmanager
+    def _locked(self):
+        with self._write_lock:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def write_fares(self, flight_ids: List[int], rows: Dict[tuple, Dict[str, Any]], complete: bool):
+        """
+        Store fare rows. complete=True means rows hold every class of these flights;
+        otherwise only the given classes of already complete slots are updated. Rows
+        computed before the slot's current contents are ignored, so concurrent writers
+        (or a worker publishing what it read from the database) cannot go backwards.
+        """
+        if not self.enabled:
+            return
+        by_flight: Dict[int, Dict[str, Dict[str, Any]]] = {flight_id: {} for flight_id in flight_ids}
+        for (flight_id, seat_class), values in rows.items():
+            if flight_id in by_flight:
+                by_flight[flight_id][seat_class] = values
+        with self._locked():
+            for flight_id, fares in by_flight.items():
+                if not fares and not complete:
+                    continue
+                # A flight without seats has no rows; it is complete as of now
+                computed_at = min((values["computed_at"] for values in fares.values()), default=datetime.now())
+                offset = self._offset(flight_id)
+                slot = self._read_slot(offset) or (0, 0, 0.0, 0.0, 0, 0, None)
+                slot_flight_id, _, slot_computed_at, valid_until, flags, mask, classes = slot
+                if slot_flight_id == flight_id and slot_computed_at > computed_at.timestamp():
+                    continue
+                if complete:
+                    valid_until, flags, mask = 0.0, SHARED_FLAG_COMPLETE, 0
+                    classes = [(0, 0, 0)] * len(SHARED_INVENTORY_CLASSES)
+                elif slot_flight_id != flight_id or not flags & SHARED_FLAG_COMPLETE:
+                    continue
+                for seat_class, values in fares.items():
+                    if seat_class not in SHARED_INVENTORY_CLASSES:
+                        flags = 0  # a class without a slot position cannot be served from here
+                        continue
+                    i = SHARED_INVENTORY_CLASSES.index(seat_class)
+                    mask |= 1 << i
+                    classes[i] = (values["seats_available"], values["total_seats"], int(round(values["price"] * 100)))
+                    valid_until = values["valid_until"].timestamp() if values["valid_until"] else 0.0
+                self._write(offset, (flight_id, computed_at.timestamp(), valid_until, flags, mask), classes)
+
+    def invalidate(self, flight_ids: List[int]):
+        """Mark flights as changed without new fares, so readers fall back to the database"""
+        if not self.enabled:
+            return
+        with self._locked():
+            for flight_id in flight_ids:
+                offset = self._offset(flight_id)
+                self._write(offset, (flight_id, 0.0, 0.0, 0, 0), [(0, 0, 0)] * len(SHARED_INVENTORY_CLASSES))
+
+    def reset(self) -> int:
+        """Invalidate every slot, e.g. after the database was restored or reseeded"""
+        if not self.enabled:
+            return 0
+        reset = 0
+        with self._locked():
+            for index in range(self.slots):
+                offset = SHARED_HEADER_SIZE + index * SHARED_SLOT_SIZE
+                slot_flight_id = SHARED_SLOT_HEAD.unpack_from(self._mmap, offset)[1]
+                if slot_flight_id:
+                    self._write(offset, (slot_flight_id, 0.0, 0.0, 0, 0), [(0, 0, 0)] * len(SHARED_INVENTORY_CLASSES))
+                    reset += 1
+        return reset
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        used = complete = 0
+        for index in range(self.slots):
+            slot_flight_id, _, _, _, flags = SHARED_SLOT_HEAD.unpack_from(self._mmap, SHARED_HEADER_SIZE + index * SHARED_SLOT_SIZE)[1:6]
+            used += slot_flight_id != 0
+            complete += bool(flags & SHARED_FLAG_COMPLETE)
+        return {
+            "enabled": True,
+            "path": self.path,
+            "slots": self.slots,
+            "slots_used": used,
+            "slots_complete": complete,
+            "change_counter": self.change_counter(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "read_retries": self.read_retries
+        }
+
+shared_inventory = SharedInventoryTable()
+
+def host_file_path(name: str, suffix: str) -> str:
+    """Path of a file shared by the processes on this host that use the same database"""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    database_hash = hashlib.sha256((DATABASE_URL or "").encode()).hexdigest()[:12]
+    return os.path.join(directory, f"{name}_{database_hash}{suffix}")
+
+def open_shared_inventory():
+    """Map the host's shared inventory file (one per database)"""
+    if not SHARED_INVENTORY_ENABLED or shared_inventory.enabled:
+        return
+    shared_inventory.open(SHARED_INVENTORY_PATH or host_file_path("flight_inventory", ".bin"), SHARED_INVENTORY_SLOTS)
+
+@router.get("/admin/inventory/shared")
+def get_shared_inventory_stats():
+    """Usage of the shared-memory inventory table and this worker's hit rate"""
+    return shared_inventory.stats()
+
+@router.post("/admin/inventory/shared/reset")
+def reset_shared_inventory(admin: User = Depends(require_admin)):
+    """Drop every worker's shared fares so they are read from the database again"""
+    return {"message": f"Invalidated {shared_inventory.reset()} shared inventory slots."}
+
+# ============================================================================
+# Flight Search Cache
+# ============================================================================
+# During sales many users search the same route and date at once. Search results are
+# cached for a few seconds under a normalized (origin, destination, date, class) key,
+# and concurrent misses for the same key share one computation (single-flight).
+# Every fare table refresh (inventory, demand or time-factor change) invalidates the
+# cached results of the refreshed flights through per-flight versions.
+
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", 5))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 10000))
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key wait for its result"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result: Any = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, "SingleFlight._Call"] = {}
+
+    def do(self, key, fn):
+        """Returns (result, shared) where shared is True if another caller computed it"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight._Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+class SearchCache:
+    """
+    TTL cache of search responses. Every flight carries the value of a global change
+    counter at its last inventory change; an entry is only served while none of its
+    flights changed after the entry's computation started. Changes made by other
+    workers on the host are seen through the shared inventory table's stamps.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[tuple, tuple] = {}  # key -> (expires_at, version, flight_ids, result)
+        self._version = 0
+        self._flight_versions: Dict[int, int] = {}
+        self._single_flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidated = 0
+
+    def invalidate_flights(self, flight_ids):
+        with self._lock:
+            self._version += 1
+            for flight_id in flight_ids:
+                self._flight_versions[flight_id] = self._version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, (version, shared_version), flight_ids, result = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            if any(self._flight_versions.get(flight_id, 0) > version for flight_id in flight_ids) or (
+                self._changed_on_host(flight_ids, shared_version)
+            ):
+                del self._entries[key]
+                self.invalidated += 1
+                return None
+            self.hits += 1
+            return result
+
+    @staticmethod
+    def _changed_on_host(flight_ids, shared_version: int) -> bool:
+        if not shared_inventory.enabled:
+            return False
+        for flight_id in flight_ids:
+            changed_at = shared_inventory.changed_at(flight_id)
+            # None: the slot now belongs to another flight, so the last change is unknown
+            if changed_at is None or changed_at > shared_version:
+                return True
+        return False
+
+    def _store(self, key, version, flight_ids, result):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    # Still full of live entries; drop the ones closest to expiry
+                    for k, _ in sorted(self._entries.items(), key=lambda item: item[1][0])[:self.max_entries // 10 + 1]:
+                        del self._entries[k]
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, version, flight_ids, result)
+
+    def get_or_compute(self, key, compute):
+        """
+        compute() returns (result, flight_ids). Exceptions are not cached, but are
+        raised to every caller that was waiting on the same computation.
+        """
+        result = self._lookup(key)
+        if result is not None:
+            return result
+
+        def load():
+            with self._lock:
+                version = (self._version, shared_inventory.change_counter())
+                self.misses += 1
+            result, flight_ids = compute()
+            self._store(key, version, frozenset(flight_ids), result)
+            return result
+
+        result, shared = self._single_flight.do(key, load)
+        if shared:
+            with self._lock:
+                self.coalesced += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "invalidated": self.invalidated,
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries
+            }
+
+search_cache = SearchCache(SEARCH_CACHE_TTL_SECONDS, SEARCH_CACHE_MAX_ENTRIES)
+
+def search_cache_key(search_data: FlightSearchRequest, departure_date: date) -> tuple:
+    seat_class = search_data.seat_class.strip().title() if search_data.seat_class else None
+    return (
+        search_data.origin.strip().upper(),
+        search_data.destination.strip().upper(),
+        departure_date,
+        seat_class
+    )
+
+@router.get("/admin/search_cache")
+def get_search_cache_stats():
+    """Hit/miss/coalescing counters of the flight search cache"""
+    return search_cache.stats()
+
+@router.post("/admin/search_cache/clear")
+def clear_search_cache(admin: User = Depends(require_admin)):
+    search_cache.clear()
+    return {"message": "Search cache cleared."}
+
+# Flight Search API Endpoints with Dynamic Pricing Integration
+@router.post("/flights/search")
+def search_flights(search_data: FlightSearchRequest, db: Session = Depends(get_read_db)):
+    try:
+        departure_date = datetime.strptime(search_data.departure_date.strip(), "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date format. Use YYYY-MM-DD.")
+
+    key = search_cache_key(search_data, departure_date)
+    return search_cache.get_or_compute(key, lambda: run_flight_search(db, *key))
+
+def run_flight_search(db: Session, origin: str, destination: str, departure_date: date,
+                      seat_class: Optional[str]):
+    """Returns (response, flight ids the response depends on)"""
+    origin_airport = reference_data.airport_by_code(db, origin)
+    destination_airport = reference_data.airport_by_code(db, destination)
+
+    if not origin_airport or not destination_airport:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Origin or destination airport not found.")
+    
+    flights = db.query(Flight).filter(
+        Flight.origin_id == origin_airport.id,
+        Flight.destination_id == destination_airport.id,
+        func.date(Flight.departure_time) == departure_date
+    ).all()
+
+    if not flights:
+        return {"message": "No flights found for this route and date."}, []
+    
+    results = []
+
+    # One primary-key lookup for the fares of every flight on the route
+    fares = get_fares(db, [f.id for f in flights], {seat_class} if seat_class else None)
+
+    for flight in flights:
+        flight_data: Dict[str, Any] = {
+            "flight_id": flight.id,
+            "flight_number": flight.flight_number,
+            "origin": origin_airport.code,
+            "destination": destination_airport.code,
+            "departure_time": flight.departure_time,
+            "arrival_time": flight.arrival_time,
+            "base_economy_price": float(flight.base_price),
+            "pricing": {}
+        }
+
+        for (fare_flight_id, seat_class), fare in fares.items():
+            if fare_flight_id == flight.id and fare["seats_available"] > 0 and fare["price"] > 0:
+                flight_data["pricing"][seat_class] = {
+                    "price": fare["price"],
+                    "seats_available": fare["seats_available"]
+                }
+        
+        if flight_data["pricing"]:
+            results.append(flight_data)
+    
+    return {"flights": results}, [f.id for f in flights]
+
+@router.get("/flights/{flight_id}")
+def get_flight_details(flight_id: int, db: Session = Depends(get_read_db)):
+    flight = db.query(Flight).filter(Flight.id == flight_id).first()
+    if not flight:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Flight not found.")
+    
+    airline = reference_data.airline(db, flight.airline_id)
+    origin = reference_data.airport(db, flight.origin_id)
+    destination = reference_data.airport(db, flight.destination_id)
+    seats = db.query(Seat).filter(Seat.flight_id == flight_id).all()
+
+    pricing_details = {}
+
+    for (_, seat_class), fare in get_fares(db, [flight_id]).items():
+        if fare["seats_available"] > 0:
+            pricing_details[seat_class] = {
+                "current_price": fare["price"],
+                "seats_available": fare["seats_available"]
+            }
+
+    held = seat_holds.held_seat_ids(db, flight_id)
+    seat_list = [{
+        "seat_number": s.seat_number,
+        "class": s._class,
+        "is_available": s.is_available and s.id not in held
+    } for s in seats]
+
+    return {
+        "flight_id": flight.id,
+        "flight_number": flight.flight_number,
+        "airline_name": airline.name,
+        "origin_airport": origin.code,
+        "destination_airport": destination.code,
+        "departure_time": flight.departure_time,
+        "arrival_time": flight.arrival_time,
+        "base_economy_price": float(flight.base_price),
+        "status": "cancelled" if flight_is_cancelled(db, flight_id) else "scheduled",
+        "dynamic_pricing": pricing_details,
+        "seats": seat_list
+    }
+
+@router.get("/admin/db/pool")
+def get_db_pool_status():
+    """Connection pool usage for the primary and (if configured) the read replica"""
+    if engine is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database is not initialized yet.")
+    return {
+        "primary": engine.pool.status(),
+        "replica": read_engine.pool.status() if read_engine is not engine else None,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
+# Background Process to Simulate Demand/Availability Changes
+@router.post("/admin/simulate_demand")
+def simulate_demand_changes(db: Session = Depends(get_db)):
+    """Background process to simulate real-world demand shifts"""
+    flights_to_update = db.query(Flight).filter(Flight.departure_time > datetime.now()).all()
+    
+    updates_count = 0
+    new_demand_level = 1.0
+    
+    for flight in flights_to_update:
+        new_demand_level = round(random.uniform(0.95, 1.05), 3)
+        flight.demand_level = new_demand_level
+        db.add(flight)
+        updates_count += 1
+    
+    try:
+        updated_flight_ids = [flight.id for flight in flights_to_update]
+        db.commit()
+        try:
+            refresh_fares(db, updated_flight_ids)
+        except Exception:
+            db.rollback()
+            shared_inventory.invalidate(updated_flight_ids)
+            fare_scheduler.mark_dirty(updated_flight_ids)
+        for flight_id in updated_flight_ids:
+            seat_events.publish(flight_id, reprice=True)
+        return {"message": f"Simulated demand updated for {updates_count} flights.",
+                "example_demand_level": new_demand_level}
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to update demand: {str(e)}")
+
+# ============================================================================
+# MILESTONE 3: Booking Workflow & Transaction Management
+# ============================================================================
+
+# Booking-related Database Models
+class Booking(Base):
+    __tablename__ = "bookings"
     id = Column(Integer, primary_key=True)
     pnr = Column(String, unique=True)
     flight_id = Column(Integer, ForeignKey('flights.id'))
@@ -669,12 +2783,612 @@ def generate_pnr():
 def generate_pre_booking_id():
     return 'PB' + ''.join(random.choices('0123456789', k=8))
 
+# ============================================================================
+# Seat Hold Stores
+# ============================================================================
+# A seat is held between /bookings/initiate and payment. The "memory" store (default)
+# keeps holds in this process (TTL, per-seat locks) and writes to Postgres only once
+# payment starts, claiming the seat with a conditional UPDATE; it is only correct with a
+# single process, so it refuses to start when another process on the host already uses it.
+# The "database" store keeps the pre_bookings rows and flips Seat.is_available on hold,
+# so holds are visible to every instance and uvicorn worker.
+# Either way the seat is secured (reserve()) before the card is charged.
+
+SEAT_HOLD_STORE = os.getenv("SEAT_HOLD_STORE", "memory")  # memory | database
+# Unpaid holds older than this are released
+PRE_BOOKING_HOLD_MINUTES = int(os.getenv("PRE_BOOKING_HOLD_MINUTES", 15))
+SEAT_LOCK_STRIPES = 1024
+SEAT_HOLD_SWEEP_SECONDS = 30  # how often the memory store drops expired holds on its own
+
+class SeatHold:
+    """An in-memory hold; same attributes as a PreBooking row"""
+
+    def __init__(self, pre_booking_id: str, flight_id: int, seat: Seat, user_id: Optional[int],
+                 total_price: float, passenger_name: str, passenger_email: Optional[str] = None,
+                 passenger_phone: Optional[str] = None):
+        self.pre_booking_id = pre_booking_id
+        self.flight_id = flight_id
+        self.seat_id = seat.id
+        self.seat_number = seat.seat_number
+        self.seat_class = seat._class
+        self.user_id = user_id
+        self.total_price = total_price
+        self.passenger_name = passenger_name
+        self.passenger_email = passenger_email
+        self.passenger_phone = passenger_phone
+        self.created_at = datetime.now()
+        self.expires_at = time.monotonic() + PRE_BOOKING_HOLD_MINUTES * 60
+        self.paying = False  # a charge is running; do not expire
+        self.reserved = False  # the seats table already marks the seat sold (reserve())
+
+    def seat_change(self, is_available: bool) -> Dict[str, Any]:
+        return {"id": self.seat_id, "seat_number": self.seat_number, "class": self.seat_class, "is_available": is_available}
+
+class SeatHoldStore:
+    """Interface of the hold stores; holds expose the PreBooking attributes"""
+
+    def open(self):
+        """At startup: raise if this store cannot work in the current deployment"""
+
+    def hold(self, db: Session, seat: Seat, hold: SeatHold):
+        """Hold the seat or raise 409; returns the stored hold"""
+        raise NotImplementedError
+
+    def get(self, db: Session, pre_booking_id: str):
+        raise NotImplementedError
+
+    def reserve(self, db: Session, hold):
+        """Before charging: pin the hold and make sure its seat can still be sold, else raise 404/409"""
+        self.set_paying(hold, True)
+
+    def claim(self, db: Session, hold) -> List[Dict[str, Any]]:
+        """Inside the confirming transaction: make the hold permanent; returns seat changes to publish"""
+        raise NotImplementedError
+
+    def finish(self, hold):
+        """After the confirming transaction committed"""
+
+    def release(self, db: Session, hold):
+        """Give the seat back after a failed or abandoned payment"""
+        raise NotImplementedError
+
+    def release_expired(self, db: Session) -> int:
+        raise NotImplementedError
+
+    def set_paying(self, hold, paying: bool):
+        """Pin a hold while its charge runs on the payment workers"""
+
+    def drop_flight(self, db: Session, flight_id: int) -> int:
+        """Discard every hold on a cancelled flight without giving the seats back"""
+        raise NotImplementedError
+
+    def held_seat_ids(self, db: Session, flight_id: int) -> set:
+        """Seats held but still marked available in the seats table"""
+        return set()
+
+    def seat_lock(self, seat_id: int):
+        return nullcontext()
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+class InMemorySeatHoldStore(SeatHoldStore):
+    def __init__(self):
+        self._lock = threading.Lock()  # guards the indexes below
+        self._seat_locks = [threading.Lock() for _ in range(SEAT_LOCK_STRIPES)]
+        self._holds: Dict[str, SeatHold] = {}
+        self._by_seat: Dict[int, str] = {}
+        self._next_sweep = time.monotonic() + SEAT_HOLD_SWEEP_SECONDS
+        self._host_lock = None
+        self.created = 0
+        self.confirmed = 0
+        self.released = 0
+        self.expired = 0
+
+    def open(self):
+        # Held for the life of the process; a second worker on this host cannot take it
+        if fcntl is None or self._host_lock is not None:
+            return
+        lock_file = open(host_file_path("flight_seat_holds", ".lock"), "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(
+                "SEAT_HOLD_STORE=memory is already used by another process on this host and its holds "
+                "would be invisible here; set SEAT_HOLD_STORE=database to run several workers"
+            )
+        self._host_lock = lock_file
+
+    def seat_lock(self, seat_id: int):
+        # Striped: seats sharing a stripe serialize, which only costs contention
+        return self._seat_locks[seat_id % SEAT_LOCK_STRIPES]
+
+    def _active(self, hold: Optional[SeatHold]) -> bool:
+        return hold is not None and (hold.paying or hold.expires_at > time.monotonic())
+
+    def _drop(self, hold: SeatHold):
+        with self._lock:
+            if self._holds.pop(hold.pre_booking_id, None) is not None and self._by_seat.get(hold.seat_id) == hold.pre_booking_id:
+                del self._by_seat[hold.seat_id]
+
+    def hold(self, db: Session, seat: Seat, hold: SeatHold):
+        if time.monotonic() >= self._next_sweep:
+            self.release_expired(db)
+        with self.seat_lock(seat.id):
+            with self._lock:
+                current = self._holds.get(self._by_seat.get(seat.id))
+                if self._active(current):
+                    raise HTTPException(status_code=409, detail="Seat is currently on hold pending payment.")
+                while hold.pre_booking_id in self._holds:
+                    hold.pre_booking_id = generate_pre_booking_id()
+                if current is not None:
+                    self._holds.pop(current.pre_booking_id, None)
+                self._holds[hold.pre_booking_id] = hold
+                self._by_seat[seat.id] = hold.pre_booking_id
+                self.created += 1
+        seat_events.publish(hold.flight_id, [hold.seat_change(False)])
+        return hold
+
+    def get(self, db: Session, pre_booking_id: str):
+        with self._lock:
+            hold = self._holds.get(pre_booking_id)
+        if hold is not None and not self._active(hold):
+            self._expire(db, hold)
+            return None
+        return hold
+
+    def _take_seat(self, db: Session, hold: SeatHold):
+        # The seats table is only written now; the UPDATE fails if another instance sold the seat
+        claimed = db.query(Seat).filter(Seat.id == hold.seat_id, Seat.is_available == True).update(
+            {Seat.is_available: False}, synchronize_session=False
+        )
+        if not claimed:
+            db.rollback()
+            self._drop(hold)
+            raise HTTPException(status_code=409, detail="Seat was booked by someone else before payment completed.")
+
+    def _give_back_seat(self, db: Session, hold: SeatHold):
+        if hold.reserved:
+            db.query(Seat).filter(Seat.id == hold.seat_id).update({Seat.is_available: True}, synchronize_session=False)
+            db.commit()
+            hold.reserved = False
+
+    def reserve(self, db: Session, hold: SeatHold):
+        with self.seat_lock(hold.seat_id):
+            with self._lock:
+                current = self._holds.get(hold.pre_booking_id)
+            if current is not hold or not self._active(hold):
+                raise HTTPException(status_code=404, detail="Payment link expired or pre-booking not found.")
+            if not hold.reserved:
+                self._take_seat(db, hold)
+                db.commit()
+                hold.reserved = True
+            hold.paying = True
+
+    def claim(self, db: Session, hold: SeatHold) -> List[Dict[str, Any]]:
+        if not hold.reserved:
+            self._take_seat(db, hold)
+        return [hold.seat_change(False)]
+
+    def finish(self, hold: SeatHold):
+        self._drop(hold)
+        with self._lock:
+            self.confirmed += 1
+
+    def release(self, db: Session, hold: SeatHold):
+        with self.seat_lock(hold.seat_id):
+            self._give_back_seat(db, hold)
+            self._drop(hold)
+        with self._lock:
+            self.released += 1
+        seat_events.publish(hold.flight_id, [hold.seat_change(True)])
+
+    def _expire(self, db: Session, hold: SeatHold):
+        with self.seat_lock(hold.seat_id):
+            if self._active(hold):
+                return False
+            self._give_back_seat(db, hold)
+            self._drop(hold)
+        with self._lock:
+            self.expired += 1
+        seat_events.publish(hold.flight_id, [hold.seat_change(True)])
+        return True
+
+    def release_expired(self, db: Session) -> int:
+        self._next_sweep = time.monotonic() + SEAT_HOLD_SWEEP_SECONDS
+        with self._lock:
+            candidates = [hold for hold in self._holds.values() if not self._active(hold)]
+        return sum(1 for hold in candidates if self._expire(db, hold))
+
+    def set_paying(self, hold: SeatHold, paying: bool):
+        hold.paying = paying
+        if not paying:
+            # A charge that was turned away starts a fresh hold period
+            hold.expires_at = max(hold.expires_at, time.monotonic() + 60)
+
+    def drop_flight(self, db: Session, flight_id: int) -> int:
+        with self._lock:
+            holds = [hold for hold in self._holds.values() if hold.flight_id == flight_id]
+        for hold in holds:
+            with self.seat_lock(hold.seat_id):
+                self._drop(hold)
+        return len(holds)
+
+    def held_seat_ids(self, db: Session, flight_id: int) -> set:
+        with self._lock:
+            return {hold.seat_id for hold in self._holds.values() if hold.flight_id == flight_id and self._active(hold)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "store": "memory",
+                "active_holds": sum(1 for hold in self._holds.values() if self._active(hold)),
+                "paying": sum(1 for hold in self._holds.values() if hold.paying),
+                "created": self.created,
+                "confirmed": self.confirmed,
+                "released": self.released,
+                "expired": self.expired,
+                "hold_minutes": PRE_BOOKING_HOLD_MINUTES
+            }
+
+class DatabaseSeatHoldStore(SeatHoldStore):
+    """Holds as pre_bookings rows with the seat marked unavailable, shared by all instances"""
+
+    def hold(self, db: Session, seat: Seat, hold: SeatHold):
+        # Check if a pre-booking already exists for this seat (concurrency control)
+        existing_hold = db.query(PreBooking).filter(PreBooking.seat_id == seat.id).first()
+        if existing_hold:
+            raise HTTPException(status_code=409, detail="Seat is currently on hold pending payment.")
+
+        # 1. Mark the physical seat as unavailable (hard lock for concurrency control)
+        seat.is_available = False
+        db.add(seat)
+
+        # 2. Create a temporary Pre-Booking record
+        new_pre_booking = PreBooking(
+            pre_booking_id=hold.pre_booking_id,
+            flight_id=hold.flight_id,
+            seat_id=seat.id,
+            user_id=hold.user_id,  # Store user_id if authenticated
+            total_price=hold.total_price,
+            passenger_name=hold.passenger_name,
+            passenger_email=hold.passenger_email,
+            passenger_phone=hold.passenger_phone
+        )
+        db.add(new_pre_booking)
+
+        held_seat = seat_change(seat)
+        try:
+            db.commit()
+        except IntegrityError:
+            # pre_bookings.seat_id is unique: another request held the seat first
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Seat is currently on hold pending payment.")
+        db.refresh(new_pre_booking)
+        on_inventory_change(db, hold.flight_id, [held_seat])
+        return new_pre_booking
+
+    def get(self, db: Session, pre_booking_id: str):
+        return db.query(PreBooking).filter(PreBooking.pre_booking_id == pre_booking_id).first()
+
+    def reserve(self, db: Session, hold: PreBooking):
+        # The seat is already unavailable; restart the hold period so the expiry sweep
+        # cannot release the hold while the charge runs
+        if not db.query(PreBooking).filter(PreBooking.id == hold.id).update(
+            {PreBooking.created_at: datetime.now()}, synchronize_session=False
+        ):
+            db.rollback()
+            raise HTTPException(status_code=404, detail="Payment link expired or pre-booking not found.")
+        db.commit()
+
+    def claim(self, db: Session, hold: PreBooking) -> List[Dict[str, Any]]:
+        # Delete the temporary Pre-Booking record (the seat remains unavailable from the hold)
+        db.delete(hold)
+        return []
+
+    def release(self, db: Session, hold: PreBooking):
+        seat_to_revert = db.query(Seat).get(hold.seat_id)
+        released = []
+        if seat_to_revert:
+            seat_to_revert.is_available = True
+            db.add(seat_to_revert)
+            released.append(seat_change(seat_to_revert))
+
+        # Delete the pre-booking record
+        flight_id = hold.flight_id
+        db.delete(hold)
+        db.commit()
+        on_inventory_change(db, flight_id, released)
+
+    def release_expired(self, db: Session) -> int:
+        cutoff = datetime.now() - timedelta(minutes=PRE_BOOKING_HOLD_MINUTES)
+        # Holds with a charge still running on the payment workers are left alone
+        paying = db.query(Payment.pre_booking_id).filter(Payment.status == 'pending')
+        expired = db.query(PreBooking).filter(
+            PreBooking.created_at < cutoff,
+            PreBooking.pre_booking_id.notin_(paying)
+        ).all()
+        for pre_booking in expired:
+            self.release(db, pre_booking)
+        return len(expired)
+
+    def drop_flight(self, db: Session, flight_id: int) -> int:
+        dropped = db.query(PreBooking).filter(PreBooking.flight_id == flight_id).delete(synchronize_session=False)
+        db.commit()
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        db = sessionLocal()
+        try:
+            return {"store": "database", "active_holds": db.query(func.count(PreBooking.id)).scalar(),
+                    "hold_minutes": PRE_BOOKING_HOLD_MINUTES}
+        finally:
+            db.close()
+
+# Registry of hold stores selectable with SEAT_HOLD_STORE
+SEAT_HOLD_STORES = {
+    "memory": InMemorySeatHoldStore,
+    "database": DatabaseSeatHoldStore,
+}
+
+def create_seat_hold_store(name: str = SEAT_HOLD_STORE) -> SeatHoldStore:
+    if name not in SEAT_HOLD_STORES:
+        raise ValueError(f"Unknown SEAT_HOLD_STORE '{name}'. Available: {', '.join(SEAT_HOLD_STORES)}")
+    return SEAT_HOLD_STORES[name]()
+
+seat_holds = create_seat_hold_store()
+
+@router.get("/admin/seat_holds")
+def get_seat_hold_stats():
+    """Active holds and hold outcomes of the configured hold store"""
+    return seat_holds.stats()
+
+# ============================================================================
+# Idempotency Keys for Retry-Safe Booking and Payment Requests
+# ============================================================================
+
+# How long a completed response is replayed for a repeated Idempotency-Key
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", 60 * 60 * 24))
+# How long a duplicate request waits for the first one to finish before giving up
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 30))
+# An in-progress key whose owner has not sent a heartbeat for this long is treated as
+# abandoned (the worker crashed); live owners refresh their keys every third of it
+IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", 120))
+IDEMPOTENCY_PURGE_INTERVAL_SECONDS = 300
+MAX_IDEMPOTENCY_KEY_LENGTH = 200
+
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_keys"
+    key = Column(String(255), primary_key=True)  # "<scope>:<client supplied key>"
+    request_fingerprint = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False, default='in_progress')  # in_progress | completed
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, nullable=True)  # refreshed while the owning request runs
+    expires_at = Column(DateTime, nullable=False)
+
+# Requests in this process that currently own a key; duplicates wait on the event
+_idempotency_events: Dict[str, threading.Event] = {}
+_idempotency_lock = threading.Lock()
+_last_idempotency_purge = 0.0
+
+def request_fingerprint(scope: str, payload: Any) -> str:
+    """Stable hash of the request body so a reused key with a different payload is rejected"""
+    canonical = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{scope}|{canonical}".encode('utf-8')).hexdigest()
+
+def purge_expired_idempotency_keys(db: Session) -> int:
+    """Delete idempotency records whose TTL has passed"""
+    deleted = db.query(IdempotencyRecord).filter(
+        IdempotencyRecord.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def _maybe_purge_idempotency_keys(db: Session):
+    global _last_idempotency_purge
+    now = time.monotonic()
+    if now - _last_idempotency_purge < IDEMPOTENCY_PURGE_INTERVAL_SECONDS:
+        return
+    _last_idempotency_purge = now
+    try:
+        purge_expired_idempotency_keys(db)
+    except Exception:
+        db.rollback()
+
+def _replay_idempotent_response(record: IdempotencyRecord) -> JSONResponse:
+    return JSONResponse(
+        status_code=record.response_status,
+        content=json.loads(record.response_body) if record.response_body else None,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+def _claim_idempotency_key(key: str, fingerprint: str) -> Optional[JSONResponse]:
+    """
+    Claim the key for this request. Returns None when the caller owns the key and
+    must do the work, or the stored response when the key was already completed.
+    Waits while another request holds the key.
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        db = sessionLocal()
+        try:
+            now = datetime.utcnow()
+            # Expired keys and in-progress keys whose owner stopped sending heartbeats may be
+            # reclaimed; a slow but live owner keeps its key, so its charge never runs twice
+            db.query(IdempotencyRecord).filter(
+                IdempotencyRecord.key == key,
+                (IdempotencyRecord.expires_at <= now) | and_(
+                    IdempotencyRecord.status == 'in_progress',
+                    func.coalesce(IdempotencyRecord.heartbeat_at, IdempotencyRecord.created_at)
+                    <= now - timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT_SECONDS)
+                )
+            ).delete(synchronize_session=False)
+            db.commit()
+
+            record = db.get(IdempotencyRecord, key)
+            if record is None:
+                db.add(IdempotencyRecord(
+                    key=key,
+                    request_fingerprint=fingerprint,
+                    status='in_progress',
+                    created_at=now,
+                    heartbeat_at=now,
+                    expires_at=now + timedelta(seconds=IDEMPOTENCY_KEY_TTL_SECONDS)
+                ))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Another request claimed the key between our read and insert
+                    db.rollback()
+                    continue
+                with _idempotency_lock:
+                    _idempotency_events[key] = threading.Event()
+                idempotency_heartbeat.start()
+                _maybe_purge_idempotency_keys(db)
+                return None
+
+            if record.request_fingerprint != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key was already used with a different request."
+                )
+            if record.status == 'completed':
+                return _replay_idempotent_response(record)
+        finally:
+            db.close()
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed.",
+                headers={"Retry-After": "1"}
+            )
+        with _idempotency_lock:
+            event = _idempotency_events.get(key)
+        if event is not None:
+            event.wait(min(remaining, 1.0))
+        else:
+            # The owner is another process; poll the stored record
+            time.sleep(min(remaining, 0.1))
+
+def _finish_idempotency_key(key: str, response_status: Optional[int] = None, body: Any = None):
+    """Store the final response for the key, or drop the key when response_status is None"""
+    db = sessionLocal()
+    try:
+        record = db.get(IdempotencyRecord, key)
+        if record is not None:
+            if response_status is None:
+                db.delete(record)
+            else:
+                record.status = 'completed'
+                record.response_status = response_status
+                record.response_body = json.dumps(jsonable_encoder(body))
+            db.commit()
+    finally:
+        db.close()
+        with _idempotency_lock:
+            event = _idempotency_events.pop(key, None)
+        if event is not None:
+            event.set()
+
+class IdempotencyHeartbeat:
+    """Refreshes heartbeat_at of the keys owned by this process while their requests run"""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="idempotency-heartbeat", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def beat(self):
+        with _idempotency_lock:
+            keys = list(_idempotency_events)
+        if not keys:
+            return
+        db = sessionLocal()
+        try:
+            db.query(IdempotencyRecord).filter(
+                IdempotencyRecord.key.in_(keys),
+                IdempotencyRecord.status == 'in_progress'
+            ).update({IdempotencyRecord.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Idempotency key heartbeat failed")
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.beat()
+
+idempotency_heartbeat = IdempotencyHeartbeat(IDEMPOTENCY_LOCK_TIMEOUT_SECONDS / 3)
+
+class NonRetryableError(HTTPException):
+    """A server error raised after work that must not be repeated, e.g. once the card was charged"""
+
+def run_idempotent(scope: str, idempotency_key: Optional[str], payload: Any, handler):
+    """
+    Run handler() at most once per Idempotency-Key. Retries with the same key and payload
+    get the stored result (including 4xx errors) without repeating the work. Server errors
+    are not stored so the client can retry them, unless they are NonRetryableError.
+    """
+    if not idempotency_key:
+        return handler()
+    if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Idempotency-Key is too long.")
+
+    key = f"{scope}:{idempotency_key}"
+    cached = _claim_idempotency_key(key, request_fingerprint(scope, payload))
+    if cached is not None:
+        return cached
+
+    try:
+        result = handler()
+    except HTTPException as e:
+        if e.status_code >= 500 and not isinstance(e, NonRetryableError):
+            _finish_idempotency_key(key)
+        else:
+            _finish_idempotency_key(key, e.status_code, {"detail": e.detail})
+        raise
+    except Exception:
+        _finish_idempotency_key(key)
+        raise
+
+    _finish_idempotency_key(key, status.HTTP_200_OK, result)
+    return result
+
+@router.post("/admin/idempotency/purge")
+def purge_idempotency_keys(db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+    """Remove idempotency keys whose TTL has expired"""
+    deleted = purge_expired_idempotency_keys(db)
+    return {"message": f"Purged {deleted} expired idempotency keys."}
+
 # Multi-Step Booking Flow with Concurrency Control
 
 # Step 1: Step 1 of booking process: Initiates a booking, reserves the seat, calculates the final price,
 # and returns a pre-booking ID for payment simulation.
 # Implements concurrency control using DB transactions.
-@app.post("/bookings/initiate", response_model=BookingInitiationResponse, status_code=status.HTTP_202_ACCEPTED)
+@router.post("/bookings/initiate", response_model=BookingInitiationResponse, status_code=status.HTTP_202_ACCEPTED)
 def initiate_booking(
     booking_data: BookingRequest, 
     db: Session = Depends(get_db),
@@ -708,40 +3422,28 @@ def initiate_booking(
         raise HTTPException(status_code=404, detail="Flight not found.")
     
     final_price = calculate_dynamic_price(flight, seat._class, db)
-    
-    # Check if a pre-booking already exists for this seat (concurrency control)
-    existing_hold = db.query(PreBooking).filter(PreBooking.seat_id == seat.id).first()
-    if existing_hold:
-        raise HTTPException(status_code=409, detail="Seat is currently on hold pending payment.")
 
     try:
-        # 1. Mark the physical seat as unavailable (hard lock for concurrency control)
-        seat.is_available = False
-        db.add(seat)
-        
-        # 2. Create a temporary Pre-Booking record
-        pre_booking_id = generate_pre_booking_id()
-        new_pre_booking = PreBooking(
-            pre_booking_id=pre_booking_id,
+        # Hold the seat in the configured store (no database write with the memory store)
+        pre_booking = seat_holds.hold(db, seat, SeatHold(
+            pre_booking_id=generate_pre_booking_id(),
             flight_id=booking_data.flight_id,
-            seat_id=seat.id,
+            seat=seat,
             user_id=user_id,  # Store user_id if authenticated
             total_price=final_price,
             passenger_name=booking_data.passenger_name,
             passenger_email=booking_data.passenger_email if hasattr(booking_data, 'passenger_email') else None,
             passenger_phone=booking_data.passenger_phone if hasattr(booking_data, 'passenger_phone') else None
-        )
-        db.add(new_pre_booking)
-
-        db.commit()
-        db.refresh(new_pre_booking)
+        ))
         
         return {
             "message": "Booking initiated. Proceed to payment.",
-            "pre_booking_id": pre_booking_id,
+            "pre_booking_id": pre_booking.pre_booking_id,
             "total_price": final_price,
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail="Booking initiation failed due to a system error.")
@@ -749,52 +3451,47 @@ def initiate_booking(
 #   Step 2 of booking process: Simulates an external payment gateway and completes the final booking transaction.
 #   Generates unique PNR after successful payment.
 
-@app.post("/payment/process", response_model=BookingResponse)
-def process_payment(payment_request: BookingCompletionRequest, db: Session = Depends(get_db)):
-    pre_booking = db.query(PreBooking).filter(PreBooking.pre_booking_id == payment_request.pre_booking_id).first()
+#   Send an Idempotency-Key header to make client retries safe: a repeated key returns the original
+#   result without charging or booking again.
+@router.post("/payment/process", response_model=BookingResponse)
+def process_payment(
+    payment_request: BookingCompletionRequest,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None)
+):
+    return run_idempotent(
+        "payment", idempotency_key, payment_request,
+        lambda: complete_payment(payment_request, db)
+    )
+
+def complete_payment(payment_request: BookingCompletionRequest, db: Session):
+    pre_booking = seat_holds.get(db, payment_request.pre_booking_id)
     
     if not pre_booking:
         raise HTTPException(status_code=404, detail="Payment link expired or pre-booking not found.")
 
-    # --- SIMULATE PAYMENT SUCCESS/FAILURE ---
-    # 85% chance of success, 15% chance of failure
-    if random.random() > 0.85:
+    reject_cancelled_flight(pre_booking, db)
+    # Secure the seat before anything is charged; fails with 409 if it was sold meanwhile
+    seat_holds.reserve(db, pre_booking)
+    # Charge inline through the configured gateway (use /payment/submit to avoid blocking on slow gateways)
+    try:
+        result = payment_gateway.charge(pre_booking.pre_booking_id, float(pre_booking.total_price))
+    except Exception:
+        seat_holds.set_paying(pre_booking, False)
+        raise
+    if not result.success:
         # Payment Fails: Must revert the seat availability
-        seat_to_revert = db.query(Seat).get(pre_booking.seat_id)
-        if seat_to_revert:
-            seat_to_revert.is_available = True
-            db.add(seat_to_revert)
-        
-        # Delete the pre-booking record
-        db.delete(pre_booking)
-        db.commit()
+        release_pre_booking(pre_booking, db)
         
         raise HTTPException(
             status_code=status.HTTP_402_PAYMENT_REQUIRED, 
             detail="Simulated Payment Failed. Please re-try the booking."
         )
-    # --- END SIMULATED PAYMENT ---
 
     # Payment Success: Final Transaction with PNR Generation
+    pre_booking_id, amount = pre_booking.pre_booking_id, pre_booking.total_price
     try:
-        # 1. Create the permanent booking record with unique PNR
-        new_booking = Booking(
-            pnr=generate_pnr(),
-            flight_id=pre_booking.flight_id,
-            user_id=pre_booking.user_id,  # Transfer user_id from pre-booking
-            seat_id=pre_booking.seat_id,  # Store the seat information
-            passenger_name=pre_booking.passenger_name,
-            passenger_email=pre_booking.passenger_email,
-            passenger_phone=pre_booking.passenger_phone,
-            total_price=pre_booking.total_price  # Use the price held during initiation
-        )
-        db.add(new_booking)
-
-        # 2. Delete the temporary Pre-Booking record (the seat remains unavailable from Step 1)
-        db.delete(pre_booking)
-
-        db.commit()
-        db.refresh(new_booking)
+        new_booking = confirm_pre_booking(pre_booking, db)
 
         return {
             "message": "Booking successful! Payment Confirmed and PNR assigned.", 
@@ -804,13 +3501,445 @@ def process_payment(payment_request: BookingCompletionRequest, db: Session = Dep
     
     except Exception as e:
         db.rollback()
-        # If the commit fails here, the pre-booking might remain, requiring an external cleanup
-        raise HTTPException(status_code=500, detail="Final booking record creation failed.")
+        # The card was charged: refund it, and make a retry with the same Idempotency-Key get this answer
+        reason = e.detail if isinstance(e, HTTPException) else f"booking_error: {e}"
+        refund_charge(db, pre_booking_id, amount, result, reason)
+        release_abandoned_hold(db, pre_booking_id)
+        if isinstance(e, HTTPException):
+            raise HTTPException(status_code=e.status_code, detail=f"{e.detail} The payment will be refunded.")
+        raise NonRetryableError(status_code=500, detail="Final booking record creation failed. The payment will be refunded.")
+
+def flight_is_cancelled(db: Session, flight_id: int) -> bool:
+    if not disruptions_installed(db):
+        return False
+    return db.query(FlightDisruption.id).filter(FlightDisruption.flight_id == flight_id).first() is not None
+
+def reject_cancelled_flight(pre_booking, db: Session):
+    """Before charging: fail with 409 if the hold's flight was cancelled, discarding its holds"""
+    if flight_is_cancelled(db, pre_booking.flight_id):
+        seat_holds.drop_flight(db, pre_booking.flight_id)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Flight has been cancelled.")
+
+def confirm_pre_booking(pre_booking, db: Session) -> Booking:
+    """Turn a paid seat hold into a permanent booking with a unique PNR"""
+    # Normally caught before charging; a cancellation racing the charge is refunded by the caller
+    if flight_is_cancelled(db, pre_booking.flight_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Flight has been cancelled.")
+
+    # 1. Create the permanent booking record with unique PNR
+    new_booking = Booking(
+        pnr=generate_pnr(),
+        flight_id=pre_booking.flight_id,
+        user_id=pre_booking.user_id,  # Transfer user_id from pre-booking
+        seat_id=pre_booking.seat_id,  # Store the seat information
+        passenger_name=pre_booking.passenger_name,
+        passenger_email=pre_booking.passenger_email,
+        passenger_phone=pre_booking.passenger_phone,
+        total_price=pre_booking.total_price  # Use the price held during initiation
+    )
+    db.add(new_booking)
+
+    # 2. Make the hold permanent: mark the seat sold (memory store) or drop the pre_bookings row
+    seat_changes = seat_holds.claim(db, pre_booking)
+
+    # 3. Count the sale in the analytics rollups within the same transaction
+    record_booking_rollup(db, new_booking, "booked")
+
+    db.commit()
+    seat_holds.finish(pre_booking)
+    # The booking is committed: callers refund on errors, so follow-up bookkeeping must not raise
+    try:
+        db.refresh(new_booking)
+        mark_booking_written(new_booking, db)
+        if seat_changes:
+            on_inventory_change(db, new_booking.flight_id, seat_changes)
+    except Exception:
+        db.rollback()
+        logger.exception("Updates after booking %s failed", new_booking.pnr)
+    return new_booking
+
+def mark_booking_written(booking: Booking, db: Session):
+    """Keep follow-up reads of this booking (by PNR, email or owner) on the primary"""
+    owner = db.get(User, booking.user_id) if booking.user_id else None
+    mark_recent_write(
+        f"pnr:{booking.pnr}",
+        f"email:{booking.passenger_email.lower()}" if booking.passenger_email else None,
+        f"email:{owner.email.lower()}" if owner else None
+    )
+
+def release_pre_booking(pre_booking, db: Session):
+    """Give the held seat back and drop the hold after a failed or abandoned payment"""
+    seat_holds.release(db, pre_booking)
+
+# ============================================================================
+# Payment Gateway Simulator and Asynchronous Payment Workers
+# ============================================================================
+
+# Gateway behaviour; the defaults reproduce the original inline simulation (instant, 15% failures)
+PAYMENT_GATEWAY = os.getenv("PAYMENT_GATEWAY", "simulated")
+PAYMENT_GATEWAY_LATENCY_MS = float(os.getenv("PAYMENT_GATEWAY_LATENCY_MS", 0))
+PAYMENT_GATEWAY_LATENCY_JITTER_MS = float(os.getenv("PAYMENT_GATEWAY_LATENCY_JITTER_MS", 0))
+PAYMENT_GATEWAY_LATENCY_DISTRIBUTION = os.getenv("PAYMENT_GATEWAY_LATENCY_DISTRIBUTION", "uniform")  # uniform | lognormal
+PAYMENT_GATEWAY_FAILURE_RATE = float(os.getenv("PAYMENT_GATEWAY_FAILURE_RATE", 0.15))
+PAYMENT_GATEWAY_TIMEOUT_RATE = float(os.getenv("PAYMENT_GATEWAY_TIMEOUT_RATE", 0))
+PAYMENT_GATEWAY_TIMEOUT_MS = float(os.getenv("PAYMENT_GATEWAY_TIMEOUT_MS", 10000))
+
+# Worker pool for /payment/submit
+PAYMENT_WORKERS = int(os.getenv("PAYMENT_WORKERS", 8))
+PAYMENT_MAX_PENDING = int(os.getenv("PAYMENT_MAX_PENDING", 256))
+
+class PaymentResult(BaseModel):
+    success: bool
+    gateway_reference: Optional[str] = None
+    failure_reason: Optional[str] = None
+    latency_ms: float = 0.0
+
+class PaymentGateway:
+    """Interface for payment gateways. charge() blocks until the gateway answers."""
+
+    def charge(self, payment_id: str, amount: float) -> PaymentResult:
+        raise NotImplementedError
+
+    def refund(self, gateway_reference: str, amount: float) -> PaymentResult:
+        """Give back a successful charge (void or refund)"""
+        raise NotImplementedError
+
+class SimulatedPaymentGateway(PaymentGateway):
+    """Local stand-in for a card gateway with configurable latency and failure distributions"""
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        latency_jitter_ms: float = 0.0,
+        latency_distribution: str = "uniform",
+        failure_rate: float = 0.15,
+        timeout_rate: float = 0.0,
+        timeout_ms: float = 10000.0
+    ):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.latency_distribution = latency_distribution
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_ms = timeout_ms
+
+    def sample_latency_ms(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.latency_distribution == "lognormal" and self.latency_jitter_ms > 0:
+            # Long-tailed latency with the configured mean and standard deviation
+            variance = (self.latency_jitter_ms / self.latency_ms) ** 2
+            sigma = (math.log(1 + variance)) ** 0.5
+            mu = math.log(self.latency_ms) - sigma ** 2 / 2
+            return random.lognormvariate(mu, sigma)
+        return max(self.latency_ms + random.uniform(-self.latency_jitter_ms, self.latency_jitter_ms), 0.0)
+
+    def charge(self, payment_id: str, amount: float) -> PaymentResult:
+        if self.timeout_rate and random.random() < self.timeout_rate:
+            time.sleep(self.timeout_ms / 1000)
+            return PaymentResult(success=False, failure_reason="gateway_timeout", latency_ms=self.timeout_ms)
+
+        latency = self.sample_latency_ms()
+        if latency:
+            time.sleep(latency / 1000)
+
+        if random.random() < self.failure_rate:
+            return PaymentResult(success=False, failure_reason="card_declined", latency_ms=latency)
+        reference = 'GW' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=12))
+        return PaymentResult(success=True, gateway_reference=reference, latency_ms=latency)
+
+    def refund(self, gateway_reference: str, amount: float) -> PaymentResult:
+        latency = self.sample_latency_ms()
+        if latency:
+            time.sleep(latency / 1000)
+        reference = 'RF' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=12))
+        return PaymentResult(success=True, gateway_reference=reference, latency_ms=latency)
+
+# Gateway implementations selectable with PAYMENT_GATEWAY
+PAYMENT_GATEWAYS = {
+    "simulated": lambda: SimulatedPaymentGateway(
+        latency_ms=PAYMENT_GATEWAY_LATENCY_MS,
+        latency_jitter_ms=PAYMENT_GATEWAY_LATENCY_JITTER_MS,
+        latency_distribution=PAYMENT_GATEWAY_LATENCY_DISTRIBUTION,
+        failure_rate=PAYMENT_GATEWAY_FAILURE_RATE,
+        timeout_rate=PAYMENT_GATEWAY_TIMEOUT_RATE,
+        timeout_ms=PAYMENT_GATEWAY_TIMEOUT_MS
+    ),
+}
+
+def create_payment_gateway(name: str = PAYMENT_GATEWAY) -> PaymentGateway:
+    if name not in PAYMENT_GATEWAYS:
+        raise ValueError(f"Unknown PAYMENT_GATEWAY '{name}'. Available: {', '.join(PAYMENT_GATEWAYS)}")
+    return PAYMENT_GATEWAYS[name]()
+
+class PaymentWorkerPool:
+    """
+    Bounded pool of threads that submit charges to the gateway off the request path.
+    submit() never blocks: it returns False when max_pending charges are already queued or running.
+    """
+
+    def __init__(self, gateway: PaymentGateway, max_workers: int, max_pending: int):
+        self.gateway = gateway
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._pending = 0
+        self._in_flight = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._rejected = 0
+        self._latencies_ms: deque = deque(maxlen=1000)
+
+    def submit(self, payment_id: str, amount: float, callback) -> bool:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            return False
+        with self._lock:
+            self._pending += 1
+            if self._executor is None:
+                # Created on first use so the pool works again after a shutdown
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="payment-worker")
+            executor = self._executor
+        executor.submit(self._run, payment_id, amount, callback)
+        return True
+
+    def _run(self, payment_id: str, amount: float, callback):
+        with self._lock:
+            self._pending -= 1
+            self._in_flight += 1
+        started = time.monotonic()
+        try:
+            try:
+                result = self.gateway.charge(payment_id, amount)
+            except Exception as e:
+                result = PaymentResult(success=False, failure_reason=f"gateway_error: {e}")
+            callback(payment_id, result)
+        finally:
+            elapsed_ms = (time.monotonic() - started) * 1000
+            with self._lock:
+                self._in_flight -= 1
+                if result.success:
+                    self._succeeded += 1
+                else:
+                    self._failed += 1
+                self._latencies_ms.append(elapsed_ms)
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies_ms)
+            completed = self._succeeded + self._failed
+            uptime = time.monotonic() - self._started_at
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "in_flight": self._in_flight,
+                "succeeded": self._succeeded,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "completed_per_second": round(completed / uptime, 3) if uptime > 0 else 0.0,
+                "avg_latency_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                "p95_latency_ms": round(latencies[math.ceil(len(latencies) * 0.95) - 1], 2) if latencies else 0.0
+            }
+
+    def shutdown(self):
+        # Let running charges finish so their bookings are confirmed or released
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+payment_gateway = create_payment_gateway()
+payment_pool = PaymentWorkerPool(payment_gateway, PAYMENT_WORKERS, PAYMENT_MAX_PENDING)
+
+class Payment(Base):
+    __tablename__ = "payments"
+    id = Column(Integer, primary_key=True)
+    payment_id = Column(String(20), unique=True)
+    pre_booking_id = Column(String(10))
+    amount = Column(DECIMAL(10, 2))
+    status = Column(String(20), default='pending')  # pending | succeeded | failed | refunded | refund_failed
+    gateway_reference = Column(String, nullable=True)
+    failure_reason = Column(String, nullable=True)
+    pnr = Column(String, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class PaymentStatusResponse(BaseModel):
+    payment_id: str
+    pre_booking_id: str
+    status: str
+    total_price: float
+    pnr: Optional[str] = None
+    failure_reason: Optional[str] = None
+    status_url: str
+
+def generate_payment_id():
+    return 'PAY' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=12))
+
+def payment_status_response(payment: Payment) -> Dict[str, Any]:
+    return {
+        "payment_id": payment.payment_id,
+        "pre_booking_id": payment.pre_booking_id,
+        "status": payment.status,
+        "total_price": float(payment.amount),
+        "pnr": payment.pnr,
+        "failure_reason": payment.failure_reason,
+        "status_url": f"/payment/status/{payment.payment_id}"
+    }
+
+def refund_charge(db: Session, pre_booking_id: str, amount, result: PaymentResult, reason: str,
+                  payment: Optional[Payment] = None) -> Payment:
+    """Refund a charge whose booking could not be made and record it in payments"""
+    try:
+        refund = payment_gateway.refund(result.gateway_reference, float(amount))
+    except Exception as e:
+        refund = PaymentResult(success=False, failure_reason=f"gateway_error: {e}")
+    if payment is None:
+        payment = Payment(payment_id=generate_payment_id(), pre_booking_id=pre_booking_id, amount=amount)
+        db.add(payment)
+    payment.gateway_reference = result.gateway_reference
+    if refund.success:
+        payment.status = 'refunded'
+        payment.failure_reason = f"{reason} (refund {refund.gateway_reference})"
+    else:
+        # Left for manual follow-up: the customer was charged and has no booking
+        payment.status = 'refund_failed'
+        payment.failure_reason = f"{reason}; refund failed: {refund.failure_reason}"
+        logger.error("Refund of charge %s for %s failed: %s", result.gateway_reference, pre_booking_id, refund.failure_reason)
+    db.commit()
+    return payment
+
+def release_abandoned_hold(db: Session, pre_booking_id: str):
+    """Unpin and release a hold whose payment ended in an error, so the seat does not stay held"""
+    try:
+        hold = seat_holds.get(db, pre_booking_id)
+        if hold is not None:
+            seat_holds.set_paying(hold, False)
+            release_pre_booking(hold, db)
+    except Exception:
+        db.rollback()
+        logger.exception("Releasing hold %s after a payment error failed", pre_booking_id)
+
+def handle_payment_result(payment_id: str, result: PaymentResult):
+    """
+    Gateway callback: confirms the booking on success or releases the held seat on failure.
+    Runs on a payment worker thread with its own session.
+    """
+    db = sessionLocal()
+    try:
+        payment = db.query(Payment).filter(Payment.payment_id == payment_id).first()
+        if not payment or payment.status != 'pending':
+            return
+        pre_booking = seat_holds.get(db, payment.pre_booking_id)
+        payment.gateway_reference = result.gateway_reference
+
+        if not pre_booking:
+            if result.success:
+                refund_charge(db, payment.pre_booking_id, payment.amount, result, "pre_booking_expired", payment)
+            else:
+                payment.status = 'failed'
+                payment.failure_reason = "pre_booking_expired"
+                db.commit()
+        elif result.success:
+            # Booking and payment status are committed together
+            payment.status = 'succeeded'
+            new_booking = confirm_pre_booking(pre_booking, db)
+            payment.pnr = new_booking.pnr
+            db.commit()
+        else:
+            payment.status = 'failed'
+            payment.failure_reason = result.failure_reason
+            release_pre_booking(pre_booking, db)
+    except Exception as e:
+        db.rollback()
+        payment = db.query(Payment).filter(Payment.payment_id == payment_id).first()
+        if payment and payment.status == 'pending':
+            reason = e.detail if isinstance(e, HTTPException) else f"booking_error: {e}"
+            if result.success:
+                refund_charge(db, payment.pre_booking_id, payment.amount, result, reason, payment)
+            else:
+                payment.status = 'failed'
+                payment.failure_reason = reason
+                db.commit()
+            release_abandoned_hold(db, payment.pre_booking_id)
+    finally:
+        db.close()
+
+# Asynchronous payment: queues the charge and returns immediately; poll the status URL for the PNR.
+@router.post("/payment/submit", response_model=PaymentStatusResponse, status_code=status.HTTP_202_ACCEPTED)
+def submit_payment(
+    payment_request: BookingCompletionRequest,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None)
+):
+    return run_idempotent(
+        "payment-submit", idempotency_key, payment_request,
+        lambda: queue_payment(payment_request, db)
+    )
+
+def queue_payment(payment_request: BookingCompletionRequest, db: Session):
+    pre_booking = seat_holds.get(db, payment_request.pre_booking_id)
+    if not pre_booking:
+        raise HTTPException(status_code=404, detail="Payment link expired or pre-booking not found.")
+
+    # A pre-booking is only charged once; a second submit returns the payment already in progress
+    existing = db.query(Payment).filter(
+        Payment.pre_booking_id == pre_booking.pre_booking_id,
+        Payment.status.in_(('pending', 'succeeded'))
+    ).first()
+    if existing:
+        return payment_status_response(existing)
+
+    reject_cancelled_flight(pre_booking, db)
+    # Secure the seat before anything is charged; fails with 409 if it was sold meanwhile
+    seat_holds.reserve(db, pre_booking)
+    payment = Payment(
+        payment_id=generate_payment_id(),
+        pre_booking_id=pre_booking.pre_booking_id,
+        amount=pre_booking.total_price,
+        status='pending'
+    )
+    db.add(payment)
+    db.commit()
+    db.refresh(payment)
+
+    if not payment_pool.submit(payment.payment_id, float(payment.amount), handle_payment_result):
+        # The seat stays on hold so the client can retry once the gateway backlog clears
+        seat_holds.set_paying(pre_booking, False)
+        db.delete(payment)
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Payment gateway is busy. Please retry shortly.",
+            headers={"Retry-After": "2"}
+        )
+    return payment_status_response(payment)
+
+@router.get("/payment/status/{payment_id}", response_model=PaymentStatusResponse)
+def get_payment_status(payment_id: str, db: Session = Depends(get_db)):
+    payment = db.query(Payment).filter(Payment.payment_id == payment_id).first()
+    if not payment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found.")
+    return payment_status_response(payment)
+
+@router.get("/admin/payments/stats")
+def get_payment_stats():
+    """Gateway worker pool counters for measuring booking throughput under slow gateways"""
+    return {"gateway": PAYMENT_GATEWAY, **payment_pool.stats()}
 
 # Booking History Retrieval
-@app.get("/bookings/{pnr}")
-def get_booking_details(pnr: str, db: Session = Depends(get_db)):
+@router.get("/bookings/{pnr}")
+def get_booking_details(pnr: str, db: Session = Depends(get_read_db)):
     booking = db.query(Booking).filter(Booking.pnr == pnr.upper()).first()
+    if not booking:
+        # Flights departed long ago live in the archive
+        booking = next(iter(find_archived_bookings(db, pnr=pnr.upper())), None)
     
     if not booking:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Booking not found.")
@@ -818,7 +3947,7 @@ def get_booking_details(pnr: str, db: Session = Depends(get_db)):
     flight = db.query(Flight).get(booking.flight_id)
     origin = db.query(Airport).get(flight.origin_id)
     destination = db.query(Airport).get(flight.destination_id)
-    seat = db.query(Seat).get(booking.seat_id) if booking.seat_id else None
+    seat_number, seat_class = booking_seat(db, booking)
     
     return {
         "id": booking.id,
@@ -829,8 +3958,8 @@ def get_booking_details(pnr: str, db: Session = Depends(get_db)):
         "passenger_email": booking.passenger_email,
         "passenger_phone": booking.passenger_phone,
         "seat_id": booking.seat_id,
-        "seat_number": seat.seat_number if seat else None,
-        "seat_class": seat._class if seat else None,
+        "seat_number": seat_number,
+        "seat_class": seat_class,
         "total_price": float(booking.total_price),
         "booking_status": booking.booking_status,
         "booking_time": booking.booking_date,
@@ -850,46 +3979,617 @@ def get_booking_details(pnr: str, db: Session = Depends(get_db)):
 
 # Booking Cancellation
 # Handles the cancellation of a FINALIZED booking with concurrency safety.
-# Reverts seat availability and removes booking record.
-@app.delete("/bookings/{pnr}")
+# Reverts seat availability and marks the booking cancelled (kept for history and analytics).
+@router.delete("/bookings/{pnr}")
 def cancel_booking(pnr: str, db: Session = Depends(get_db)):
     booking = db.query(Booking).filter(Booking.pnr == pnr.upper()).first()
     
     if not booking:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Booking not found.")
+    already_cancelled = HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Booking is already cancelled.")
+    if booking.booking_status == 'cancelled':
+        raise already_cancelled
 
-    # Find the corresponding seat. Note: A cancelled booking implies the seat is marked unavailable.
-    seat = db.query(Seat).filter(
-        and_(Seat.flight_id == booking.flight_id, Seat.is_available == False)
-    ).first()
-    
-    if not seat:
-        # Safety check: if the booking exists, but the seat is magically available, something is wrong
-        pass 
+    # The booking's own seat; seats of a cancelled flight stay closed
+    seat = db.query(Seat).get(booking.seat_id) if booking.seat_id else None
+    if seat and flight_is_cancelled(db, booking.flight_id):
+        seat = None
         
     try:
-        # 1. Mark the seat as available (concurrency protection)
+        # 1. Mark the booking cancelled; the row stays so backfill_analytics sees the cancellation.
+        # Conditional, so of two concurrent cancels only one frees the seat and counts it
+        cancelled = db.query(Booking).filter(
+            Booking.id == booking.id,
+            func.coalesce(Booking.booking_status, 'confirmed') != 'cancelled'
+        ).update({Booking.booking_status: 'cancelled'}, synchronize_session=False)
+        if not cancelled:
+            db.rollback()
+            raise already_cancelled
+
+        # 2. Mark the seat as available
         if seat:
             seat.is_available = True
             db.add(seat)
             
-        # 2. Delete the booking record
-        db.delete(booking)
+        record_booking_rollup(db, booking, "cancelled")
+        mark_booking_written(booking, db)
+        flight_id = booking.flight_id
+        freed = [seat_change(seat)] if seat else []
         db.commit()
+        on_inventory_change(db, flight_id, freed)
         return {"message": f"Booking {pnr.upper()} successfully cancelled. Seat {seat.seat_number if seat else 'N/A'} is now available."}
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Cancellation failed due to a system error.")
 
+# ============================================================================
+# Flight Disruptions: Cancellation and Re-accommodation
+# ============================================================================
+# Cancelling a flight closes its remaining seats, then moves its bookings onto other
+# flights of the same route. Bookings and free seats are loaded in one query each and
+# matched in memory: passengers are taken in priority order (cabin, then booking time)
+# and get a seat in their own cabin, or a higher one if upgrades are allowed, on the
+# alternative departing closest to the original. Moves are committed in chunks; a seat
+# taken by a concurrent booking sends its passenger to a second planning pass.
+
+DISRUPTION_CHUNK_SIZE = int(os.getenv("DISRUPTION_CHUNK_SIZE", 200))
+# Cabins from highest to lowest, for passenger priority and upgrades
+CABIN_PRIORITY = ["First", "Business", "Economy"]
+
+class FlightDisruption(Base):
+    __tablename__ = "flight_disruptions"
+    id = Column(Integer, primary_key=True)
+    flight_id = Column(Integer, ForeignKey('flights.id'), unique=True)
+    reason = Column(String)
+    status = Column(String(20), default='processing')  # processing | completed
+    affected = Column(Integer, default=0)
+    rebooked = Column(Integer, default=0)
+    unaccommodated = Column(Integer, default=0)
+    created_at = Column(DateTime, server_default=func.now())
+    completed_at = Column(DateTime, nullable=True)
+
+class DisruptionRebooking(Base):
+    __tablename__ = "disruption_rebookings"
+    id = Column(Integer, primary_key=True)
+    disruption_id = Column(Integer, ForeignKey('flight_disruptions.id'))
+    booking_id = Column(Integer)  # no foreign key: bookings move to the archive
+    pnr = Column(String)
+    old_flight_id = Column(Integer)
+    old_seat_id = Column(Integer, nullable=True)
+    new_flight_id = Column(Integer, nullable=True)
+    new_seat_id = Column(Integer, nullable=True)
+    outcome = Column(String(20))  # rebooked | unaccommodated
+    created_at = Column(DateTime, server_default=func.now())
+
+_disruptions_installed = False
+
+def disruptions_installed(db: Session) -> bool:
+    """Whether disruptions_schema.sql has been applied (checked until it has)"""
+    global _disruptions_installed
+    if not _disruptions_installed:
+        _disruptions_installed = inspect(db.get_bind()).has_table(FlightDisruption.__tablename__)
+    return _disruptions_installed
+
+class FlightCancellationRequest(BaseModel):
+    reason: str = "operational"
+    alternative_flight_ids: Optional[List[int]] = None  # default: same route within max_days_later
+    max_days_later: int = 3
+    allow_upgrade: bool = True
+
+def cabin_rank(seat_class: Optional[str]) -> int:
+    return CABIN_PRIORITY.index(seat_class) if seat_class in CABIN_PRIORITY else len(CABIN_PRIORITY)
+
+def find_alternative_flights(db: Session, flight: Flight, max_days_later: int,
+                             flight_ids: Optional[List[int]] = None) -> List[Flight]:
+    """Future, not cancelled flights on the same route, closest departure first"""
+    cancelled = db.query(FlightDisruption.flight_id)
+    query = db.query(Flight).filter(
+        Flight.origin_id == flight.origin_id,
+        Flight.destination_id == flight.destination_id,
+        Flight.id != flight.id,
+        Flight.id.notin_(cancelled),
+        Flight.departure_time > datetime.now()
+    )
+    if flight_ids:
+        query = query.filter(Flight.id.in_(flight_ids))
+    else:
+        query = query.filter(Flight.departure_time <= flight.departure_time + timedelta(days=max_days_later))
+    return sorted(query.all(), key=lambda alt: abs((alt.departure_time - flight.departure_time).total_seconds()))
+
+def load_free_seats(db: Session, flights: List[Flight]) -> Dict[tuple, deque]:
+    """(flight_id, class) -> free seats as (id, flight_id, seat_number, class), one query for all flights"""
+    free: Dict[tuple, deque] = {}
+    if not flights:
+        return free
+    held = set()
+    for alt in flights:
+        held |= seat_holds.held_seat_ids(db, alt.id)
+    rows = db.query(Seat.id, Seat.flight_id, Seat.seat_number, Seat._class).filter(
+        Seat.flight_id.in_([alt.id for alt in flights]),
+        Seat.is_available == True
+    ).order_by(Seat.flight_id, Seat.id).all()
+    for row in rows:
+        if row.id not in held:
+            free.setdefault((row.flight_id, row._class), deque()).append(tuple(row))
+    return free
+
+def plan_reaccommodation(passengers: List[Dict[str, Any]], flights: List[Flight],
+                         free: Dict[tuple, deque], allow_upgrade: bool):
+    """Match passengers to free seats; returns ([(passenger, seat)], [unassigned passengers])"""
+    assignments, unassigned = [], []
+    for passenger in sorted(passengers, key=lambda p: (cabin_rank(p["seat_class"]), p["booking_date"] or datetime.max, p["booking_id"])):
+        cabins = [passenger["seat_class"]]
+        if allow_upgrade:
+            # Nearest higher cabin first
+            cabins += list(reversed(CABIN_PRIORITY[:cabin_rank(passenger["seat_class"])]))
+        seat = None
+        for alt in flights:
+            for cabin in cabins:
+                if free.get((alt.id, cabin)):
+                    seat = free[(alt.id, cabin)].popleft()
+                    break
+            if seat:
+                break
+        if seat:
+            assignments.append((passenger, seat))
+        else:
+            unassigned.append(passenger)
+    return assignments, unassigned
+
+def apply_rebooking_chunk(db: Session, disruption: FlightDisruption, chunk: List[tuple]) -> tuple:
+    """
+    Move one chunk of passengers in a single transaction. Returns (applied, conflicts);
+    conflicts are passengers whose planned seat was taken meanwhile.
+    """
+    seat_ids = [seat[0] for _, seat in chunk]
+    still_free = {seat_id for (seat_id,) in db.query(Seat.id).filter(
+        Seat.id.in_(seat_ids), Seat.is_available == True
+    ).with_for_update()}
+    applied = [(passenger, seat) for passenger, seat in chunk if seat[0] in still_free]
+    conflicts = [passenger for passenger, seat in chunk if seat[0] not in still_free]
+    if applied:
+        db.bulk_update_mappings(Seat, [{"id": seat[0], "is_available": False} for _, seat in applied])
+        db.bulk_update_mappings(Booking, [
+            {"id": passenger["booking_id"], "flight_id": seat[1], "seat_id": seat[0], "booking_status": "rebooked"}
+            for passenger, seat in applied
+        ])
+        db.bulk_insert_mappings(DisruptionRebooking, [
+            {
+                "disruption_id": disruption.id,
+                "booking_id": passenger["booking_id"],
+                "pnr": passenger["pnr"],
+                "old_flight_id": passenger["flight_id"],
+                "old_seat_id": passenger["seat_id"],
+                "new_flight_id": seat[1],
+                "new_seat_id": seat[0],
+                "outcome": "rebooked"
+            }
+            for passenger, seat in applied
+        ])
+        move_flight_load(db, applied)
+    db.commit()
+    for passenger, _ in applied:
+        mark_recent_write(
+            f"pnr:{passenger['pnr']}",
+            f"email:{passenger['passenger_email'].lower()}" if passenger["passenger_email"] else None
+        )
+    return applied, conflicts
+
+def move_flight_load(db: Session, applied: List[tuple]):
+    """Shift seats_sold in the load rollup from the cancelled flight to the new flights"""
+    moves: Dict[tuple, int] = {}
+    for passenger, seat in applied:
+        old_key = (passenger["flight_id"], passenger["seat_class"] or UNKNOWN_SEAT_CLASS)
+        moves[old_key] = moves.get(old_key, 0) - 1
+        moves[(seat[1], seat[3])] = moves.get((seat[1], seat[3]), 0) + 1
+    dims = flight_dimensions(db, {flight_id for flight_id, _ in moves})
+    seeded = {flight_id for (flight_id,) in db.query(FlightLoadRollup.flight_id).filter(
+        FlightLoadRollup.flight_id.in_(list(dims))
+    ).distinct()}
+    record_flight_capacity(db, count_seats_by_class(db, list(set(dims) - seeded)))
+    for (flight_id, seat_class), sold in moves.items():
+        if flight_id in dims and sold:
+            increment_rollup(db, FlightLoadRollup, {"flight_id": flight_id, "seat_class": seat_class},
+                             {"seats_sold": sold}, {**dims[flight_id], "seats_total": 0})
+
+def run_flight_disruption(db: Session, flight: Flight, request: FlightCancellationRequest) -> Dict[str, Any]:
+    """Cancel a flight and re-accommodate its passengers; re-running resumes an interrupted run"""
+    if not disruptions_installed(db):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Disruption tables missing; apply database/disruptions_schema.sql.")
+    started = time.perf_counter()
+    disruption = db.query(FlightDisruption).filter(FlightDisruption.flight_id == flight.id).first()
+    if disruption and disruption.status == 'completed':
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Flight is already cancelled.")
+    if disruption is None:
+        disruption = FlightDisruption(flight_id=flight.id, reason=request.reason, status='processing')
+        db.add(disruption)
+    # Close the flight first so no new bookings arrive while passengers are moved
+    db.query(Seat).filter(Seat.flight_id == flight.id, Seat.is_available == True).update(
+        {Seat.is_available: False}, synchronize_session=False
+    )
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Flight is already being cancelled.")
+    dropped_holds = seat_holds.drop_flight(db, flight.id)
+
+    # Every affected booking in one query
+    passengers = [
+        {
+            "booking_id": booking_id, "pnr": pnr, "passenger_email": email, "flight_id": flight.id,
+            "seat_id": seat_id, "seat_class": seat_class, "booking_date": booking_date
+        }
+        for booking_id, pnr, email, seat_id, booking_date, seat_class in db.query(
+            Booking.id, Booking.pnr, Booking.passenger_email, Booking.seat_id, Booking.booking_date, Seat._class
+        ).outerjoin(Seat, Seat.id == Booking.seat_id).filter(
+            Booking.flight_id == flight.id,
+            func.coalesce(Booking.booking_status, 'confirmed') != 'cancelled'
+        ).all()
+    ]
+    alternatives = find_alternative_flights(db, flight, request.max_days_later, request.alternative_flight_ids)
+
+    rebooked: List[tuple] = []
+    pending = passengers
+    for _ in range(2):  # second pass re-plans passengers whose seat was taken concurrently
+        assignments, unassigned = plan_reaccommodation(pending, alternatives, load_free_seats(db, alternatives),
+                                                       request.allow_upgrade)
+        conflicts = []
+        for i in range(0, len(assignments), DISRUPTION_CHUNK_SIZE):
+            applied, chunk_conflicts = apply_rebooking_chunk(db, disruption, assignments[i:i + DISRUPTION_CHUNK_SIZE])
+            rebooked.extend(applied)
+            conflicts.extend(chunk_conflicts)
+        pending = unassigned + conflicts
+        if not conflicts:
+            break
+
+    # Passengers without a seat keep their booking on the cancelled flight for manual handling
+    for i in range(0, len(pending), DISRUPTION_CHUNK_SIZE):
+        chunk = pending[i:i + DISRUPTION_CHUNK_SIZE]
+        db.bulk_update_mappings(Booking, [{"id": p["booking_id"], "booking_status": "disrupted"} for p in chunk])
+        db.bulk_insert_mappings(DisruptionRebooking, [
+            {"disruption_id": disruption.id, "booking_id": p["booking_id"], "pnr": p["pnr"],
+             "old_flight_id": flight.id, "old_seat_id": p["seat_id"], "outcome": "unaccommodated"}
+            for p in chunk
+        ])
+        db.commit()
+
+    disruption.rebooked = db.query(func.count(DisruptionRebooking.id)).filter(
+        DisruptionRebooking.disruption_id == disruption.id, DisruptionRebooking.outcome == 'rebooked'
+    ).scalar()
+    disruption.unaccommodated = len(pending)
+    disruption.affected = disruption.rebooked + disruption.unaccommodated
+    disruption.status = 'completed'
+    disruption.completed_at = datetime.now()
+    db.commit()
+
+    # Fares and live seat maps of every flight that changed
+    changes_by_flight: Dict[int, List[Dict[str, Any]]] = {}
+    for _, (seat_id, flight_id, seat_number, seat_class) in rebooked:
+        changes_by_flight.setdefault(flight_id, []).append(
+            {"id": seat_id, "seat_number": seat_number, "class": seat_class, "is_available": False}
+        )
+    on_inventory_change(db, flight.id, reprice=True)
+    for flight_id, changes in changes_by_flight.items():
+        on_inventory_change(db, flight_id, changes)
+
+    return {
+        "disruption_id": disruption.id,
+        "flight_id": flight.id,
+        "flight_number": flight.flight_number,
+        "status": disruption.status,
+        "affected": disruption.affected,
+        "rebooked": disruption.rebooked,
+        "unaccommodated": disruption.unaccommodated,
+        "released_holds": dropped_holds,
+        "alternatives": [
+            {"flight_id": alt.id, "flight_number": alt.flight_number, "departure_time": alt.departure_time,
+             "passengers": len(changes_by_flight.get(alt.id, []))}
+            for alt in alternatives
+        ],
+        "rebookings": [
+            {"pnr": passenger["pnr"], "new_flight_id": seat[1], "seat_number": seat[2], "seat_class": seat[3],
+             "upgraded": cabin_rank(seat[3]) < cabin_rank(passenger["seat_class"])}
+            for passenger, seat in rebooked
+        ],
+        "unaccommodated_pnrs": [p["pnr"] for p in pending],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+@router.post("/admin/flights/{flight_id}/cancel")
+def cancel_flight(flight_id: int, request: Optional[FlightCancellationRequest] = None, db: Session = Depends(get_db),
+                  admin: User = Depends(require_admin)):
+    """Cancel a flight and move its passengers to other flights on the same route"""
+    flight = db.query(Flight).filter(Flight.id == flight_id).first()
+    if not flight:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Flight not found.")
+    return run_flight_disruption(db, flight, request or FlightCancellationRequest())
+
+@router.get("/admin/disruptions/{disruption_id}")
+def get_disruption(disruption_id: int, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+    """Outcome of a flight cancellation, with one entry per affected booking"""
+    disruption = db.query(FlightDisruption).filter(FlightDisruption.id == disruption_id).first()
+    if not disruption:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Disruption not found.")
+    rebookings = db.query(DisruptionRebooking).filter(
+        DisruptionRebooking.disruption_id == disruption_id
+    ).order_by(DisruptionRebooking.id).all()
+    return {
+        "disruption_id": disruption.id,
+        "flight_id": disruption.flight_id,
+        "reason": disruption.reason,
+        "status": disruption.status,
+        "affected": disruption.affected,
+        "rebooked": disruption.rebooked,
+        "unaccommodated": disruption.unaccommodated,
+        "created_at": disruption.created_at,
+        "completed_at": disruption.completed_at,
+        "rebookings": [
+            {
+                "pnr": r.pnr,
+                "outcome": r.outcome,
+                "old_flight_id": r.old_flight_id,
+                "old_seat_id": r.old_seat_id,
+                "new_flight_id": r.new_flight_id,
+                "new_seat_id": r.new_seat_id
+            }
+            for r in rebookings
+        ]
+    }
+
+# ============================================================================
+# Archival of Departed Flights
+# ============================================================================
+# seats and bookings only hold flights that have not departed (or departed recently),
+# so inventory queries scan a bounded table. The archival job moves the rows of flights
+# departed more than ARCHIVE_AFTER_DAYS ago into seats_archive / bookings_archive, which
+# are partitioned by departure month (database/archive_migration.sql). With
+# ARCHIVE_SEAT_EXPORT_DIR set, seat rows are written to gzip JSON-lines files per month
+# instead. Archived bookings keep their seat number and class and are still found by
+# PNR, email and user lookups.
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 30))
+ARCHIVE_BATCH_FLIGHTS = int(os.getenv("ARCHIVE_BATCH_FLIGHTS", 100))  # flights moved per transaction
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", 0))  # 0: only via POST /admin/archive/run
+ARCHIVE_SEAT_EXPORT_DIR = os.getenv("ARCHIVE_SEAT_EXPORT_DIR")
+
+class BookingArchive(Base):
+    __tablename__ = "bookings_archive"
+    id = Column(Integer, primary_key=True)
+    departure_date = Column(Date, primary_key=True)  # partition key
+    pnr = Column(String)
+    flight_id = Column(Integer)
+    user_id = Column(Integer, nullable=True)
+    passenger_name = Column(String)
+    passenger_email = Column(String, nullable=True)
+    passenger_phone = Column(String, nullable=True)
+    seat_id = Column(Integer, nullable=True)
+    seat_number = Column(String, nullable=True)
+    seat_class = Column(String, nullable=True)
+    total_price = Column(DECIMAL(10,2))
+    booking_status = Column(String)
+    booking_date = Column(DateTime)
+    archived_at = Column(DateTime, server_default=func.now())
+
+class SeatArchive(Base):
+    __tablename__ = "seats_archive"
+    id = Column(Integer, primary_key=True)
+    departure_date = Column(Date, primary_key=True)  # partition key
+    flight_id = Column(Integer)
+    seat_number = Column(String)
+    is_available = Column(Boolean)
+    _class = Column("class", String)
+    archived_at = Column(DateTime, server_default=func.now())
+
+class ArchivedFlight(Base):
+    __tablename__ = "archived_flights"
+    flight_id = Column(Integer, ForeignKey('flights.id'), primary_key=True)
+    departure_date = Column(Date, nullable=False)
+    seats = Column(Integer, nullable=False, default=0)
+    bookings = Column(Integer, nullable=False, default=0)
+    seats_exported = Column(Boolean, nullable=False, default=False)
+    archived_at = Column(DateTime, server_default=func.now())
+
+_archive_installed = False
+
+def archive_installed(db: Session) -> bool:
+    """Whether archive_migration.sql has been applied (checked until it has)"""
+    global _archive_installed
+    if not _archive_installed:
+        _archive_installed = inspect(db.get_bind()).has_table(BookingArchive.__tablename__)
+    return _archive_installed
+
+def find_archived_bookings(db: Session, **filters) -> List[BookingArchive]:
+    """Archived bookings matching column filters, e.g. pnr=..., passenger_email=..."""
+    if not archive_installed(db):
+        return []
+    return db.query(BookingArchive).filter_by(**filters).all()
+
+def booking_seat(db: Session, booking) -> tuple:
+    """(seat_number, seat_class) of a booking; archived bookings carry their own copy"""
+    if isinstance(booking, BookingArchive):
+        return booking.seat_number, booking.seat_class
+    seat = db.query(Seat).get(booking.seat_id) if booking.seat_id else None
+    return (seat.seat_number, seat._class) if seat else (None, None)
+
+def export_seat_rows(rows) -> List[str]:
+    """Append seat rows to one gzip JSON-lines file per departure month"""
+    by_month: Dict[str, List[str]] = {}
+    for row in rows:
+        by_month.setdefault(row.departure_date.strftime("%Y-%m"), []).append(json.dumps({
+            "id": row.id,
+            "flight_id": row.flight_id,
+            "seat_number": row.seat_number,
+            "is_available": row.is_available,
+            "class": row._class,
+            "departure_date": row.departure_date.isoformat()
+        }))
+    os.makedirs(ARCHIVE_SEAT_EXPORT_DIR, exist_ok=True)
+    paths = []
+    for month, lines in by_month.items():
+        path = os.path.join(ARCHIVE_SEAT_EXPORT_DIR, f"seats-{month}.jsonl.gz")
+        # Each append is a new gzip member; gzip readers see one continuous file
+        with gzip.open(path, "at", encoding="utf-8") as export:
+            export.write("\n".join(lines) + "\n")
+        paths.append(path)
+    return paths
+
+def archive_flight_batch(db: Session, flights: List[tuple]) -> Dict[str, int]:
+    """Move the seats and bookings of these (flight_id, departure_time) pairs in one transaction"""
+    flight_ids = [flight_id for flight_id, _ in flights]
+    departure_date = func.date(Flight.departure_time, type_=Date)
+    if db.get_bind().dialect.name == "postgresql":
+        for month in {departure_time.date().replace(day=1) for _, departure_time in flights}:
+            db.execute(text("SELECT create_archive_partitions(:month)"), {"month": month})
+
+    booking_counts = dict(db.query(Booking.flight_id, func.count(Booking.id)).filter(
+        Booking.flight_id.in_(flight_ids)
+    ).group_by(Booking.flight_id).all())
+    seat_counts = dict(db.query(Seat.flight_id, func.count(Seat.id)).filter(
+        Seat.flight_id.in_(flight_ids)
+    ).group_by(Seat.flight_id).all())
+
+    db.execute(insert(BookingArchive).from_select(
+        ["id", "pnr", "flight_id", "user_id", "passenger_name", "passenger_email", "passenger_phone",
+         "seat_id", "seat_number", "seat_class", "total_price", "booking_status", "booking_date", "departure_date"],
+        select(Booking.id, Booking.pnr, Booking.flight_id, Booking.user_id, Booking.passenger_name,
+               Booking.passenger_email, Booking.passenger_phone, Booking.seat_id, Seat.seat_number, Seat._class,
+               Booking.total_price, Booking.booking_status, Booking.booking_date, departure_date)
+        .join(Flight, Flight.id == Booking.flight_id)
+        .outerjoin(Seat, Seat.id == Booking.seat_id)
+        .where(Booking.flight_id.in_(flight_ids))
+    ))
+    seat_rows = select(Seat.id, Seat.flight_id, Seat.seat_number, Seat.is_available, Seat._class,
+                       departure_date.label("departure_date")).join(
+        Flight, Flight.id == Seat.flight_id
+    ).where(Seat.flight_id.in_(flight_ids))
+    exported = bool(ARCHIVE_SEAT_EXPORT_DIR)
+    if exported:
+        # Written before the commit: a failed batch is retried and may repeat rows, never lose them
+        export_seat_rows(db.execute(seat_rows).all())
+    else:
+        db.execute(insert(SeatArchive).from_select(
+            ["id", "flight_id", "seat_number", "is_available", "class", "departure_date"], seat_rows
+        ))
+
+    db.query(PreBooking).filter(PreBooking.flight_id.in_(flight_ids)).delete(synchronize_session=False)
+    db.query(Booking).filter(Booking.flight_id.in_(flight_ids)).delete(synchronize_session=False)
+    db.query(Seat).filter(Seat.flight_id.in_(flight_ids)).delete(synchronize_session=False)
+    db.add_all([
+        ArchivedFlight(flight_id=flight_id, departure_date=departure_time.date(), seats=seat_counts.get(flight_id, 0),
+                       bookings=booking_counts.get(flight_id, 0), seats_exported=exported)
+        for flight_id, departure_time in flights
+    ])
+    db.commit()
+    return {"flights": len(flights), "seats": sum(seat_counts.values()), "bookings": sum(booking_counts.values())}
+
+def archive_departed_flights(db: Session, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                             max_batches: Optional[int] = None) -> Dict[str, Any]:
+    """Archive flights departed more than older_than_days ago, ARCHIVE_BATCH_FLIGHTS at a time"""
+    if not archive_installed(db):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Archive tables missing; apply database/archive_migration.sql.")
+    started = time.perf_counter()
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    totals = {"flights": 0, "seats": 0, "bookings": 0, "batches": 0}
+    while max_batches is None or totals["batches"] < max_batches:
+        # SKIP LOCKED lets several instances run the job without archiving a flight twice
+        flights = db.query(Flight.id, Flight.departure_time).filter(
+            Flight.departure_time < cutoff,
+            Flight.id.notin_(db.query(ArchivedFlight.flight_id))
+        ).order_by(Flight.departure_time).limit(ARCHIVE_BATCH_FLIGHTS).with_for_update(skip_locked=True).all()
+        if not flights:
+            db.rollback()
+            break
+        try:
+            moved = archive_flight_batch(db, [tuple(flight) for flight in flights])
+        except Exception:
+            db.rollback()
+            raise
+        totals["batches"] += 1
+        for key, count in moved.items():
+            totals[key] += count
+    totals["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return totals
+
+class ArchiveScheduler:
+    """Background thread running the archival job every ARCHIVE_INTERVAL_SECONDS"""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.interval_seconds > 0 and (self._thread is None or not self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="archive", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            db = sessionLocal()
+            try:
+                result = archive_departed_flights(db)
+                if result["flights"]:
+                    logger.info("Archived %s flights (%s seats, %s bookings)",
+                                result["flights"], result["seats"], result["bookings"])
+            except Exception:
+                logger.exception("Archival run failed")
+            finally:
+                db.close()
+
+archive_scheduler = ArchiveScheduler(ARCHIVE_INTERVAL_SECONDS)
+
+@router.post("/admin/archive/run")
+def run_archive(older_than_days: int = ARCHIVE_AFTER_DAYS, max_batches: Optional[int] = None,
+                db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+    """Move seats and bookings of long-departed flights to the archive"""
+    return archive_departed_flights(db, older_than_days, max_batches)
+
+@router.get("/admin/archive")
+def get_archive_stats(db: Session = Depends(get_db)):
+    """Rows still in the hot tables and archived flights per departure month"""
+    hot = {
+        "seats": db.query(func.count(Seat.id)).scalar(),
+        "bookings": db.query(func.count(Booking.id)).scalar(),
+        "oldest_departure": db.query(func.min(Flight.departure_time)).filter(
+            Flight.id.in_(db.query(Seat.flight_id))
+        ).scalar()
+    }
+    if not archive_installed(db):
+        return {"installed": False, "hot": hot}
+    month = func.substr(cast(ArchivedFlight.departure_date, String), 1, 7)
+    months = db.query(
+        month, func.count(ArchivedFlight.flight_id), func.sum(ArchivedFlight.seats), func.sum(ArchivedFlight.bookings)
+    ).group_by(month).order_by(month).all()
+    return {
+        "installed": True,
+        "archive_after_days": ARCHIVE_AFTER_DAYS,
+        "seat_export_dir": ARCHIVE_SEAT_EXPORT_DIR,
+        "hot": hot,
+        "archived_months": [
+            {"month": m, "flights": flights, "seats": int(seats or 0), "bookings": int(bookings or 0)}
+            for m, flights, seats, bookings in months
+        ]
+    }
+
 # ============================================================================
 # Additional Endpoints for Frontend Integration
 # ============================================================================
 
 # Get bookings by email
-@app.get("/bookings/email/{email}")
-def get_bookings_by_email(email: str, db: Session = Depends(get_db)):
+@router.get("/bookings/email/{email}")
+def get_bookings_by_email(email: str, db: Session = Depends(get_read_db)):
     """Retrieve all bookings for a given email address"""
     bookings = db.query(Booking).filter(Booking.passenger_email == email).all()
+    bookings += find_archived_bookings(db, passenger_email=email)
     if not bookings:
         return []
     
@@ -899,7 +4599,7 @@ def get_bookings_by_email(email: str, db: Session = Depends(get_db)):
         if flight:
             origin = db.query(Airport).get(flight.origin_id)
             destination = db.query(Airport).get(flight.destination_id)
-            seat = db.query(Seat).get(booking.seat_id) if booking.seat_id else None
+            seat_number, seat_class = booking_seat(db, booking)
             
             results.append({
                 "id": booking.id,
@@ -910,8 +4610,8 @@ def get_bookings_by_email(email: str, db: Session = Depends(get_db)):
                 "passenger_email": booking.passenger_email,
                 "passenger_phone": booking.passenger_phone,
                 "seat_id": booking.seat_id,
-                "seat_number": seat.seat_number if seat else None,
-                "seat_class": seat._class if seat else None,
+                "seat_number": seat_number,
+                "seat_class": seat_class,
                 "total_price": float(booking.total_price),
                 "booking_status": booking.booking_status,
                 "booking_time": booking.booking_date,
@@ -932,8 +4632,8 @@ def get_bookings_by_email(email: str, db: Session = Depends(get_db)):
     return results
 
 # Get seats for a specific flight and class
-@app.get("/flights/{flight_id}/seats")
-def get_flight_seats(flight_id: int, seat_class: Optional[str] = None, db: Session = Depends(get_db)):
+@router.get("/flights/{flight_id}/seats")
+def get_flight_seats(flight_id: int, seat_class: Optional[str] = None, db: Session = Depends(get_read_db)):
     """Get available seats for a flight, optionally filtered by class"""
     flight = db.query(Flight).filter(Flight.id == flight_id).first()
     if not flight:
@@ -945,20 +4645,19 @@ def get_flight_seats(flight_id: int, seat_class: Optional[str] = None, db: Sessi
         query = query.filter(Seat._class == seat_class)
     
     seats = query.all()
+    held = seat_holds.held_seat_ids(db, flight_id)
     
-    # Calculate pricing for each class
-    pricing = {}
+    # Look up the stored fare for each class
     unique_classes = set(s._class for s in seats)
-    for cls in unique_classes:
-        price = calculate_dynamic_price(flight, cls, db)
-        pricing[cls] = price
+    fares = get_fares(db, [flight_id], unique_classes)
+    pricing = {cls: fares[(flight_id, cls)]["price"] if (flight_id, cls) in fares else 0.0 for cls in unique_classes}
     
     return {
         "seats": [
             {
                 "id": s.id,
                 "seat_number": s.seat_number,
-                "is_available": s.is_available,
+                "is_available": s.is_available and s.id not in held,
                 "class": s._class,
                 "flight_id": s.flight_id
             }
@@ -968,25 +4667,70 @@ def get_flight_seats(flight_id: int, seat_class: Optional[str] = None, db: Sessi
     }
 
 # Get dynamic pricing for a flight and class
-@app.get("/flights/{flight_id}/pricing")
-def get_flight_pricing(flight_id: int, seat_class: str = "Economy", db: Session = Depends(get_db)):
+@router.get("/flights/{flight_id}/pricing")
+def get_flight_pricing(flight_id: int, seat_class: str = "Economy", db: Session = Depends(get_read_db)):
     """Get dynamic pricing for a specific flight and seat class"""
     flight = db.query(Flight).filter(Flight.id == flight_id).first()
     if not flight:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Flight not found")
     
-    price = calculate_dynamic_price(flight, seat_class, db)
+    fare = get_fares(db, [flight_id], {seat_class}).get((flight_id, seat_class))
     
-    return {"price": price}
+    return {"price": fare["price"] if fare else 0.0}
+
+# Batch price quotes: one request for a whole results page instead of one call per flight
+MAX_PRICE_QUOTE_ITEMS = 200
+
+class PriceQuoteItem(BaseModel):
+    flight_id: int
+    seat_class: str = "Economy"
+
+class PriceQuoteRequest(BaseModel):
+    items: List[PriceQuoteItem]
+
+@router.post("/flights/pricing/batch")
+def get_flight_pricing_batch(quote_request: PriceQuoteRequest, db: Session = Depends(get_read_db)):
+    """Price many (flight_id, seat_class) pairs with a constant number of queries; errors are per item"""
+    if len(quote_request.items) > MAX_PRICE_QUOTE_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_PRICE_QUOTE_ITEMS} items can be quoted per request."
+        )
+
+    flight_ids = {item.flight_id for item in quote_request.items}
+    known_flights = {flight_id for (flight_id,) in db.query(Flight.id).filter(Flight.id.in_(flight_ids))}
+    fares = get_fares(db, list(known_flights), {item.seat_class for item in quote_request.items})
+
+    quotes = []
+    for item in quote_request.items:
+        quote: Dict[str, Any] = {"flight_id": item.flight_id, "seat_class": item.seat_class}
+        fare = fares.get((item.flight_id, item.seat_class))
+        if item.flight_id not in known_flights:
+            quote["error"] = "Flight not found"
+        elif fare is None:
+            quote["error"] = "Seat class not available on this flight"
+        else:
+            quote["price"] = fare["price"]
+            quote["seats_available"] = fare["seats_available"]
+        quotes.append(quote)
+
+    return {"quotes": quotes}
 
 # Create simplified booking endpoint
-@app.post("/bookings")
+@router.post("/bookings")
 def create_booking_simple(
     booking_data: CreateBookingRequest,
     token: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """Create a new booking with seat selection (supports both authenticated and guest users)"""
+    return run_idempotent(
+        "booking", idempotency_key, {"booking": booking_data, "token": token},
+        lambda: create_booking_record(booking_data, token, db)
+    )
+
+def create_booking_record(booking_data: CreateBookingRequest, token: Optional[str], db: Session):
     # Get user if token provided
     user = None
     if token:
@@ -1005,7 +4749,8 @@ def create_booking_simple(
     if not seat:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Seat not found")
     
-    if not seat.is_available:
+    # Seats held by a checkout in progress (memory hold store) are still marked available
+    if not seat.is_available or seat.id in seat_holds.held_seat_ids(db, seat.flight_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Seat is not available")
     
     # Calculate price
@@ -1038,8 +4783,12 @@ def create_booking_simple(
         )
         
         db.add(new_booking)
+        record_booking_rollup(db, new_booking, "booked")
+        booked_seat = seat_change(seat)
         db.commit()
         db.refresh(new_booking)
+        mark_booking_written(new_booking, db)
+        on_inventory_change(db, new_booking.flight_id, [booked_seat])
         
         return {
             "id": new_booking.id,
@@ -1051,9 +4800,752 @@ def create_booking_simple(
             "seat_id": new_booking.seat_id,
             "total_price": float(new_booking.total_price),
             "booking_status": new_booking.booking_status,
-            "booking_time": new_booking.booking_time
+            "booking_time": new_booking.booking_date
         }
     
     except Exception as e:
         db.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Booking creation failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Booking creation failed: {str(e)}")
+
+# ============================================================================
+# Live Seat-Map and Price Updates (Server-Sent Events)
+# ============================================================================
+
+# Changes published within this window are merged into one message per flight
+SEAT_EVENTS_COALESCE_SECONDS = float(os.getenv("SEAT_EVENTS_COALESCE_MS", 250)) / 1000
+SEAT_EVENTS_HEARTBEAT_SECONDS = 15
+SEAT_EVENTS_QUEUE_SIZE = 50
+
+def seat_change(seat: Seat) -> Dict[str, Any]:
+    return {
+        "id": seat.id,
+        "seat_number": seat.seat_number,
+        "class": seat._class,
+        "is_available": seat.is_available
+    }
+
+def price_snapshot(flight_id: int, seat_classes: Optional[set] = None) -> Dict[str, Any]:
+    """Current price and availability for the given classes (all classes when None)"""
+    db = sessionLocal()
+    try:
+        fares = get_fares(db, [flight_id], seat_classes)
+        return {
+            "pricing": {seat_class: fare["price"] for (_, seat_class), fare in fares.items()},
+            "seats_available": {seat_class: fare["seats_available"] for (_, seat_class), fare in fares.items()}
+        }
+    finally:
+        db.close()
+
+class SeatEventBroker:
+    """
+    In-process fan-out of seat availability and price changes per flight.
+    Writers publish from request/worker threads; bursts are coalesced and each flush
+    reprices the affected classes once, however many subscribers are listening.
+    """
+
+    def __init__(self, coalesce_seconds: float):
+        self.coalesce_seconds = coalesce_seconds
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, set] = {}
+        # flight_id -> {"seats": {seat_number: change}, "classes": set or None for all}
+        self._pending: Dict[int, Dict[str, Any]] = {}
+
+    def subscribe(self, flight_id: int) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SEAT_EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(flight_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, flight_id: int, queue: asyncio.Queue):
+        with self._lock:
+            queues = self._subscribers.get(flight_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[flight_id]
+
+    def subscriber_count(self, flight_id: Optional[int] = None) -> int:
+        with self._lock:
+            if flight_id is not None:
+                return len(self._subscribers.get(flight_id, ()))
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    def publish(self, flight_id: int, seats: Optional[List[Dict[str, Any]]] = None, reprice: bool = False):
+        """Record seat changes for a flight; safe to call from any thread"""
+        with self._lock:
+            if not self._subscribers.get(flight_id) or self._loop is None:
+                return
+            pending = self._pending.get(flight_id)
+            schedule = pending is None
+            if pending is None:
+                pending = self._pending[flight_id] = {"seats": {}, "classes": set()}
+            for change in seats or []:
+                pending["seats"][change["seat_number"]] = change
+                if pending["classes"] is not None:
+                    pending["classes"].add(change["class"])
+            if reprice:
+                pending["classes"] = None
+        if schedule:
+            self._loop.call_soon_threadsafe(self._schedule_flush, flight_id)
+
+    def _schedule_flush(self, flight_id: int):
+        self._loop.call_later(self.coalesce_seconds, lambda: asyncio.ensure_future(self._flush(flight_id)))
+
+    async def _flush(self, flight_id: int):
+        with self._lock:
+            pending = self._pending.pop(flight_id, None)
+            has_subscribers = bool(self._subscribers.get(flight_id))
+        if not pending or not has_subscribers:
+            return
+        snapshot = await run_in_threadpool(price_snapshot, flight_id, pending["classes"])
+        self._broadcast(flight_id, {
+            "type": "seats",
+            "flight_id": flight_id,
+            "seats": list(pending["seats"].values()),
+            **snapshot
+        })
+
+    def _broadcast(self, flight_id: int, message: Dict[str, Any]):
+        with self._lock:
+            queues = list(self._subscribers.get(flight_id, ()))
+        for queue in queues:
+            if queue.full():
+                # Slow consumer: drop its backlog and tell it to reload the seat map
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync", "flight_id": flight_id})
+            else:
+                queue.put_nowait(message)
+
+seat_events = SeatEventBroker(SEAT_EVENTS_COALESCE_SECONDS)
+
+@router.get("/flights/{flight_id}/seats/stream")
+async def stream_flight_seats(flight_id: int, request: Request):
+    """
+    Server-sent events with seat availability and price changes for one flight.
+    Load the seat map once with /flights/{flight_id}/seats, then apply "seats" events;
+    on a "resync" event reload the full seat map.
+    """
+    def flight_exists():
+        db = readSessionLocal()
+        try:
+            return db.query(Flight.id).filter(Flight.id == flight_id).first() is not None
+        finally:
+            db.close()
+
+    if not await run_in_threadpool(flight_exists):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Flight not found")
+
+    queue = seat_events.subscribe(flight_id)
+
+    async def event_stream():
+        try:
+            yield f"event: ready\ndata: {json.dumps({'flight_id': flight_id})}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SEAT_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {message['type']}\ndata: {json.dumps(jsonable_encoder(message))}\n\n"
+        finally:
+            seat_events.unsubscribe(flight_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def release_expired_pre_bookings(db: Session) -> int:
+    """Release seats held by unpaid pre-bookings older than PRE_BOOKING_HOLD_MINUTES"""
+    return seat_holds.release_expired(db)
+
+@router.post("/admin/pre_bookings/sweep")
+def sweep_expired_pre_bookings(db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+    """Background process to release seats from abandoned checkouts"""
+    released = release_expired_pre_bookings(db)
+    return {"message": f"Released {released} expired seat holds."}
+
+# ============================================================================
+# Analytics Rollups
+# ============================================================================
+# Dashboard figures are kept in small pre-aggregated tables that are updated in the
+# same transaction as each booking or cancellation, so dashboard queries never scan
+# bookings/seats. POST /admin/analytics/backfill rebuilds them from history.
+
+UNKNOWN_SEAT_CLASS = "Unknown"
+
+class BookingRollup(Base):
+    """Revenue, bookings and cancellations per event day, route, airline and class"""
+    __tablename__ = "booking_rollups"
+    day = Column(Date, primary_key=True)
+    origin = Column(String(3), primary_key=True)
+    destination = Column(String(3), primary_key=True)
+    airline_id = Column(Integer, primary_key=True)
+    seat_class = Column(String(20), primary_key=True)
+    revenue = Column(DECIMAL(12, 2), nullable=False, default=0)
+    bookings = Column(Integer, nullable=False, default=0)
+    cancelled_revenue = Column(DECIMAL(12, 2), nullable=False, default=0)
+    cancellations = Column(Integer, nullable=False, default=0)
+
+class FlightLoadRollup(Base):
+    """Seats sold vs. seats offered per flight and class, for load factor by departure day"""
+    __tablename__ = "flight_load_rollups"
+    flight_id = Column(Integer, ForeignKey('flights.id'), primary_key=True)
+    seat_class = Column(String(20), primary_key=True)
+    departure_date = Column(Date, nullable=False)
+    origin = Column(String(3), nullable=False)
+    destination = Column(String(3), nullable=False)
+    airline_id = Column(Integer, nullable=False)
+    seats_total = Column(Integer, nullable=False, default=0)
+    seats_sold = Column(Integer, nullable=False, default=0)
+
+def flight_dimensions(db: Session, flight_ids) -> Dict[int, Dict[str, Any]]:
+    """Route, airline and departure date of flights, keyed by flight id"""
+    origin = aliased(Airport)
+    destination = aliased(Airport)
+    rows = db.query(Flight.id, Flight.airline_id, Flight.departure_time, origin.code, destination.code).join(
+        origin, origin.id == Flight.origin_id
+    ).join(
+        destination, destination.id == Flight.destination_id
+    ).filter(Flight.id.in_(list(flight_ids))).all()
+    return {
+        flight_id: {
+            "airline_id": airline_id,
+            "departure_date": departure_time.date(),
+            "origin": origin_code,
+            "destination": destination_code
+        }
+        for flight_id, airline_id, departure_time, origin_code, destination_code in rows
+    }
+
+def increment_rollup(db: Session, model, key: Dict[str, Any], increments: Dict[str, Any],
+                     defaults: Optional[Dict[str, Any]] = None):
+    """UPDATE ... SET col = col + n on the rollup row, inserting it first if it does not exist"""
+    values = {getattr(model, name): getattr(model, name) + amount for name, amount in increments.items()}
+    if db.query(model).filter_by(**key).update(values, synchronize_session=False):
+        return
+    try:
+        with db.begin_nested():
+            db.add(model(**{**(defaults or {}), **increments, **key}))
+    except IntegrityError:
+        # Inserted concurrently by another booking; the row exists now
+        db.query(model).filter_by(**key).update(values, synchronize_session=False)
+
+def record_booking_rollup(db: Session, booking: Booking, event: str):
+    """Add a booking ("booked") or cancellation ("cancelled") to the rollups; call before commit"""
+    dims = flight_dimensions(db, [booking.flight_id]).get(booking.flight_id)
+    if dims is None:
+        return
+    seat = db.query(Seat).get(booking.seat_id) if booking.seat_id else None
+    seat_class = seat._class if seat else UNKNOWN_SEAT_CLASS
+    price = booking.total_price or 0
+    sold = 1 if event == "booked" else -1
+
+    if event == "booked":
+        increments = {"revenue": price, "bookings": 1}
+    else:
+        increments = {"cancelled_revenue": price, "cancellations": 1}
+    increment_rollup(db, BookingRollup, {
+        "day": date.today(),
+        "origin": dims["origin"],
+        "destination": dims["destination"],
+        "airline_id": dims["airline_id"],
+        "seat_class": seat_class
+    }, increments, {"revenue": 0, "bookings": 0, "cancelled_revenue": 0, "cancellations": 0})
+
+    if not db.query(FlightLoadRollup.flight_id).filter(FlightLoadRollup.flight_id == booking.flight_id).first():
+        record_flight_capacity(db, count_seats_by_class(db, [booking.flight_id]))
+    increment_rollup(
+        db, FlightLoadRollup,
+        {"flight_id": booking.flight_id, "seat_class": seat_class},
+        {"seats_sold": sold},
+        {**dims, "seats_total": 0}
+    )
+
+# (flight_id, seat_class) -> seats_total this process has written to flight_load_rollups
+_recorded_capacity: Dict[tuple, int] = {}
+
+def record_flight_capacity(db: Session, counts: Dict[tuple, tuple]):
+    """
+    Set seats_total of the load rollups from count_seats_by_class() results; call before
+    commit. Fare refreshes call it the first time they see a flight and whenever its seat
+    total changes, so flights without sales are counted as offered too.
+    """
+    if not counts:
+        return
+    existing = {
+        (row.flight_id, row.seat_class): row
+        for row in db.query(FlightLoadRollup).filter(FlightLoadRollup.flight_id.in_({flight_id for flight_id, _ in counts}))
+    }
+    missing = [key for key in counts if key not in existing]
+    dims = flight_dimensions(db, {flight_id for flight_id, _ in missing}) if missing else {}
+    for key, (_, total) in counts.items():
+        row = existing.get(key)
+        if row is not None and row.seats_total != total:
+            row.seats_total = total  # only this column is written; seats_sold keeps its increments
+    try:
+        with db.begin_nested():
+            for flight_id, seat_class in missing:
+                if flight_id in dims:
+                    db.add(FlightLoadRollup(flight_id=flight_id, seat_class=seat_class,
+                                            seats_total=counts[(flight_id, seat_class)][1], seats_sold=0, **dims[flight_id]))
+    except IntegrityError:
+        pass  # Seeded concurrently by a booking or another refresh
+
+def backfill_analytics(db: Session) -> Dict[str, int]:
+    """
+    Rebuild both rollup tables from bookings and seats, including archived ones. Also
+    picks up the capacity of flights that have no bookings yet. Cancelled bookings are
+    kept with booking_status 'cancelled'; their cancellation is dated on the booking day
+    here (the live rollups use the cancellation day). Capacity of flights whose seats
+    were exported is not recovered.
+    """
+    db.query(BookingRollup).delete(synchronize_session=False)
+    db.query(FlightLoadRollup).delete(synchronize_session=False)
+    _recorded_capacity.clear()
+
+    seat_class = func.coalesce(Seat._class, UNKNOWN_SEAT_CLASS)
+    booking_groups = db.query(
+        func.date(Booking.booking_date),
+        Booking.flight_id,
+        seat_class,
+        Booking.booking_status,
+        func.count(Booking.id),
+        func.coalesce(func.sum(Booking.total_price), 0)
+    ).outerjoin(Seat, Seat.id == Booking.seat_id).group_by(
+        func.date(Booking.booking_date), Booking.flight_id, seat_class, Booking.booking_status
+    ).all()
+    seat_groups = db.query(Seat.flight_id, Seat._class, func.count(Seat.id)).group_by(Seat.flight_id, Seat._class).all()
+    if archive_installed(db):
+        archived_class = func.coalesce(BookingArchive.seat_class, UNKNOWN_SEAT_CLASS)
+        booking_groups += db.query(
+            func.date(BookingArchive.booking_date),
+            BookingArchive.flight_id,
+            archived_class,
+            BookingArchive.booking_status,
+            func.count(BookingArchive.id),
+            func.coalesce(func.sum(BookingArchive.total_price), 0)
+        ).group_by(
+            func.date(BookingArchive.booking_date), BookingArchive.flight_id, archived_class, BookingArchive.booking_status
+        ).all()
+        seat_groups += db.query(SeatArchive.flight_id, SeatArchive._class, func.count(SeatArchive.id)).group_by(
+            SeatArchive.flight_id, SeatArchive._class
+        ).all()
+
+    dims = flight_dimensions(db, {row[1] for row in booking_groups} | {row[0] for row in seat_groups})
+    booking_rollups: Dict[tuple, BookingRollup] = {}
+    load_rollups: Dict[tuple, FlightLoadRollup] = {}
+
+    for flight_id, cls, total in seat_groups:
+        if flight_id in dims:
+            load_rollups[(flight_id, cls)] = FlightLoadRollup(
+                flight_id=flight_id, seat_class=cls, seats_total=total, seats_sold=0, **dims[flight_id]
+            )
+
+    for day, flight_id, cls, booking_status, count, revenue in booking_groups:
+        flight = dims.get(flight_id)
+        if flight is None:
+            continue
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        key = (day, flight["origin"], flight["destination"], flight["airline_id"], cls)
+        rollup = booking_rollups.get(key)
+        if rollup is None:
+            rollup = booking_rollups[key] = BookingRollup(
+                day=day, origin=key[1], destination=key[2], airline_id=key[3], seat_class=cls,
+                revenue=0, bookings=0, cancelled_revenue=0, cancellations=0
+            )
+        # Cancelled bookings were still sold on their booking day
+        rollup.revenue += revenue
+        rollup.bookings += count
+        if booking_status == 'cancelled':
+            rollup.cancelled_revenue += revenue
+            rollup.cancellations += count
+        else:
+            load = load_rollups.get((flight_id, cls))
+            if load is None:
+                load = load_rollups[(flight_id, cls)] = FlightLoadRollup(
+                    flight_id=flight_id, seat_class=cls, seats_total=0, seats_sold=0, **flight
+                )
+            load.seats_sold += count
+
+    db.add_all(list(booking_rollups.values()) + list(load_rollups.values()))
+    db.commit()
+    return {"booking_rollups": len(booking_rollups), "flight_load_rollups": len(load_rollups)}
+
+ANALYTICS_GROUPS = {"day", "month", "weekday", "route", "airline", "class"}
+
+def analytics_group_key(group_by: str, day: date, origin: str, destination: str, airline: str, seat_class: str) -> str:
+    if group_by == "day":
+        return day.isoformat()
+    if group_by == "month":
+        return day.strftime("%Y-%m")
+    if group_by == "weekday":
+        return day.strftime("%a")
+    if group_by == "route":
+        return f"{origin} → {destination}"
+    if group_by == "airline":
+        return airline
+    return seat_class
+
+def analytics_date_range(start_date: Optional[date], end_date: Optional[date], days: int = 30) -> tuple:
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=days - 1)
+    if start_date > end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date must be before end_date.")
+    return start_date, end_date
+
+def validate_analytics_group(group_by: str):
+    if group_by not in ANALYTICS_GROUPS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"group_by must be one of: {', '.join(sorted(ANALYTICS_GROUPS))}"
+        )
+
+def revenue_totals(db: Session, start_date: date, end_date: date) -> Dict[str, float]:
+    revenue, bookings, cancelled_revenue, cancellations = db.query(
+        func.coalesce(func.sum(BookingRollup.revenue), 0),
+        func.coalesce(func.sum(BookingRollup.bookings), 0),
+        func.coalesce(func.sum(BookingRollup.cancelled_revenue), 0),
+        func.coalesce(func.sum(BookingRollup.cancellations), 0)
+    ).filter(BookingRollup.day >= start_date, BookingRollup.day <= end_date).one()
+    return {
+        "revenue": float(revenue),
+        "bookings": int(bookings),
+        "cancelled_revenue": float(cancelled_revenue),
+        "cancellations": int(cancellations)
+    }
+
+def load_totals(db: Session, start_date: date, end_date: date) -> Dict[str, float]:
+    sold, total = db.query(
+        func.coalesce(func.sum(FlightLoadRollup.seats_sold), 0),
+        func.coalesce(func.sum(FlightLoadRollup.seats_total), 0)
+    ).filter(FlightLoadRollup.departure_date >= start_date, FlightLoadRollup.departure_date <= end_date).one()
+    return {"seats_sold": int(sold), "seats_total": int(total)}
+
+def percent_change(current: float, previous: float) -> Optional[float]:
+    if not previous:
+        return None
+    return round((current - previous) / previous * 100, 1)
+
+@router.get("/analytics/revenue")
+def get_revenue_analytics(
+    group_by: str = "day",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_read_db),
+    admin: User = Depends(require_admin)
+):
+    """Revenue, bookings and cancellations by booking day, month, weekday, route, airline or class"""
+    validate_analytics_group(group_by)
+    start_date, end_date = analytics_date_range(start_date, end_date)
+    rows = db.query(BookingRollup, Airline.name).outerjoin(
+        Airline, Airline.id == BookingRollup.airline_id
+    ).filter(BookingRollup.day >= start_date, BookingRollup.day <= end_date).all()
+
+    groups: Dict[str, Dict[str, Any]] = {}
+    for rollup, airline_name in rows:
+        key = analytics_group_key(group_by, rollup.day, rollup.origin, rollup.destination,
+                                  airline_name or str(rollup.airline_id), rollup.seat_class)
+        group = groups.setdefault(key, {"key": key, "revenue": 0.0, "bookings": 0,
+                                        "cancelled_revenue": 0.0, "cancellations": 0})
+        group["revenue"] += float(rollup.revenue)
+        group["bookings"] += rollup.bookings
+        group["cancelled_revenue"] += float(rollup.cancelled_revenue)
+        group["cancellations"] += rollup.cancellations
+    for group in groups.values():
+        group["net_revenue"] = round(group["revenue"] - group["cancelled_revenue"], 2)
+        group["revenue"] = round(group["revenue"], 2)
+        group["cancelled_revenue"] = round(group["cancelled_revenue"], 2)
+
+    ordered = sorted(groups.values(), key=lambda g: g["key"]) if group_by in ("day", "month") \
+        else sorted(groups.values(), key=lambda g: -g["revenue"])
+    return {"group_by": group_by, "start_date": start_date, "end_date": end_date, "rows": ordered}
+
+@router.get("/analytics/load_factor")
+def get_load_factor_analytics(
+    group_by: str = "day",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_read_db),
+    admin: User = Depends(require_admin)
+):
+    """Seats sold / seats offered by departure day, month, weekday, route, airline or class"""
+    validate_analytics_group(group_by)
+    start_date, end_date = analytics_date_range(start_date, end_date)
+    rows = db.query(
+        FlightLoadRollup.departure_date,
+        FlightLoadRollup.origin,
+        FlightLoadRollup.destination,
+        Airline.name,
+        FlightLoadRollup.seat_class,
+        func.sum(FlightLoadRollup.seats_sold),
+        func.sum(FlightLoadRollup.seats_total)
+    ).outerjoin(Airline, Airline.id == FlightLoadRollup.airline_id).filter(
+        FlightLoadRollup.departure_date >= start_date,
+        FlightLoadRollup.departure_date <= end_date
+    ).group_by(
+        FlightLoadRollup.departure_date, FlightLoadRollup.origin, FlightLoadRollup.destination,
+        Airline.name, FlightLoadRollup.seat_class
+    ).all()
+
+    groups: Dict[str, Dict[str, Any]] = {}
+    for departure_date, origin, destination, airline_name, seat_class, sold, total in rows:
+        key = analytics_group_key(group_by, departure_date, origin, destination, airline_name, seat_class)
+        group = groups.setdefault(key, {"key": key, "seats_sold": 0, "seats_total": 0})
+        group["seats_sold"] += int(sold or 0)
+        group["seats_total"] += int(total or 0)
+    for group in groups.values():
+        group["load_factor"] = round(group["seats_sold"] / group["seats_total"] * 100, 1) if group["seats_total"] else 0.0
+
+    return {
+        "group_by": group_by,
+        "start_date": start_date,
+        "end_date": end_date,
+        "rows": sorted(groups.values(), key=lambda g: g["key"])
+    }
+
+@router.get("/analytics/summary")
+def get_analytics_summary(days: int = 30, db: Session = Depends(get_read_db), admin: User = Depends(require_admin)):
+    """Headline dashboard figures for the last `days` days, with change vs. the previous period"""
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    previous_end = start_date - timedelta(days=1)
+    previous_start = previous_end - timedelta(days=days - 1)
+
+    current = revenue_totals(db, start_date, end_date)
+    previous = revenue_totals(db, previous_start, previous_end)
+    load = load_totals(db, start_date, end_date)
+    previous_load = load_totals(db, previous_start, previous_end)
+
+    def average_fare(totals):
+        return round(totals["revenue"] / totals["bookings"], 2) if totals["bookings"] else 0.0
+
+    def occupancy(totals):
+        return round(totals["seats_sold"] / totals["seats_total"] * 100, 1) if totals["seats_total"] else 0.0
+
+    active_flights = db.query(Flight).filter(Flight.departure_time > datetime.now()).count()
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "revenue": round(current["revenue"], 2),
+        "revenue_change": percent_change(current["revenue"], previous["revenue"]),
+        "bookings": current["bookings"],
+        "bookings_change": percent_change(current["bookings"], previous["bookings"]),
+        "cancellations": current["cancellations"],
+        "average_fare": average_fare(current),
+        "average_fare_change": percent_change(average_fare(current), average_fare(previous)),
+        "occupancy": occupancy(load),
+        "occupancy_change": percent_change(occupancy(load), occupancy(previous_load)),
+        "active_flights": active_flights
+    }
+
+@router.post("/admin/analytics/backfill")
+def backfill_analytics_rollups(db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+    """Rebuild the analytics rollups from the full booking history"""
+    try:
+        counts = backfill_analytics(db)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Backfill failed: {str(e)}")
+    return {"message": "Analytics rollups rebuilt.", **counts}
+
+# ============================================================================
+# Application Startup, Warm-up and Health
+# ============================================================================
+# Importing this module only declares models and routes. The lifespan handler creates
+# the engines, then a background warm-up opens pool connections, loads reference data
+# and primes the fare table; /health/ready reports 503 until it has finished, while
+# /health/live answers as soon as the process serves requests.
+
+WARMUP_ENABLED = env_flag("WARMUP_ENABLED", True)
+WARMUP_POOL_CONNECTIONS = int(os.getenv("WARMUP_POOL_CONNECTIONS", DB_POOL_SIZE))
+WARMUP_FARE_DAYS = int(os.getenv("WARMUP_FARE_DAYS", 30))  # prime fares of flights departing within this window
+
+class StartupState:
+    """Timings of the startup phases and the readiness flag"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.phases_ms: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.warmed_up = False
+        self.ready_after_ms: Optional[float] = None
+        self.shutting_down = False
+
+    def begin(self):
+        with self._lock:
+            self.started_at = time.monotonic()
+            self.phases_ms.clear()
+            self.errors.clear()
+            self.warmed_up = False
+            self.ready_after_ms = None
+            self.shutting_down = False
+
+    def run_phase(self, name: str, fn, required: bool = False):
+        """Time fn(); errors of optional phases are recorded instead of raised"""
+        started = time.perf_counter()
+        try:
+            return fn()
+        except Exception as e:
+            with self._lock:
+                self.errors[name] = str(e)
+            logger.exception("Startup phase %s failed", name)
+            if required:
+                raise
+        finally:
+            with self._lock:
+                self.phases_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def mark_warmed_up(self):
+        with self._lock:
+            self.warmed_up = True
+            self.ready_after_ms = round((time.monotonic() - self.started_at) * 1000, 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "warmed_up": self.warmed_up,
+                "shutting_down": self.shutting_down,
+                "uptime_seconds": round(time.monotonic() - self.started_at, 1),
+                "ready_after_ms": self.ready_after_ms,
+                "phases_ms": dict(self.phases_ms),
+                "errors": dict(self.errors)
+            }
+
+startup_state = StartupState()
+
+def warm_connection_pool(target_engine, connections: int) -> int:
+    """Open connections up front so the first requests do not pay for connecting"""
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = target_engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()  # returned to the pool, not disconnected
+    return len(opened)
+
+def prime_fare_table(days: int) -> int:
+    """Store fares for upcoming flights that have no (or an expired) fare row"""
+    db = sessionLocal()
+    try:
+        now = datetime.now()
+        missing = [flight_id for (flight_id,) in db.query(Flight.id).outerjoin(
+            FareSnapshot, FareSnapshot.flight_id == Flight.id
+        ).filter(
+            Flight.departure_time > now,
+            Flight.departure_time <= now + timedelta(days=days),
+            FareSnapshot.flight_id == None
+        ).distinct()]
+        refreshed = 0
+        for i in range(0, len(missing), FARE_REFRESH_BATCH_SIZE):
+            refreshed += refresh_fares(db, missing[i:i + FARE_REFRESH_BATCH_SIZE])
+        return refreshed + refresh_due_fares(db)
+    finally:
+        db.close()
+
+def warm_query_paths():
+    """Run one search so mappers are configured and the hot statements are compiled"""
+    db = readSessionLocal()
+    try:
+        flight = db.query(Flight).filter(Flight.departure_time > datetime.now()).order_by(Flight.departure_time).first()
+        if flight is None:
+            return
+        origin = reference_data.airport(db, flight.origin_id)
+        destination = reference_data.airport(db, flight.destination_id)
+        if origin and destination:
+            run_flight_search(db, origin.code, destination.code, flight.departure_time.date(), None)
+    finally:
+        db.close()
+
+def warm_up():
+    """Warm the pools and caches, then mark the instance ready"""
+    startup_state.run_phase("pool", lambda: warm_connection_pool(engine, WARMUP_POOL_CONNECTIONS))
+    if read_engine is not engine:
+        startup_state.run_phase("replica_pool", lambda: warm_connection_pool(read_engine, WARMUP_POOL_CONNECTIONS))
+    startup_state.run_phase("reference_data", reference_data.load)
+    startup_state.run_phase("airport_index", ensure_airport_index)
+    startup_state.run_phase("fares", lambda: prime_fare_table(WARMUP_FARE_DAYS))
+    startup_state.run_phase("query_paths", warm_query_paths)
+    startup_state.mark_warmed_up()
+
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    startup_state.begin()
+    startup_state.run_phase("init_database", init_database, required=True)
+    startup_state.run_phase("seat_holds", seat_holds.open, required=True)
+    startup_state.run_phase("shared_inventory", open_shared_inventory)
+    fare_scheduler.start()
+    fare_history.start()
+    archive_scheduler.start()
+    if WARMUP_ENABLED:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    else:
+        startup_state.mark_warmed_up()
+    yield
+    startup_state.shutting_down = True
+    fare_scheduler.stop()
+    fare_history.stop()
+    archive_scheduler.stop()
+    payment_pool.shutdown()
+    idempotency_heartbeat.stop()
+    shared_inventory.close()
+    trace_writer.close()
+
+@router.get("/health/live")
+def liveness():
+    """The process is up and serving requests"""
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+def readiness():
+    """Ready for traffic: warm-up finished, not shutting down and the database answers"""
+    state = startup_state.snapshot()
+    if not state["warmed_up"] or state["shutting_down"]:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "stopping" if state["shutting_down"] else "starting", **state}
+        )
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "database_unavailable", "detail": str(e), **state}
+        )
+    return {"status": "ready", **state}
+
+def create_app() -> FastAPI:
+    """Build the ASGI application; the database is only touched once it starts up"""
+    application = FastAPI(lifespan=lifespan)
+    application.include_router(router)
+    application.state.route_costs = RouteCostTable(application.router.routes)
+    # Added before CORS so that CORS (outermost) also decorates 429/503 responses
+    application.add_middleware(AdmissionControlMiddleware)
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ALLOWED_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    if TRAFFIC_CAPTURE_ENABLED:
+        # Outermost, so the trace also records requests turned away with 429/503
+        application.add_middleware(TrafficCaptureMiddleware)
+    return application
+
+app = create_app()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
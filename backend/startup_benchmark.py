@@ -0,0 +1,91 @@
+# backend/startup_benchmark.py
+"""
+Startup-time benchmark for the API.
+
+Each run starts a fresh interpreter and reports how long it takes to import the
+third-party dependencies, to import main.py itself, to build the app, to create the
+engines and to finish each warm-up phase. Without DATABASE_URL only the import and
+app-building phases are measured.
+
+    python startup_benchmark.py --runs 5
+    python startup_benchmark.py --runs 5 --json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs inside a fresh interpreter and prints one JSON object of phase -> milliseconds
+CHILD_SCRIPT = r"""
+import json, os, sys, time
+timings = {}
+def timed(name, fn):
+    started = time.perf_counter()
+    result = fn()
+    timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+process_started = time.perf_counter()
+for module in ("dotenv", "pydantic", "sqlalchemy", "fastapi", "jose", "bcrypt"):
+    timed("import " + module, lambda: __import__(module))
+main = timed("import main", lambda: __import__("main"))
+timed("create_app", main.create_app)
+if main.DATABASE_URL:
+    main.startup_state.begin()
+    timed("init_database", main.init_database)
+    timed("warm_up", main.warm_up)
+    for phase, ms in main.startup_state.phases_ms.items():
+        timings["warm_up: " + phase] = ms
+timings["total"] = round((time.perf_counter() - process_started) * 1000, 1)
+print(json.dumps(timings))
+"""
+
+def run_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    # The last line is the timings; anything before it is log output from the app
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def summarize(runs: list) -> list:
+    phases = list(runs[0].keys())
+    rows = []
+    for phase in phases:
+        values = [run[phase] for run in runs if phase in run]
+        rows.append({
+            "phase": phase,
+            "median_ms": round(statistics.median(values), 1),
+            "min_ms": min(values),
+            "max_ms": max(values)
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and startup cost of the API")
+    parser.add_argument("--runs", type=int, default=5, help="number of cold starts to measure")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    rows = summarize(runs)
+
+    if args.json:
+        print(json.dumps({"runs": args.runs, "phases": rows}, indent=2))
+        return
+
+    print(f"Startup benchmark ({args.runs} cold starts)")
+    print(f"{'phase':<28}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for row in rows:
+        print(f"{row['phase']:<28}{row['median_ms']:>12}{row['min_ms']:>10}{row['max_ms']:>10}")
+
+if __name__ == "__main__":
+    main()
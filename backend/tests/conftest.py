@@ -0,0 +1,79 @@
+"""
+Test fixtures: the API against a throwaway SQLite database.
+The environment is set before main is imported, since main reads it at import time.
+"""
+import itertools
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+_database_dir = tempfile.mkdtemp(prefix="flight-booking-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_database_dir, 'test.db')}"
+os.environ["ADMIN_EMAILS"] = "ops@example.com"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["PAYMENT_GATEWAY_FAILURE_RATE"] = "0"
+os.environ["WARMUP_ENABLED"] = "false"
+os.environ["SHARED_INVENTORY_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    main.Base.metadata.create_all(main.init_database())
+    db = main.sessionLocal()
+    db.add_all([
+        main.Airport(code="DEL", name="Indira Gandhi International Airport", city="Delhi", country="India"),
+        main.Airport(code="LHR", name="Heathrow Airport", city="London", country="United Kingdom"),
+        main.Airline(name="Air India"),
+    ])
+    db.commit()
+    db.close()
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+_flight_numbers = itertools.count(101)
+
+
+@pytest.fixture
+def flight(client):
+    """A new DEL-LHR flight with two Business and four Economy seats, all available"""
+    db = main.sessionLocal()
+    try:
+        departure = datetime.now() + timedelta(days=10)
+        flight = main.Flight(flight_number=f"AI{next(_flight_numbers)}", airline_id=1, origin_id=1, destination_id=2,
+                             departure_time=departure, arrival_time=departure + timedelta(hours=9),
+                             base_price=500, demand_level=1.0)
+        db.add(flight)
+        db.flush()
+        for number in range(1, 7):
+            db.add(main.Seat(flight_id=flight.id, seat_number=f"{number}A", is_available=True,
+                             _class="Business" if number <= 2 else "Economy"))
+        db.commit()
+        db.refresh(flight)
+        return flight
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def booking_request(flight):
+    """Builds POST /bookings bodies for seats of the flight fixture"""
+    def build(seat_number: str = "3A", passenger_name: str = "Asha Rao") -> dict:
+        db = main.sessionLocal()
+        try:
+            seat = db.query(main.Seat).filter(main.Seat.flight_id == flight.id,
+                                              main.Seat.seat_number == seat_number).one()
+            return {"flight_id": flight.id, "seat_id": seat.id, "seat_class": seat._class,
+                    "passenger_name": passenger_name, "passenger_email": "asha@example.com",
+                    "passenger_phone": "+911234567890"}
+        finally:
+            db.close()
+    return build
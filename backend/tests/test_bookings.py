@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+
+
+def seat_is_available(seat_id: int) -> bool:
+    db = main.sessionLocal()
+    try:
+        return db.get(main.Seat, seat_id).is_available
+    finally:
+        db.close()
+
+
+def cancellations(flight) -> int:
+    db = main.sessionLocal()
+    try:
+        return db.query(main.func.coalesce(main.func.sum(main.BookingRollup.cancellations), 0)).filter(
+            main.BookingRollup.airline_id == flight.airline_id
+        ).scalar()
+    finally:
+        db.close()
+
+
+def test_cancelling_twice_frees_the_seat_once(client, flight, booking_request):
+    body = booking_request("6A")
+    pnr = client.post("/bookings", json=body).json()["pnr"]
+    cancelled_before = cancellations(flight)
+
+    first = client.delete(f"/bookings/{pnr}")
+    second = client.delete(f"/bookings/{pnr}")
+
+    assert first.status_code == 200
+    assert second.status_code == 409
+    assert seat_is_available(body["seat_id"])
+    assert cancellations(flight) == cancelled_before + 1
+
+
+def test_concurrent_cancellations_count_once(client, flight, booking_request):
+    pnr = client.post("/bookings", json=booking_request("1A")).json()["pnr"]
+    cancelled_before = cancellations(flight)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        codes = sorted(pool.map(lambda _: client.delete(f"/bookings/{pnr}").status_code, range(4)))
+
+    assert codes == [200, 409, 409, 409]
+    assert cancellations(flight) == cancelled_before + 1
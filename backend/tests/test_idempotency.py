@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import main
+
+
+def count_bookings(flight) -> int:
+    db = main.sessionLocal()
+    try:
+        return db.query(main.Booking).filter(main.Booking.flight_id == flight.id).count()
+    finally:
+        db.close()
+
+
+def hold_key(key: str, body: dict, heartbeat_at: datetime):
+    """Store the key as in progress, as if another request were running it"""
+    db = main.sessionLocal()
+    try:
+        db.add(main.IdempotencyRecord(
+            key=f"booking:{key}",
+            request_fingerprint=main.request_fingerprint(
+                "booking", {"booking": main.CreateBookingRequest(**body), "token": None}
+            ),
+            status="in_progress",
+            created_at=heartbeat_at,
+            heartbeat_at=heartbeat_at,
+            expires_at=datetime.utcnow() + timedelta(seconds=main.IDEMPOTENCY_KEY_TTL_SECONDS)
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_retry_replays_the_stored_booking(client, flight, booking_request):
+    body = booking_request()
+    first = client.post("/bookings", json=body, headers={"Idempotency-Key": "replay-1"})
+    retry = client.post("/bookings", json=body, headers={"Idempotency-Key": "replay-1"})
+
+    assert first.status_code == 200
+    assert retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json()["pnr"] == first.json()["pnr"]
+    assert count_bookings(flight) == 1
+
+
+def test_key_reused_for_another_request_is_rejected(client, flight, booking_request):
+    assert client.post("/bookings", json=booking_request("3A"), headers={"Idempotency-Key": "reuse-1"}).status_code == 200
+
+    response = client.post("/bookings", json=booking_request("4A"), headers={"Idempotency-Key": "reuse-1"})
+
+    assert response.status_code == 422
+    assert count_bookings(flight) == 1
+
+
+def test_key_of_a_live_request_returns_409(client, flight, booking_request, monkeypatch):
+    monkeypatch.setattr(main, "IDEMPOTENCY_WAIT_SECONDS", 0.3)
+    body = booking_request()
+    hold_key("busy-1", body, datetime.utcnow())
+
+    response = client.post("/bookings", json=body, headers={"Idempotency-Key": "busy-1"})
+
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == "1"
+    assert count_bookings(flight) == 0
+
+
+def test_key_of_a_stopped_request_is_taken_over(client, flight, booking_request):
+    body = booking_request()
+    stale = datetime.utcnow() - timedelta(seconds=main.IDEMPOTENCY_LOCK_TIMEOUT_SECONDS + 1)
+    hold_key("stale-1", body, stale)
+
+    response = client.post("/bookings", json=body, headers={"Idempotency-Key": "stale-1"})
+
+    assert response.status_code == 200
+    assert count_bookings(flight) == 1
+
+
+def test_payment_retry_charges_once(client, flight, monkeypatch):
+    charges = []
+    charge = main.payment_gateway.charge
+    monkeypatch.setattr(main.payment_gateway, "charge",
+                        lambda payment_id, amount: charges.append(payment_id) or charge(payment_id, amount))
+    hold = client.post("/bookings/initiate", json={
+        "flight_id": flight.id, "seat_number": "5A", "passenger_name": "Asha Rao"
+    })
+    assert hold.status_code == 202
+    body = {"pre_booking_id": hold.json()["pre_booking_id"]}
+
+    first = client.post("/payment/process", json=body, headers={"Idempotency-Key": "pay-1"})
+    retry = client.post("/payment/process", json=body, headers={"Idempotency-Key": "pay-1"})
+
+    assert first.status_code == 200
+    assert retry.json()["pnr"] == first.json()["pnr"]
+    assert len(charges) == 1
@@ -0,0 +1,378 @@
+# backend/traffic_replay.py
+"""
+Replay captured traffic against a running instance and compare builds.
+
+Traces are written by the API when TRAFFIC_CAPTURE_ENABLED=true (see main.py). `replay`
+sends the captured requests again, 1x to 50x faster than they arrived. Gaps between
+requests shrink by the speed factor. Each session still sends its requests one at a
+time and in order, so a hold is always paid for after it was placed. Identifiers that
+the original responses handed out (PNRs, hold and payment ids, tokens) are swapped for
+the ones the replayed responses return. Users the trace only signs in as are
+registered first. `compare` reports per-route latency differences between two replay
+results, e.g. the same trace replayed against two builds.
+
+    python traffic_replay.py replay traces/ --speed 10 --out before.json
+    python traffic_replay.py replay traces/ --speed 10 --out after.json
+    python traffic_replay.py compare before.json after.json --threshold 10
+
+Run the target with RATE_LIMIT_ENABLED=false, or with RATE_LIMIT_TRUST_FORWARDED_FOR=true:
+every replayed session sends its own X-Forwarded-For address.
+"""
+
+import argparse
+import glob
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+MIN_SPEED = 1.0
+MAX_SPEED = 50.0
+REQUEST_TIMEOUT_SECONDS = 30
+REPLAY_PASSWORD = "replay-password"
+
+# Values for fields the capture reduced to "<str>" / "<num>"
+PLACEHOLDERS = {
+    "password": REPLAY_PASSWORD,
+    "first_name": "Replay",
+    "last_name": "Passenger",
+    "passenger_name": "Replay Passenger",
+    "phone": "+10000000000",
+    "passenger_phone": "+10000000000",
+    "reason": "replay",
+    "q": "lon"  # autocomplete text is not recorded
+}
+EMAIL_FIELDS = {"email", "passenger_email"}
+TOKEN_FIELDS = {"token", "access_token"}
+
+def load_trace(paths: list) -> list:
+    """All records of the given trace files and directories, oldest first"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "*.jsonl.gz")) + glob.glob(os.path.join(path, "*.jsonl")))
+        else:
+            files.append(path)
+    records = []
+    for name in files:
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(name, "rt", encoding="utf-8") as trace:
+            records += [json.loads(line) for line in trace if line.strip()]
+    records.sort(key=lambda record: record["t"])
+    return records
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))], 2)
+
+def is_pseudonym(value) -> bool:
+    return isinstance(value, str) and value.startswith("~")
+
+class Replayer:
+    """Sends a trace to base_url, keeping its timing (divided by speed) and per-session order"""
+
+    def __init__(self, base_url: str, speed: float, concurrency: int):
+        self.base_url = base_url.rstrip("/")
+        self.speed = speed
+        self.concurrency = concurrency
+        self.run_id = uuid.uuid4().hex[:8]  # keeps emails unique across runs against one database
+        self._lock = threading.Lock()
+        self._values = {}  # pseudonym -> value returned by this replay
+        self._registered = set()  # email pseudonyms with an account in the target
+        self._keys = defaultdict(lambda: str(uuid.uuid4()))  # idempotency key pseudonym -> fresh key
+        self.results = []
+
+    # -- substitution ---------------------------------------------------------
+
+    def email_for(self, pseudonym: str) -> str:
+        return f"replay-{pseudonym[1:]}-{self.run_id}@example.com"
+
+    def substitute(self, value, key=None):
+        if isinstance(value, dict):
+            return {k: self.substitute(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.substitute(item, key) for item in value]
+        if is_pseudonym(value):
+            if key in TOKEN_FIELDS:
+                return self.token_for(value)
+            with self._lock:
+                known = self._values.get(value)
+            if known is not None:
+                return known
+            # Emails are never returned by the API; anything else unresolved is sent as is
+            return self.email_for(value) if key in EMAIL_FIELDS or key is None else value
+        if value == "<str>":
+            return PLACEHOLDERS.get(key, "replay")
+        if value == "<num>":
+            return 1
+        return value
+
+    def token_for(self, pseudonym: str) -> str:
+        """Token learned from a replayed sign-in, else one for a user registered just for it"""
+        with self._lock:
+            token = self._values.get(pseudonym)
+        if token is None:
+            token = self.ensure_user(pseudonym)
+            with self._lock:
+                self._values[pseudonym] = token
+        return token
+
+    def ensure_user(self, email_pseudonym: str) -> str:
+        """Register the user behind an email pseudonym (once); returns a token"""
+        email = self.email_for(email_pseudonym)
+        status_code, body, _ = self.send("POST", "/auth/register", body={
+            "email": email, "password": REPLAY_PASSWORD, "first_name": "Replay", "last_name": "User"
+        })
+        if status_code != 200:
+            status_code, body, _ = self.send("POST", "/auth/login", body={"email": email, "password": REPLAY_PASSWORD})
+        with self._lock:
+            self._registered.add(email_pseudonym)
+        return (body or {}).get("access_token", "")
+
+    def learn(self, record: dict, body):
+        """Map the pseudonyms the captured response handed out to the replayed values"""
+        if not isinstance(body, dict):
+            return
+        with self._lock:
+            for field, pseudonym in record.get("o", {}).items():
+                if isinstance(body.get(field), str):
+                    self._values[pseudonym] = body[field]
+
+    # -- requests -------------------------------------------------------------
+
+    def send(self, method: str, path: str, query=None, body=None, headers=None) -> tuple:
+        url = self.base_url + path
+        if query:
+            url += "?" + urllib.parse.urlencode(query, doseq=True)
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(url, data=data, method=method, headers=dict(headers or {}))
+        if data is not None:
+            request.add_header("Content-Type", "application/json")
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_SECONDS) as response:
+                status_code, payload = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status_code, payload = e.code, e.read()
+        except (urllib.error.URLError, OSError):
+            status_code, payload = 0, b""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        try:
+            parsed = json.loads(payload) if payload else None
+        except ValueError:
+            parsed = None
+        return status_code, parsed, elapsed_ms
+
+    def execute(self, record: dict, due: float):
+        body = record.get("b")
+        if body == "<body>":
+            body = None
+        if record["r"] == "/auth/register" and isinstance(body, dict) and is_pseudonym(body.get("email")):
+            with self._lock:
+                self._registered.add(body["email"])
+        elif record["r"] == "/auth/login" and isinstance(body, dict) and is_pseudonym(body.get("email")):
+            # Signed in as a user that was registered before the capture started
+            with self._lock:
+                missing = body["email"] not in self._registered
+            if missing:
+                self.ensure_user(body["email"])
+        path = record["r"]
+        for name, value in self.substitute(record.get("p", {})).items():
+            path = path.replace("{" + name + "}", urllib.parse.quote(str(value), safe=""))
+        headers = {"X-Forwarded-For": self.session_address(record["s"])}
+        if record.get("a"):
+            headers["Authorization"] = "Bearer " + self.token_for(record["a"])
+        if record.get("k"):
+            headers["Idempotency-Key"] = self._keys[record["k"]]
+        lag_ms = max(0.0, (time.monotonic() - due) * 1000)
+        status_code, parsed, elapsed_ms = self.send(
+            record["m"], path, self.substitute(record.get("q")), self.substitute(body), headers
+        )
+        self.learn(record, parsed)
+        result = {
+            "route": f"{record['m']} {record['r']}",
+            "status": status_code,
+            "captured_status": record["st"],
+            "ms": round(elapsed_ms, 2),
+            "captured_ms": record["ms"],
+            "lag_ms": round(lag_ms, 2)
+        }
+        with self._lock:
+            self.results.append(result)
+
+    @staticmethod
+    def session_address(session: str) -> str:
+        digest = hashlib.sha256(session.encode()).digest()
+        return f"10.{digest[0]}.{digest[1]}.{digest[2]}"
+
+    # -- scheduling -----------------------------------------------------------
+
+    def run(self, records: list):
+        """Replay records (sorted by capture time); a session's next request waits for its previous one"""
+        if not records:
+            return
+        sessions = defaultdict(deque)
+        for record in records:
+            sessions[record["s"]].append(record)
+        t0 = records[0]["t"]
+        start = time.monotonic() + 0.1
+        due_at = lambda record: start + (record["t"] - t0) / self.speed
+
+        ready = []  # (due, sequence, session) for the next request of every idle session
+        sequence = 0
+        for session, queue in sessions.items():
+            heapq.heappush(ready, (due_at(queue[0]), sequence, session))
+            sequence += 1
+        remaining = len(records)
+        condition = threading.Condition()
+
+        def complete(session):
+            nonlocal remaining, sequence
+            with condition:
+                remaining -= 1
+                queue = sessions[session]
+                if queue:
+                    heapq.heappush(ready, (due_at(queue[0]), sequence, session))
+                    sequence += 1
+                condition.notify()
+
+        def task(session, record, due):
+            try:
+                self.execute(record, due)
+            finally:
+                complete(session)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            with condition:
+                while remaining:
+                    if not ready:
+                        condition.wait()
+                        continue
+                    wait = ready[0][0] - time.monotonic()
+                    if wait > 0:
+                        condition.wait(wait)
+                        continue
+                    due, _, session = heapq.heappop(ready)
+                    executor.submit(task, session, sessions[session].popleft(), due)
+
+    def report(self, trace_seconds: float, wall_seconds: float) -> dict:
+        by_route = defaultdict(list)
+        for result in self.results:
+            by_route[result["route"]].append(result)
+        routes = {}
+        for route, results in sorted(by_route.items()):
+            latencies = [result["ms"] for result in results]
+            routes[route] = {
+                "count": len(results),
+                "p50_ms": percentile(latencies, 0.50),
+                "p95_ms": percentile(latencies, 0.95),
+                "p99_ms": percentile(latencies, 0.99),
+                "mean_ms": round(statistics.fmean(latencies), 2),
+                "captured_p50_ms": percentile([result["captured_ms"] for result in results], 0.50),
+                "errors": sum(1 for result in results if result["status"] == 0 or result["status"] >= 500),
+                "status_mismatches": sum(1 for result in results if result["status"] != result["captured_status"])
+            }
+        lags = [result["lag_ms"] for result in self.results]
+        return {
+            "base_url": self.base_url,
+            "speed": self.speed,
+            "requests": len(self.results),
+            "trace_seconds": round(trace_seconds, 1),
+            "wall_seconds": round(wall_seconds, 1),
+            "schedule_lag_ms": {"p50": percentile(lags, 0.50), "p95": percentile(lags, 0.95), "max": max(lags, default=0)},
+            "routes": routes
+        }
+
+def compare(before: dict, after: dict, threshold_pct: float, min_count: int) -> list:
+    """Per-route p50/p95 change from before to after; flagged when p95 moved more than threshold"""
+    rows = []
+    for route in sorted(set(before["routes"]) | set(after["routes"])):
+        a, b = before["routes"].get(route), after["routes"].get(route)
+        if a is None or b is None:
+            rows.append({"route": route, "only_in": "before" if b is None else "after"})
+            continue
+        row = {"route": route, "count": min(a["count"], b["count"])}
+        for stat in ("p50_ms", "p95_ms"):
+            row[stat] = [a[stat], b[stat]]
+            row[stat.replace("_ms", "_change_pct")] = round((b[stat] - a[stat]) / a[stat] * 100, 1) if a[stat] else None
+        change = row["p95_change_pct"]
+        row["flag"] = ("slower" if change > 0 else "faster") \
+            if change is not None and abs(change) > threshold_pct and row["count"] >= min_count else ""
+        rows.append(row)
+    return rows
+
+def speed_factor(value: str) -> float:
+    speed = float(value)
+    if not MIN_SPEED <= speed <= MAX_SPEED:
+        raise argparse.ArgumentTypeError(f"speed must be between {MIN_SPEED:g} and {MAX_SPEED:g}")
+    return speed
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured API traffic and compare builds")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay_parser = commands.add_parser("replay", help="replay traces against a running instance")
+    replay_parser.add_argument("traces", nargs="+", help="trace files or directories")
+    replay_parser.add_argument("--base-url", default="http://localhost:8000")
+    replay_parser.add_argument("--speed", type=speed_factor, default=1.0, help="time compression, 1 to 50")
+    replay_parser.add_argument("--concurrency", type=int, default=32, help="requests in flight at most")
+    replay_parser.add_argument("--limit", type=int, help="only replay the first N requests")
+    replay_parser.add_argument("--out", help="write the report as JSON to this file")
+
+    compare_parser = commands.add_parser("compare", help="per-route latency change between two replay reports")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="flag p95 changes above this percent")
+    compare_parser.add_argument("--min-count", type=int, default=20, help="ignore routes with fewer requests")
+    compare_parser.add_argument("--json", action="store_true", help="print the comparison as JSON")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        records = load_trace(args.traces)[:args.limit]
+        if not records:
+            sys.exit("no trace records found")
+        replayer = Replayer(args.base_url, args.speed, args.concurrency)
+        started = time.monotonic()
+        replayer.run(records)
+        report = replayer.report(records[-1]["t"] - records[0]["t"], time.monotonic() - started)
+        if args.out:
+            with open(args.out, "w") as out:
+                json.dump(report, out, indent=2)
+        print(f"Replayed {report['requests']} requests ({report['trace_seconds']}s of traffic) "
+              f"in {report['wall_seconds']}s at {args.speed:g}x, schedule lag p95 {report['schedule_lag_ms']['p95']} ms")
+        print(f"{'route':<48}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}{'status diff':>13}")
+        for route, row in report["routes"].items():
+            print(f"{route:<48}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+                  f"{row['errors']:>8}{row['status_mismatches']:>13}")
+        return
+
+    with open(args.before) as before, open(args.after) as after:
+        rows = compare(json.load(before), json.load(after), args.threshold, args.min_count)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'route':<48}{'count':>7}{'p50 ms':>18}{'p95 ms':>18}{'p95 %':>9}")
+    for row in rows:
+        if "only_in" in row:
+            print(f"{row['route']:<48}  only in {row['only_in']}")
+            continue
+        p50, p95 = row["p50_ms"], row["p95_ms"]
+        change = "" if row["p95_change_pct"] is None else f"{row['p95_change_pct']:+.1f}"
+        print(f"{row['route']:<48}{row['count']:>7}{p50[0]:>9}{p50[1]:>9}{p95[0]:>9}{p95[1]:>9}{change:>9}  {row['flag']}")
+
+if __name__ == "__main__":
+    main()
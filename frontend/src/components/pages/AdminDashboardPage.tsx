@@ -1,20 +1,34 @@
+import { useEffect, useState } from "react";
 import { DollarSign, Users, Plane, TrendingUp, Calendar, Settings } from "lucide-react";
 import { Card } from "../ui/card";
 import { Badge } from "../ui/badge";
 import { Button } from "../ui/button";
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "../ui/table";
 import { motion } from "motion/react";
+import { getAnalyticsSummary } from "../../services/api";
+import type { AnalyticsSummary } from "../../services/api";
 
 interface AdminDashboardPageProps {
   onNavigate: (page: string, data?: any) => void;
 }
 
 export function AdminDashboardPage({ onNavigate }: AdminDashboardPageProps) {
+  const [summary, setSummary] = useState<AnalyticsSummary | null>(null);
+
+  useEffect(() => {
+    getAnalyticsSummary(30)
+      .then(setSummary)
+      .catch((err) => console.error("Error loading dashboard summary:", err));
+  }, []);
+
+  const formatChange = (change: number | null | undefined) =>
+    change === null || change === undefined ? "–" : `${change > 0 ? "+" : ""}${change}%`;
+
   const stats = [
-    { label: "Total Revenue", value: "$124,500", change: "+12.5%", icon: DollarSign, color: "from-green-600 to-green-400" },
-    { label: "Total Bookings", value: "1,234", change: "+8.2%", icon: Users, color: "from-blue-600 to-blue-400" },
-    { label: "Active Flights", value: "48", change: "+5.1%", icon: Plane, color: "from-purple-600 to-purple-400" },
-    { label: "Avg. Occupancy", value: "78%", change: "+3.7%", icon: TrendingUp, color: "from-orange-600 to-orange-400" },
+    { label: "Total Revenue", value: `$${(summary?.revenue ?? 0).toLocaleString()}`, change: formatChange(summary?.revenue_change), icon: DollarSign, color: "from-green-600 to-green-400" },
+    { label: "Total Bookings", value: (summary?.bookings ?? 0).toLocaleString(), change: formatChange(summary?.bookings_change), icon: Users, color: "from-blue-600 to-blue-400" },
+    { label: "Active Flights", value: String(summary?.active_flights ?? 0), change: "", icon: Plane, color: "from-purple-600 to-purple-400" },
+    { label: "Avg. Occupancy", value: `${summary?.occupancy ?? 0}%`, change: formatChange(summary?.occupancy_change), icon: TrendingUp, color: "from-orange-600 to-orange-400" },
   ];
 
   const recentBookings = [
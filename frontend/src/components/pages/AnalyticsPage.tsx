@@ -1,3 +1,4 @@
+import { useEffect, useState } from "react";
 import { ArrowLeft, TrendingUp, TrendingDown } from "lucide-react";
 import { Button } from "../ui/button";
 import { Card } from "../ui/card";
@@ -5,42 +6,80 @@ import { Badge } from "../ui/badge";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "../ui/select";
 import { motion } from "motion/react";
 import { BarChart, Bar, LineChart, Line, PieChart, Pie, Cell, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from "recharts";
+import {
+  getAnalyticsSummary,
+  getLoadFactorAnalytics,
+  getRevenueAnalytics,
+} from "../../services/api";
+import type { AnalyticsSummary } from "../../services/api";
 
 interface AnalyticsPageProps {
   onNavigate: (page: string, data?: any) => void;
 }
 
 export function AnalyticsPage({ onNavigate }: AnalyticsPageProps) {
-  const revenueData = [
-    { month: 'Jan', revenue: 45000, bookings: 420 },
-    { month: 'Feb', revenue: 52000, bookings: 480 },
-    { month: 'Mar', revenue: 48000, bookings: 450 },
-    { month: 'Apr', revenue: 61000, bookings: 580 },
-    { month: 'May', revenue: 55000, bookings: 520 },
-    { month: 'Jun', revenue: 67000, bookings: 640 },
-    { month: 'Jul', revenue: 72000, bookings: 680 },
-    { month: 'Aug', revenue: 69000, bookings: 650 },
-    { month: 'Sep', revenue: 58000, bookings: 540 },
-    { month: 'Oct', revenue: 71000, bookings: 670 },
-  ];
+  const [days, setDays] = useState("30");
+  const [summary, setSummary] = useState<AnalyticsSummary | null>(null);
+  const [revenueData, setRevenueData] = useState<{ month: string; revenue: number; bookings: number }[]>([]);
+  const [routeData, setRouteData] = useState<{ name: string; value: number; bookings: number }[]>([]);
+  const [occupancyData, setOccupancyData] = useState<{ day: string; occupancy: number }[]>([]);
 
-  const routeData = [
-    { name: 'NYC → LAX', value: 28, bookings: 450 },
-    { name: 'SFO → MIA', value: 22, bookings: 350 },
-    { name: 'CHI → BOS', value: 18, bookings: 290 },
-    { name: 'LAX → SEA', value: 16, bookings: 260 },
-    { name: 'Others', value: 16, bookings: 250 },
-  ];
+  useEffect(() => {
+    const range = Number(days);
+    const endDate = new Date();
+    const startDate = new Date(endDate.getTime() - (range - 1) * 24 * 60 * 60 * 1000);
+    const start = startDate.toISOString().slice(0, 10);
+    const end = endDate.toISOString().slice(0, 10);
 
-  const occupancyData = [
-    { day: 'Mon', occupancy: 65 },
-    { day: 'Tue', occupancy: 72 },
-    { day: 'Wed', occupancy: 68 },
-    { day: 'Thu', occupancy: 78 },
-    { day: 'Fri', occupancy: 85 },
-    { day: 'Sat', occupancy: 92 },
-    { day: 'Sun', occupancy: 88 },
-  ];
+    const loadAnalytics = async () => {
+      try {
+        const [summaryData, revenueRows, routeRows, occupancyRows] = await Promise.all([
+          getAnalyticsSummary(range),
+          getRevenueAnalytics(range > 31 ? "month" : "day", start, end),
+          getRevenueAnalytics("route", start, end),
+          getLoadFactorAnalytics("weekday", start, end),
+        ]);
+        setSummary(summaryData);
+        setRevenueData(revenueRows.map((row) => ({ month: row.key, revenue: row.revenue, bookings: row.bookings })));
+
+        // Top four routes by bookings, the rest grouped as "Others"
+        const totalBookings = routeRows.reduce((sum, row) => sum + row.bookings, 0) || 1;
+        const topRoutes = [...routeRows].sort((a, b) => b.bookings - a.bookings);
+        const others = topRoutes.slice(4).reduce((sum, row) => sum + row.bookings, 0);
+        setRouteData([
+          ...topRoutes.slice(0, 4).map((row) => ({
+            name: row.key,
+            value: Math.round((row.bookings / totalBookings) * 100),
+            bookings: row.bookings,
+          })),
+          ...(others > 0 ? [{ name: "Others", value: Math.round((others / totalBookings) * 100), bookings: others }] : []),
+        ]);
+
+        const weekdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"];
+        setOccupancyData(
+          weekdays.map((day) => ({
+            day,
+            occupancy: occupancyRows.find((row) => row.key === day)?.load_factor ?? 0,
+          }))
+        );
+      } catch (err) {
+        console.error("Error loading analytics:", err);
+      }
+    };
+
+    loadAnalytics();
+  }, [days]);
+
+  const formatChange = (change: number | null | undefined) =>
+    change === null || change === undefined ? "–" : `${change > 0 ? "+" : ""}${change}%`;
+
+  const changeBadgeClass = (change: number | null | undefined) =>
+    (change ?? 0) < 0
+      ? "bg-red-100 text-red-700 border-0 flex items-center gap-1"
+      : "bg-green-100 text-green-700 border-0 flex items-center gap-1";
+
+  const ChangeIcon = ({ change }: { change: number | null | undefined }) =>
+    (change ?? 0) < 0 ? <TrendingDown className="w-3 h-3" /> : <TrendingUp className="w-3 h-3" />;
 
   const COLORS = ['#3b82f6', '#8b5cf6', '#10b981', '#f59e0b', '#ef4444'];
 
@@ -61,7 +100,7 @@ export function AnalyticsPage({ onNavigate }: AnalyticsPageProps) {
               <p className="text-gray-600">Comprehensive business insights</p>
             </div>
           </div>
-          <Select defaultValue="30">
+          <Select value={days} onValueChange={setDays}>
             <SelectTrigger className="w-40">
               <SelectValue />
             </SelectTrigger>
@@ -83,12 +122,12 @@ export function AnalyticsPage({ onNavigate }: AnalyticsPageProps) {
             <Card className="bg-white border-0 shadow-lg p-6">
               <div className="flex items-center justify-between mb-2">
                 <p className="text-sm text-gray-600">Total Revenue</p>
-                <Badge className="bg-green-100 text-green-700 border-0 flex items-center gap-1">
-                  <TrendingUp className="w-3 h-3" />
-                  +12.5%
+                <Badge className={changeBadgeClass(summary?.revenue_change)}>
+                  <ChangeIcon change={summary?.revenue_change} />
+                  {formatChange(summary?.revenue_change)}
                 </Badge>
               </div>
-              <p className="text-3xl text-gray-900">$628,000</p>
+              <p className="text-3xl text-gray-900">{`$${(summary?.revenue ?? 0).toLocaleString()}`}</p>
             </Card>
           </motion.div>
 
@@ -100,12 +139,12 @@ export function AnalyticsPage({ onNavigate }: AnalyticsPageProps) {
             <Card className="bg-white border-0 shadow-lg p-6">
               <div className="flex items-center justify-between mb-2">
                 <p className="text-sm text-gray-600">Total Bookings</p>
-                <Badge className="bg-green-100 text-green-700 border-0 flex items-center gap-1">
-                  <TrendingUp className="w-3 h-3" />
-                  +8.3%
+                <Badge className={changeBadgeClass(summary?.bookings_change)}>
+                  <ChangeIcon change={summary?.bookings_change} />
+                  {formatChange(summary?.bookings_change)}
                 </Badge>
               </div>
-              <p className="text-3xl text-gray-900">5,900</p>
+              <p className="text-3xl text-gray-900">{(summary?.bookings ?? 0).toLocaleString()}</p>
             </Card>
           </motion.div>
 
@@ -117,12 +156,12 @@ export function AnalyticsPage({ onNavigate }: AnalyticsPageProps) {
             <Card className="bg-white border-0 shadow-lg p-6">
               <div className="flex items-center justify-between mb-2">
                 <p className="text-sm text-gray-600">Avg. Fare</p>
-                <Badge className="bg-red-100 text-red-700 border-0 flex items-center gap-1">
-                  <TrendingDown className="w-3 h-3" />
-                  -2.1%
+                <Badge className={changeBadgeClass(summary?.average_fare_change)}>
+                  <ChangeIcon change={summary?.average_fare_change} />
+                  {formatChange(summary?.average_fare_change)}
                 </Badge>
               </div>
-              <p className="text-3xl text-gray-900">$106</p>
+              <p className="text-3xl text-gray-900">{`$${(summary?.average_fare ?? 0).toLocaleString()}`}</p>
             </Card>
           </motion.div>
 
@@ -134,12 +173,12 @@ export function AnalyticsPage({ onNavigate }: AnalyticsPageProps) {
             <Card className="bg-white border-0 shadow-lg p-6">
               <div className="flex items-center justify-between mb-2">
                 <p className="text-sm text-gray-600">Occupancy Rate</p>
-                <Badge className="bg-green-100 text-green-700 border-0 flex items-center gap-1">
-                  <TrendingUp className="w-3 h-3" />
-                  +5.2%
+                <Badge className={changeBadgeClass(summary?.occupancy_change)}>
+                  <ChangeIcon change={summary?.occupancy_change} />
+                  {formatChange(summary?.occupancy_change)}
                 </Badge>
               </div>
-              <p className="text-3xl text-gray-900">78%</p>
+              <p className="text-3xl text-gray-900">{`${summary?.occupancy ?? 0}%`}</p>
             </Card>
           </motion.div>
         </div>
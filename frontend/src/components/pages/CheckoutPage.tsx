@@ -22,7 +22,11 @@ import {
 } from "../ui/select";
 import { Separator } from "../ui/separator";
 import { motion } from "motion/react";
-import { initiateBooking, processPayment } from "../../services/api";
+import {
+  initiateBooking,
+  submitPayment,
+  getPaymentStatus,
+} from "../../services/api";
 
 interface CheckoutPageProps {
   flightData?: any;
@@ -57,8 +61,9 @@ export function CheckoutPage({ flightData, onNavigate }: CheckoutPageProps) {
     try {
       // Step 1: Initiate booking (reserves seat)
       const passengerName = `${formData.firstName} ${formData.lastName}`;
+      const flightId = flightData?.flightId || flightData?.flight?.id || 1;
       const initiateResponse = await initiateBooking({
-        flight_id: flightData?.flightId || flightData?.flight?.id || 1,
+        flight_id: flightId,
         seat_number: flightData?.seat || flightData?.selectedSeat || "1A",
         passenger_name: passengerName,
         passenger_email: formData.email,
@@ -67,16 +72,37 @@ export function CheckoutPage({ flightData, onNavigate }: CheckoutPageProps) {
 
       console.log("Booking initiated:", initiateResponse);
 
-      // Step 2: Process payment (completes booking)
-      const paymentResponse = await processPayment(
-        initiateResponse.pre_booking_id
-      );
-
-      console.log("Payment processed:", paymentResponse);
+      // Step 2: Queue the payment and poll until the gateway has answered
+      let payment = await submitPayment(initiateResponse.pre_booking_id);
+      for (
+        let attempt = 0;
+        payment.status === "pending" && attempt < 60;
+        attempt++
+      ) {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        payment = await getPaymentStatus(payment.payment_id);
+      }
+
+      console.log("Payment processed:", payment);
+
+      if (payment.status !== "succeeded") {
+        setError(
+          payment.status === "pending"
+            ? "Your payment is still being processed. Check My Bookings in a few minutes."
+            : payment.status === "failed"
+            ? "Payment was declined. Please try again."
+            : "Your booking could not be completed. The payment will be refunded."
+        );
+        return;
+      }
 
       // Navigate to confirmation page with booking details
       onNavigate("confirmation", {
-        booking: paymentResponse.booking,
+        booking: {
+          pnr: payment.pnr,
+          flight_id: flightId,
+          total_price: payment.total_price,
+        },
         passenger: formData,
         flight: flightData?.flight,
         selectedSeat: flightData?.seat || flightData?.selectedSeat,
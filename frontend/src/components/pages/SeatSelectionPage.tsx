@@ -3,7 +3,10 @@ import { ArrowLeft, Check, Loader2 } from "lucide-react";
 import { Button } from "../ui/button";
 import { Card } from "../ui/card";
 import { motion } from "motion/react";
-import { getFlightSeats } from "../../services/api";
+import {
+  getFlightSeats,
+  subscribeToSeatUpdates,
+} from "../../services/api";
 
 interface Seat {
   id: number;
@@ -50,6 +53,28 @@ export function SeatSelectionPage({
     };
 
     fetchSeats();
+
+    // Apply seats taken or released by other users without re-polling the seat map
+    const flightId = flightData?.flight?.flight_id || flightData?.flight?.id;
+    if (!flightId) return;
+    return subscribeToSeatUpdates(
+      flightId,
+      (update) => {
+        const changes = new Map(update.seats.map((s) => [s.seat_number, s]));
+        setSeats((current) =>
+          current.map((seat) =>
+            changes.has(seat.seat_number)
+              ? { ...seat, is_available: changes.get(seat.seat_number)!.is_available }
+              : seat
+          )
+        );
+        setPricing((current) => ({ ...current, ...update.pricing }));
+        setSelectedSeat((current) =>
+          current && changes.get(current)?.is_available === false ? null : current
+        );
+      },
+      fetchSeats
+    );
   }, [flightData?.flight?.flight_id, flightData?.flight?.id]);
 
   const getSeatStatus = (seat: Seat) => {
@@ -145,9 +145,43 @@ export const processPayment = async (
     booking_date: string;
   };
 }> => {
-  const response = await apiClient.post("/payment/process", {
-    pre_booking_id: preBookingId,
-  });
+  // One payment attempt per pre-booking: retries replay the original result
+  const response = await apiClient.post(
+    "/payment/process",
+    { pre_booking_id: preBookingId },
+    { headers: { "Idempotency-Key": `payment-${preBookingId}` } }
+  );
+  return response.data;
+};
+
+export interface PaymentStatus {
+  payment_id: string;
+  pre_booking_id: string;
+  status: "pending" | "succeeded" | "failed" | "refunded" | "refund_failed";
+  total_price: number;
+  pnr: string | null;
+  failure_reason: string | null;
+  status_url: string;
+}
+
+// Queue payment without waiting for the gateway; poll getPaymentStatus for the PNR
+export const submitPayment = async (
+  preBookingId: string
+): Promise<PaymentStatus> => {
+  const response = await apiClient.post<PaymentStatus>(
+    "/payment/submit",
+    { pre_booking_id: preBookingId },
+    { headers: { "Idempotency-Key": `payment-submit-${preBookingId}` } }
+  );
+  return response.data;
+};
+
+export const getPaymentStatus = async (
+  paymentId: string
+): Promise<PaymentStatus> => {
+  const response = await apiClient.get<PaymentStatus>(
+    `/payment/status/${paymentId}`
+  );
   return response.data;
 };
 
@@ -157,10 +191,39 @@ export const getFlightSeats = async (flightId: number) => {
   return response.data;
 };
 
+export interface SeatUpdateEvent {
+  type: "seats";
+  flight_id: number;
+  seats: { id: number; seat_number: string; class: string; is_available: boolean }[];
+  pricing: Record<string, number>;
+  seats_available: Record<string, number>;
+}
+
+// Live seat-map updates over server-sent events; returns a function that closes the stream.
+// onResync is called when the server asks the client to reload the full seat map.
+export const subscribeToSeatUpdates = (
+  flightId: number,
+  onUpdate: (event: SeatUpdateEvent) => void,
+  onResync: () => void
+): (() => void) => {
+  const source = new EventSource(
+    `${API_BASE_URL}/flights/${flightId}/seats/stream`
+  );
+  source.addEventListener("seats", (event) =>
+    onUpdate(JSON.parse((event as MessageEvent).data))
+  );
+  source.addEventListener("resync", () => onResync());
+  return () => source.close();
+};
+
+// Pass the same idempotencyKey when retrying so the booking is only created once
 export const createBooking = async (
-  bookingData: CreateBookingRequest
+  bookingData: CreateBookingRequest,
+  idempotencyKey?: string
 ): Promise<Booking> => {
-  const response = await apiClient.post<Booking>("/bookings", bookingData);
+  const response = await apiClient.post<Booking>("/bookings", bookingData, {
+    headers: idempotencyKey ? { "Idempotency-Key": idempotencyKey } : undefined,
+  });
   return response.data;
 };
 
@@ -198,6 +261,83 @@ export const getDynamicPrice = async (
   return response.data;
 };
 
+// ============================================================================
+// Analytics APIs
+// ============================================================================
+
+export interface AnalyticsSummary {
+  start_date: string;
+  end_date: string;
+  revenue: number;
+  revenue_change: number | null;
+  bookings: number;
+  bookings_change: number | null;
+  cancellations: number;
+  average_fare: number;
+  average_fare_change: number | null;
+  occupancy: number;
+  occupancy_change: number | null;
+  active_flights: number;
+}
+
+export type AnalyticsGroup =
+  | "day"
+  | "month"
+  | "weekday"
+  | "route"
+  | "airline"
+  | "class";
+
+export interface RevenueRow {
+  key: string;
+  revenue: number;
+  bookings: number;
+  cancelled_revenue: number;
+  cancellations: number;
+  net_revenue: number;
+}
+
+export interface LoadFactorRow {
+  key: string;
+  seats_sold: number;
+  seats_total: number;
+  load_factor: number;
+}
+
+export const getAnalyticsSummary = async (
+  days: number
+): Promise<AnalyticsSummary> => {
+  const response = await apiClient.get<AnalyticsSummary>(
+    "/analytics/summary",
+    { params: { days } }
+  );
+  return response.data;
+};
+
+export const getRevenueAnalytics = async (
+  groupBy: AnalyticsGroup,
+  startDate?: string,
+  endDate?: string
+): Promise<RevenueRow[]> => {
+  const response = await apiClient.get<{ rows: RevenueRow[] }>(
+    "/analytics/revenue",
+    { params: { group_by: groupBy, start_date: startDate, end_date: endDate } }
+  );
+  return response.data.rows;
+};
+
+export const getLoadFactorAnalytics = async (
+  groupBy: AnalyticsGroup,
+  startDate?: string,
+  endDate?: string
+): Promise<LoadFactorRow[]> => {
+  const response = await apiClient.get<{ rows: LoadFactorRow[] }>(
+    "/analytics/load_factor",
+    { params: { group_by: groupBy, start_date: startDate, end_date: endDate } }
+  );
+  return response.data.rows;
+};
+
 // ============================================================================
 // Utility Functions
 // ============================================================================
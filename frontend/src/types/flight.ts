@@ -53,6 +53,7 @@ export interface FlightSearchRequest {
   origin: string;
   destination: string;
   departure_date: string;
+  seat_class?: string;
 }
 
 export interface FlightDetailsResponse {